@@ -0,0 +1,226 @@
+import bz2
+import json
+import random
+from xml.sax.saxutils import escape
+from typing import Optional
+
+
+def _random_word(rng: random.Random) -> str:
+    return ''.join(rng.choices('abcdefghijklmnopqrstuvwxyz',
+                               k=rng.randint(2, 10)))
+
+
+def _random_hangul_word(rng: random.Random) -> str:
+    return ''.join(chr(rng.randint(0xac00, 0xd7a3))
+                   for _ in range(rng.randint(1, 5)))
+
+
+def _random_sentence(rng: random.Random, hangul: bool = False) -> str:
+    words = [_random_hangul_word(rng) if hangul else _random_word(rng)
+             for _ in range(rng.randint(5, 25))]
+    return ' '.join(words).capitalize() + rng.choice('..!?')
+
+
+def _random_wiki_sentence(rng: random.Random) -> str:
+    words = [_random_word(rng) for _ in range(rng.randint(5, 25))]
+
+    # Decorate some words with the common wiki markups.
+    for i in rng.sample(range(len(words)), k=len(words) // 4):
+        markup = rng.randrange(5)
+        if markup == 0:
+            words[i] = f'[[{words[i]}]]'
+        elif markup == 1:
+            words[i] = f'[[{_random_word(rng)}|{words[i]}]]'
+        elif markup == 2:
+            words[i] = f"'''{words[i]}'''"
+        elif markup == 3:
+            words[i] = f'({words[i]} {_random_word(rng)})'
+        else:
+            words[i] = f'{words[i]}<ref>{_random_word(rng)}</ref>'
+
+    return ' '.join(words).capitalize() + '.'
+
+
+def _random_namu_sentence(rng: random.Random) -> str:
+    words = [_random_hangul_word(rng) for _ in range(rng.randint(5, 25))]
+
+    # Decorate some words with the common namumark markups.
+    for i in rng.sample(range(len(words)), k=len(words) // 4):
+        markup = rng.randrange(6)
+        if markup == 0:
+            words[i] = f'[[{words[i]}]]'
+        elif markup == 1:
+            words[i] = f'[[{_random_hangul_word(rng)}|{words[i]}]]'
+        elif markup == 2:
+            words[i] = f"'''{words[i]}'''"
+        elif markup == 3:
+            words[i] = f'~~{words[i]}~~'
+        elif markup == 4:
+            words[i] = f'({words[i]})'
+        else:
+            words[i] = f'{words[i]}[각주]'
+
+    return ' '.join(words) + rng.choice('..!?')
+
+
+def random_wiki_article(rng: random.Random) -> str:
+    r"""Create a random article in mediawiki format."""
+    lines = ['{{Infobox ' + _random_word(rng) + '}}']
+    for _ in range(rng.randint(1, 5)):
+        lines.append(f'== {_random_word(rng).capitalize()} ==')
+        lines.extend(_random_wiki_sentence(rng)
+                     for _ in range(rng.randint(1, 10)))
+        lines.append('')
+
+    lines.append('{{Reflist}}')
+    lines.append(f'[[Category:{_random_word(rng).capitalize()}]]')
+    return '\n'.join(lines)
+
+
+def random_namu_article(rng: random.Random) -> str:
+    r"""Create a random article in namumark format."""
+    lines = ['[목차]']
+    for _ in range(rng.randint(1, 5)):
+        lines.append(f'== {_random_hangul_word(rng)} ==')
+        lines.extend(_random_namu_sentence(rng)
+                     for _ in range(rng.randint(1, 10)))
+        lines.append(f' * {_random_hangul_word(rng)}')
+        lines.append(f'|| {_random_hangul_word(rng)} || '
+                     f'{_random_hangul_word(rng)} ||')
+
+    return '\n'.join(lines)
+
+
+def generate_text(output_file: str, size: int, seed: int = 0,
+                  hangul: bool = False):
+    r"""Generate line-oriented plain text file.
+
+    Arguments:
+        output_file (str): Output text file path.
+        size (int): The approximate size of the file in bytes.
+        seed (int): Random seed.
+        hangul (bool): Whether to generate Korean sentences.
+    """
+    rng = random.Random(seed)
+    with open(output_file, 'w', encoding='utf-8') as fp:
+        while fp.tell() < size:
+            fp.write(_random_sentence(rng, hangul) + '\n')
+
+
+def _wiki_page(page_id: int, ns: int, title: str, text: str) -> bytes:
+    return (f'  <page>\n'
+            f'    <title>{escape(title)}</title>\n'
+            f'    <ns>{ns}</ns>\n'
+            f'    <id>{page_id}</id>\n'
+            f'    <revision>\n'
+            f'      <id>{page_id}</id>\n'
+            f'      <text xml:space="preserve">{escape(text)}</text>\n'
+            f'    </revision>\n'
+            f'  </page>\n'.encode('utf-8'))
+
+
+def generate_wiki_dump(output_file: str, size: int, seed: int = 0,
+                       pages_per_stream: Optional[int] = None,
+                       index_file: Optional[str] = None):
+    r"""Generate compressed mediawiki XML dump file.
+
+    Some pages are redirections or not in the main namespace, like the real
+    wikipedia dumps. If `pages_per_stream` is given, the dump would be
+    written in multistream format, i.e. the site information and each group
+    of pages are compressed to the independent bz2 streams.
+
+    Arguments:
+        output_file (str): Output ``.xml.bz2`` file path.
+        size (int): The approximate size of the uncompressed dump in bytes.
+        seed (int): Random seed.
+        pages_per_stream (int): Optional number of pages in each stream.
+        index_file (str): Optional output ``.txt.bz2`` index file path of
+            the multistream dump.
+    """
+    rng = random.Random(seed)
+    namespaces = {1: 'Talk', 2: 'User', 6: 'File', 10: 'Template',
+                  14: 'Category'}
+
+    header = (b'<mediawiki '
+              b'xmlns="http://www.mediawiki.org/xml/export-0.10/" '
+              b'xml:lang="en">\n'
+              b'  <siteinfo>\n'
+              b'    <namespaces>\n'
+              b'      <namespace key="0" case="first-letter" />\n')
+    for key, name in namespaces.items():
+        header += (f'      <namespace key="{key}" case="first-letter">'
+                   f'{name}</namespace>\n'.encode('utf-8'))
+    header += (b'    </namespaces>\n'
+               b'  </siteinfo>\n')
+
+    with open(output_file, 'wb') as fp:
+        stream = bz2.BZ2Compressor()
+        stream_offset, stream_pages, index = fp.tell(), 0, []
+
+        fp.write(stream.compress(header))
+        if pages_per_stream is not None:
+            fp.write(stream.flush())
+            stream = bz2.BZ2Compressor()
+            stream_offset = fp.tell()
+
+        written, page_id = 0, 0
+        while written < size:
+            page_id += 1
+            title = _random_word(rng).capitalize()
+
+            if rng.random() < 0.1:
+                ns, text = 0, f'#REDIRECT [[{_random_word(rng)}]]'
+            elif rng.random() < 0.1:
+                ns, text = rng.choice(list(namespaces)), _random_word(rng)
+            else:
+                ns, text = 0, random_wiki_article(rng)
+
+            fp.write(stream.compress(_wiki_page(page_id, ns, title, text)))
+            index.append(f'{stream_offset}:{page_id}:{title}\n')
+            written += len(text)
+
+            # Start new stream if the current one is full.
+            stream_pages += 1
+            if stream_pages == pages_per_stream:
+                fp.write(stream.flush())
+                stream = bz2.BZ2Compressor()
+                stream_offset, stream_pages = fp.tell(), 0
+
+        fp.write(stream.compress(b'</mediawiki>\n'))
+        fp.write(stream.flush())
+
+    if index_file is not None:
+        with bz2.open(index_file, 'wt', encoding='utf-8') as fp:
+            fp.write(''.join(index))
+
+
+def generate_namuwiki_json(output_file: str, size: int, seed: int = 0):
+    r"""Generate namuwiki JSON dump file.
+
+    Arguments:
+        output_file (str): Output ``.json`` file path.
+        size (int): The approximate size of the file in bytes.
+        seed (int): Random seed.
+    """
+    rng = random.Random(seed)
+    with open(output_file, 'w', encoding='utf-8') as fp:
+        fp.write('[')
+
+        written, first = 0, True
+        while written < size:
+            if rng.random() < 0.1:
+                text = f'#redirect {_random_hangul_word(rng)}'
+            else:
+                text = random_namu_article(rng)
+
+            article = {'namespace': '0',
+                       'title': _random_hangul_word(rng),
+                       'text': text,
+                       'contributors': [_random_word(rng)]}
+            encoded = json.dumps(article, ensure_ascii=False)
+
+            fp.write(encoded if first else ',' + encoded)
+            written += len(encoded.encode('utf-8'))
+            first = False
+
+        fp.write(']')
@@ -0,0 +1,218 @@
+import os
+import bz2
+import sys
+import json
+import time
+import ijson
+import shutil
+import tempfile
+import argparse
+import xml.etree.cElementTree as etree
+from typing import Dict, List, Tuple
+from expanda.shuffling import shuffle
+from expanda.tokenization import train_tokenizer, tokenize_corpus
+from expanda.utils import random_filename
+from .generators import (generate_text, generate_wiki_dump,
+                         generate_namuwiki_json)
+
+
+def _benchmark_shuffle(workspace: str, size: int) -> Tuple[int, float]:
+    input_file = random_filename(workspace)
+    generate_text(input_file, size)
+
+    # Use the small memory budget to benchmark two-pass shuffling as well.
+    start = time.perf_counter()
+    shuffle(input_file, random_filename(workspace), workspace,
+            memory_budget=size // 4, seed=0)
+    return os.path.getsize(input_file), time.perf_counter() - start
+
+
+def _benchmark_train_tokenizer(workspace: str,
+                               size: int) -> Tuple[int, float]:
+    input_file = random_filename(workspace)
+    generate_text(input_file, size)
+
+    start = time.perf_counter()
+    train_tokenizer(input_file, random_filename(workspace), workspace,
+                    subset_size=size, vocab_size=8000, seed=0)
+    return os.path.getsize(input_file), time.perf_counter() - start
+
+
+def _benchmark_tokenize(workspace: str, size: int) -> Tuple[int, float]:
+    input_file, vocab_file = random_filename(workspace), \
+        random_filename(workspace)
+    generate_text(input_file, size)
+    train_tokenizer(input_file, vocab_file, workspace, subset_size=size // 4,
+                    vocab_size=8000, seed=0)
+
+    start = time.perf_counter()
+    tokenize_corpus(input_file, random_filename(workspace), vocab_file)
+    return os.path.getsize(input_file), time.perf_counter() - start
+
+
+def _read_wiki_articles(input_file: str) -> List[str]:
+    articles = []
+    with bz2.open(input_file, 'r') as fp:
+        for _, elem in etree.iterparse(fp):
+            if elem.tag.endswith('}text') and elem.text is not None:
+                articles.append(elem.text)
+    return articles
+
+
+def _clean_wiki_articles(workspace: str, size: int,
+                         cleaner: str) -> Tuple[int, float]:
+    from expanda.ext import wikipedia
+
+    input_file = random_filename(workspace)
+    generate_wiki_dump(input_file, size)
+    articles = _read_wiki_articles(input_file)
+
+    start = time.perf_counter()
+    wiki_cleaner = wikipedia.WikiCleaner(['Category', 'File'], cleaner)
+    for article in articles:
+        wiki_cleaner.clean(article)
+    return (sum(len(article.encode('utf-8')) for article in articles),
+            time.perf_counter() - start)
+
+
+def _benchmark_wikipedia_clean(workspace: str,
+                               size: int) -> Tuple[int, float]:
+    return _clean_wiki_articles(workspace, size, 'mwparserfromhell')
+
+
+def _benchmark_wikipedia_clean_streaming(workspace: str,
+                                         size: int) -> Tuple[int, float]:
+    return _clean_wiki_articles(workspace, size, 'streaming')
+
+
+def _benchmark_namuwiki_clean(workspace: str,
+                              size: int) -> Tuple[int, float]:
+    from expanda.ext import namuwiki
+
+    input_file = random_filename(workspace)
+    generate_namuwiki_json(input_file, size)
+    with open(input_file, 'rb') as fp:
+        articles = list(ijson.items(fp, 'item.text'))
+
+    start = time.perf_counter()
+    patterns = namuwiki._create_pattern_dict()
+    for article in articles:
+        namuwiki._clean_wiki_text(article, patterns)
+    return (sum(len(article.encode('utf-8')) for article in articles),
+            time.perf_counter() - start)
+
+
+_BENCHMARKS = {
+    'shuffle': _benchmark_shuffle,
+    'train-tokenizer': _benchmark_train_tokenizer,
+    'tokenize': _benchmark_tokenize,
+    'wikipedia-clean': _benchmark_wikipedia_clean,
+    'wikipedia-clean-streaming': _benchmark_wikipedia_clean_streaming,
+    'namuwiki-clean': _benchmark_namuwiki_clean
+}
+
+
+def run_benchmarks(names: List[str], size: int,
+                   repeat: int = 1) -> Dict[str, Dict[str, float]]:
+    r"""Run the benchmarks and measure their throughputs.
+
+    Arguments:
+        names (list): Benchmark names.
+        size (int): The approximate size of the synthetic corpus in bytes.
+        repeat (int): The number of repetitions. The fastest one is reported.
+
+    Returns:
+        Dictionary of the processed bytes, elapsed seconds and throughput in
+        MB/s of each benchmark. The benchmarks whose dependencies are not
+        installed are skipped.
+    """
+    results = {}
+    for name in names:
+        best = None
+        for _ in range(repeat):
+            workspace = tempfile.mkdtemp()
+            try:
+                nbytes, elapsed = _BENCHMARKS[name](workspace, size)
+            except ImportError as e:
+                print(f'[*] skip benchmark [{name}]: {e}')
+                break
+            finally:
+                shutil.rmtree(workspace)
+
+            if best is None or elapsed < best['seconds']:
+                best = {'bytes': nbytes,
+                        'seconds': elapsed,
+                        'throughput': nbytes / elapsed / 1e6}
+
+        if best is not None:
+            results[name] = best
+            print(f'[*] benchmark [{name}]: {best["throughput"]:.2f} MB/s '
+                  f'({best["bytes"]} bytes in {best["seconds"]:.2f}s)')
+
+    return results
+
+
+def compare_with_baseline(results: Dict[str, Dict[str, float]],
+                          baseline: Dict[str, Dict[str, float]],
+                          tolerance: float) -> List[str]:
+    r"""Compare the throughputs with the baseline.
+
+    Arguments:
+        results (dict): Benchmark results from ``run_benchmarks``.
+        baseline (dict): Benchmark results saved before.
+        tolerance (float): Allowed ratio of slowdown.
+
+    Returns:
+        List of the regressed benchmark names.
+    """
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+
+        ratio = result['throughput'] / baseline[name]['throughput']
+        print(f'[*] benchmark [{name}]: {ratio:.2f}x of baseline')
+
+        if ratio < 1 - tolerance:
+            regressions.append(name)
+    return regressions
+
+
+def _main():
+    parser = argparse.ArgumentParser(
+        prog='benchmarks', description='benchmark expanda hot paths.')
+    parser.add_argument('--size', default=8000000, type=int,
+                        help='approximate size of synthetic corpus in bytes')
+    parser.add_argument('--repeat', default=1, type=int,
+                        help='number of repetitions of each benchmark')
+    parser.add_argument('--only', nargs='+', default=list(_BENCHMARKS),
+                        choices=list(_BENCHMARKS),
+                        help='benchmarks to run')
+    parser.add_argument('--baseline', default=None,
+                        help='baseline file to compare with')
+    parser.add_argument('--save_baseline', action='store_true',
+                        help='save the results to the baseline file')
+    parser.add_argument('--tolerance', default=0.1, type=float,
+                        help='allowed ratio of slowdown from the baseline')
+    args = parser.parse_args()
+
+    results = run_benchmarks(args.only, args.size, args.repeat)
+    if args.baseline is None:
+        return
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as fp:
+            json.dump(results, fp, indent=2)
+        print(f'[*] save baseline to [{args.baseline}].')
+    elif os.path.exists(args.baseline):
+        with open(args.baseline, 'r') as fp:
+            baseline = json.load(fp)
+
+        regressions = compare_with_baseline(results, baseline, args.tolerance)
+        if regressions:
+            print(f'[*] regressed benchmarks: {", ".join(regressions)}')
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    _main()
@@ -23,10 +23,11 @@ setup(
     python_requires='>=3.6.0',
     install_requires=[
         'nltk',
-        'ijson',
+        'numpy',
+        'ijson>=3.0',
         'tqdm>=4.46.0',
         'mwparserfromhell>=0.5.4',
-        'tokenizers>=0.7.0',
+        'tokenizers>=0.10.0',
         'kss==1.3.1'
     ],
 
@@ -1,14 +1,21 @@
 import re
 import os
 import math
+import json
 import shutil
 import argparse
 from configparser import ConfigParser
+from multiprocessing import Process
+from multiprocessing.connection import wait
 from .extension import Extension
 from .shuffling import shuffle
 from .tokenization import train_tokenizer, tokenize_corpus
-from typing import List
-from .utils import random_filename, random_filenames
+from .caching import BuildCache, file_fingerprint
+from .manifest import BuildManifest, Checkpoint
+from .profiling import StageProfiler, measure_stage
+from .indexing import count_lines
+from typing import List, Tuple, Dict, Any, Optional, Callable
+from .utils import random_filename, merge_files
 
 
 def _show_extension_details(module_name: str):
@@ -49,40 +56,148 @@ def _show_required_extension_list(config_file: str):
         print(f'{ext[:25]:25s}{version[:10]:10s}')
 
 
-def _balancing_corpora(input_files: List[str], corpus_names: List[str],
-                       temporary: str):
-    corpus_size = [os.path.getsize(input_file)
-                   for input_file in input_files]
+def _balancing_rates(extract_outputs: List[List[str]],
+                     corpus_names: List[str]) -> List[int]:
+    corpus_size = [sum(os.path.getsize(name) for name in outputs)
+                   for outputs in extract_outputs]
 
     # Get maximum size and calculate repetition rate.
     max_size = max(corpus_size)
     expand_rate = [math.floor(max_size / size) for size in corpus_size]
 
     print('[*] balance the size for extracted texts.')
-    for input_file, corpus_name, rate in zip(input_files,
-                                             corpus_names,
-                                             expand_rate):
-        # Skip if no repetition case.
-        if rate == 1:
-            continue
-
-        # Rename the origin file.
-        print(f'[*] corpus [{corpus_name}] will be repeated {rate} times.')
-
-        # Repeat the texts and save to the path of origin file.
-        repeat_filename = random_filename(temporary)
-        with open(input_file, 'rb') as src, \
-                open(repeat_filename, 'wb') as dst:
-            for _ in range(rate):
-                src.seek(0)
-                shutil.copyfileobj(src, dst)
-
-        # Remove the origin file.
-        os.remove(input_file)
-        os.rename(repeat_filename, input_file)
-
-
-def _build_corpus(config_file: str):
+    for corpus_name, rate in zip(corpus_names, expand_rate):
+        if rate > 1:
+            print(f'[*] corpus [{corpus_name}] will be repeated {rate} '
+                  f'times.')
+
+    # Instead of repeating the texts in place, the extracted files would be
+    # repeated while merging. That is, the extracted files are not modified
+    # and the build can be resumed safely.
+    return expand_rate
+
+
+def _call_extension(ext: str, input_file: str, output_file: str,
+                    temporary: str, raw_args: Dict[str, str],
+                    checkpoint: Optional[Checkpoint] = None,
+                    profiler: Optional[StageProfiler] = None,
+                    result_file: Optional[str] = None) -> List[str]:
+    # The build reads the output shards of the extensions directly, without
+    # merging them into `output_file`.
+    outputs = Extension(ext).call(input_file, output_file, temporary,
+                                  raw_args, checkpoint, profiler, merge=False)
+
+    # The outputs and the records measured in the child process are passed
+    # through the file.
+    if result_file is not None:
+        with open(result_file, 'w') as fp:
+            json.dump({'outputs': outputs,
+                       'records': (profiler.records
+                                   if profiler is not None else [])}, fp)
+
+    return outputs
+
+
+def _extension_cores(ext: str, raw_args: Dict[str, str]) -> int:
+    # Extensions declare the number of their worker processes with `num-cores`
+    # argument. The others are assumed to use a single core.
+    req = Extension(ext).arg_reqs.get('num-cores', {})
+    return int(raw_args.get('num-cores', req.get('default', 1)))
+
+
+def _run_extensions(input_files: List[Tuple[str, str]],
+                    extract_filenames: List[str], temporary: str,
+                    config: ConfigParser, max_cores: int = 1,
+                    checkpoints: Optional[List[Checkpoint]] = None,
+                    callback: Optional[Callable[[int, List[str]],
+                                                None]] = None,
+                    profiler: Optional[StageProfiler] = None):
+    # The callback is called with the index of each finished extension and
+    # its output files.
+    if checkpoints is None:
+        checkpoints = [None] * len(input_files)
+
+    if max_cores <= 1 or len(input_files) <= 1:
+        for i, ((ext, input_file), name) in enumerate(zip(input_files,
+                                                          extract_filenames)):
+            print(f'[*] execute extension [{ext}] for [{input_file}]')
+            outputs = _call_extension(ext, input_file, name, temporary,
+                                      dict(config.items(ext)), checkpoints[i],
+                                      profiler)
+
+            if callback is not None:
+                callback(i, outputs)
+        return
+
+    # Execute the extensions in separate processes while the total number of
+    # their cores does not exceed `max_cores`. An extension which requires
+    # more cores than the budget would be executed alone. Note that the
+    # processes are not daemonic because the extensions can create their own
+    # child processes.
+    pending = list(enumerate(zip(input_files, extract_filenames)))
+    running = {}
+    free_cores = max_cores
+
+    while pending or running:
+        # Start the pending extensions in order while the cores are available.
+        while pending:
+            i, ((ext, input_file), name) = pending[0]
+            raw_args = dict(config.items(ext))
+            cores = min(_extension_cores(ext, raw_args), max_cores)
+            if cores > free_cores:
+                break
+
+            print(f'[*] execute extension [{ext}] for [{input_file}] '
+                  f'with {cores} cores')
+            result_file = random_filename(temporary)
+            w = Process(target=_call_extension,
+                        args=(ext, input_file, name, temporary, raw_args,
+                              checkpoints[i],
+                              StageProfiler(profiler.profile)
+                              if profiler is not None else None,
+                              result_file))
+            w.start()
+
+            running[w.sentinel] = (w, i, ext, input_file, cores, result_file)
+            free_cores -= cores
+            pending.pop(0)
+
+        # Wait for any extension to finish and release its cores.
+        for sentinel in wait(list(running)):
+            w, i, ext, input_file, cores, result_file = running.pop(sentinel)
+            w.join()
+            free_cores += cores
+
+            if w.exitcode != 0:
+                for other, *_ in running.values():
+                    other.terminate()
+                raise RuntimeError(f'extension [{ext}] for [{input_file}] is '
+                                   f'terminated abnormally.')
+
+            with open(result_file, 'r') as fp:
+                result = json.load(fp)
+            os.remove(result_file)
+
+            if profiler is not None:
+                profiler.extend(result['records'])
+            if callback is not None:
+                callback(i, result['outputs'])
+
+
+def _cache_key(cache: Optional[BuildCache], *parts: Any) -> Optional[str]:
+    # Return no key if the build cache is disabled.
+    if cache is None:
+        return None
+    return cache.key(*parts)
+
+
+def _test_dataset_lines(total_lines: int, split_ratio: float) -> int:
+    # Note that the line at the ratio is included in the test dataset.
+    return min(total_lines, math.ceil(total_lines * split_ratio) + 1)
+
+
+def _build_corpus(config_file: str, resume: bool = False,
+                  report_file: Optional[str] = None, profile: bool = False):
     # Read config file.
     config = ConfigParser()
     config.read(config_file)
@@ -97,11 +212,25 @@ def _build_corpus(config_file: str):
     temporary = config['build'].get('temporary-path', './tmp')
     vocab = config['build'].get('output-vocab', 'build/vocab.txt')
     split_ratio = config['build'].getfloat('split-ratio', 0.1)
+    memory_budget = config['build'].getint('memory-budget', 512000000)
+    seed = config['build'].getint('seed', None)
+    pipelining = config['build'].get('pipelining', '').lower() == 'true'
+    num_cores = config['build'].getint('num-cores',
+                                       fallback=os.cpu_count() or 1)
+
+    cache_path = config['build'].get('cache-path', None)
+    cache_size = config['build'].getint('cache-size', None)
+    cache_hash_content = config['build'].get('cache-hash',
+                                             '').lower() == 'content'
+
+    # Binary token-id corpus files use `.bin` extension by default.
+    output_format = config['tokenization'].get('output-format', 'text')
+    corpus_ext = 'bin' if output_format == 'binary' else 'txt'
 
     train_corpus = config['build'].get('output-train-corpus',
-                                       'build/corpus.train.txt')
+                                       f'build/corpus.train.{corpus_ext}')
     test_corpus = config['build'].get('output-test-corpus',
-                                      'build/corpus.test.txt')
+                                      f'build/corpus.test.{corpus_ext}')
     raw_corpus = config['build'].get('output-raw-corpus',
                                      'build/corpus.raw.txt')
 
@@ -110,7 +239,11 @@ def _build_corpus(config_file: str):
     vocab_size = config['tokenization'].getint('vocab-size', fallback=8000)
     limit_alphabet = config['tokenization'].getint('limit-alphabet',
                                                    fallback=1000)
+    subset_sampling = config['tokenization'].get('subset-sampling', 'head')
+    stratified_subset = config['tokenization'].get(
+        'stratified-subset', '').lower() == 'true'
     unk_token = config['tokenization'].get('unk-token', '<unk>')
+    num_workers = config['tokenization'].getint('num-workers', fallback=1)
 
     control_tokens = config['tokenization'].get('control-tokens', '')
     control_tokens = [token.strip()
@@ -130,75 +263,246 @@ def _build_corpus(config_file: str):
     create_dir(os.path.dirname(raw_corpus))
     create_dir(temporary)
 
-    # Extract raw corpus file to plain sentences.
-    extract_filenames = random_filenames(temporary, len(input_files))
-    for (ext, input_file), name in zip(input_files, extract_filenames):
-        print(f'[*] execute extension [{ext}] for [{input_file}]')
-        Extension(ext).call(input_file,
-                            name,
-                            temporary,
-                            dict(config.items(ext)))
-
-    # Balance the size of each corpus.
-    if config['build'].get('balancing', '').lower() == 'true':
-        _balancing_corpora(extract_filenames,
-                           [name for _, name in input_files],
-                           temporary)
-
-    # Gather the extracted plain text.
-    print('[*] merge extracted texts.')
-    integrate_filename = random_filename(temporary)
-    with open(integrate_filename, 'wb') as dst:
-        for name in extract_filenames:
-            with open(name, 'rb') as src:
-                shutil.copyfileobj(src, dst)
-            os.remove(name)
-
-    # Shuffle the text.
-    print('[*] start shuffling merged corpus...')
-    shuffle(integrate_filename, raw_corpus, temporary)
-    os.remove(integrate_filename)
+    # The stages are measured only if the build report is requested.
+    profiler = None
+    if report_file is not None:
+        profiler = StageProfiler(profile)
+
+    # Load the progress of the previous build if resuming. The progress is
+    # valid only for the same build configuration and input files.
+    input_fingerprints = [file_fingerprint(input_file, cache_hash_content)
+                          for _, input_file in input_files]
+    signature = json.dumps([file_fingerprint(config_file, content=True),
+                            input_fingerprints])
+    manifest = BuildManifest(temporary, signature, resume)
+
+    # Create build cache if the cache directory is given.
+    cache = None
+    if cache_path is not None:
+        cache = BuildCache(cache_path, cache_size)
+
+    # The extracted sentences of each input file can be split into the
+    # shards which are written by the workers of the extension.
+    extract_filenames = manifest.filenames('extract', len(input_files))
+    extract_outputs = [[name] for name in extract_filenames]
+    extract_keys = [
+        _cache_key(cache, 'extract', ext, Extension(ext).version,
+                   fingerprint, dict(config.items(ext)))
+        for (ext, _), fingerprint in zip(input_files, input_fingerprints)]
+
+    # Unseeded shuffling and subset sampling are not reproducible, so the
+    # shuffled corpus and the vocabulary would not be cached without the
+    # seed.
+    balancing = config['build'].get('balancing', '').lower() == 'true'
+
+    shuffle_key = None
+    if seed is not None:
+        shuffle_key = _cache_key(cache, 'shuffle', extract_keys, balancing,
+                                 memory_budget, seed)
+
+    vocab_key = _cache_key(cache, 'vocab',
+                           extract_keys if stratified_subset else shuffle_key,
+                           balancing, subset_size, vocab_size, limit_alphabet,
+                           unk_token, control_tokens, subset_sampling, seed)
+    if seed is None:
+        vocab_key = None
+
+    # Skip the stages which are completed in the previous build or whose
+    # outputs are cached.
+    vocab_ready = reuse_vocab is not None or manifest.is_completed('vocab')
+    if not vocab_ready and vocab_key is not None \
+            and cache.get(vocab_key, vocab):
+        print('[*] reuse cached vocabulary.')
+        manifest.complete('vocab', [vocab])
+        vocab_ready = True
+
+    shuffled = manifest.is_completed('shuffle')
+    if not shuffled and shuffle_key is not None \
+            and cache.get(shuffle_key, raw_corpus):
+        print('[*] reuse cached shuffled corpus.')
+        manifest.complete('shuffle', [raw_corpus],
+                          total_lines=count_lines(raw_corpus))
+        shuffled = True
+
+    if not shuffled or (stratified_subset and not vocab_ready):
+        # Extract raw corpus file to plain sentences. The extensions which
+        # are completed or cached would be skipped.
+        pending = []
+        for i, (ext, input_file) in enumerate(input_files):
+            if manifest.is_completed(f'extract-{i}'):
+                print(f'[*] skip completed extraction of [{input_file}].')
+                extract_outputs[i] = manifest.outputs(f'extract-{i}')
+            elif extract_keys[i] is not None \
+                    and cache.get(extract_keys[i], extract_filenames[i]):
+                print(f'[*] reuse cached extraction of [{input_file}].')
+                manifest.complete(f'extract-{i}', [extract_filenames[i]])
+            else:
+                pending.append(i)
+
+        def complete_extraction(j: int, outputs: List[str]):
+            i = pending[j]
+
+            # The shards are merged to be cached as a single file.
+            if extract_keys[i] is not None:
+                if outputs != [extract_filenames[i]]:
+                    merge_files(outputs, extract_filenames[i])
+                    outputs = [extract_filenames[i]]
+                cache.put(extract_keys[i], extract_filenames[i])
+
+            extract_outputs[i] = outputs
+            manifest.complete(f'extract-{i}', outputs)
+
+        # Each extension is profiled separately, so the extraction stage
+        # itself is not profiled by `cProfile`.
+        with measure_stage(profiler, 'extract',
+                           [input_files[i][1] for i in pending],
+                           profile=False) as stage:
+            _run_extensions([input_files[i] for i in pending],
+                            [extract_filenames[i] for i in pending],
+                            temporary, config, max_cores=num_cores,
+                            checkpoints=[manifest.checkpoint(f'extract-{i}')
+                                         for i in pending],
+                            callback=complete_extraction,
+                            profiler=profiler)
+            stage.outputs = [name for i in pending
+                             for name in extract_outputs[i]]
+
+        # Balance the size of each corpus by repeating the smaller ones.
+        expand_rate = [1] * len(input_files)
+        if balancing:
+            expand_rate = _balancing_rates(extract_outputs,
+                                           [name for _, name in input_files])
+
+        # Train subword tokenizer with the subset sampled from each extracted
+        # corpus separately. Note that the extracted texts are not shuffled
+        # yet. If pipelining is enabled, the tokenizer would be trained in
+        # background while merging and shuffling the corpora.
+        trainer = None
+        if not vocab_ready and stratified_subset:
+            print('[*] start training tokenizer with stratified subset...')
+            trainer_files = [name for outputs, rate
+                             in zip(extract_outputs, expand_rate)
+                             for _ in range(rate)
+                             for name in outputs]
+            trainer_args = (trainer_files, vocab, temporary, subset_size,
+                            vocab_size, limit_alphabet, unk_token,
+                            control_tokens, subset_sampling, seed)
+
+            if pipelining:
+                if profiler is not None:
+                    trainer_record = profiler.start(
+                        'train-tokenizer', trainer_files, profile=False)
+
+                trainer = Process(target=train_tokenizer, args=trainer_args)
+                trainer.start()
+            else:
+                with measure_stage(profiler, 'train-tokenizer',
+                                   trainer_files) as stage:
+                    train_tokenizer(*trainer_args)
+                    stage.outputs = [vocab]
+
+                manifest.complete('vocab', [vocab])
+                if vocab_key is not None:
+                    cache.put(vocab_key, vocab)
+                vocab_ready = True
+
+        if not shuffled:
+            # Gather the extracted plain text. The extracted texts are removed
+            # after merging unless the tokenizer is trained from them in
+            # background.
+            print('[*] merge extracted texts.')
+            integrate_filename = random_filename(temporary)
+            with measure_stage(profiler, 'merge',
+                               sum(extract_outputs, [])) as stage, \
+                    open(integrate_filename, 'wb') as dst:
+                for outputs, rate in zip(extract_outputs, expand_rate):
+                    for _ in range(rate):
+                        for name in outputs:
+                            with open(name, 'rb') as src:
+                                shutil.copyfileobj(src, dst)
+
+                    if trainer is None:
+                        for name in outputs:
+                            os.remove(name)
+                stage.outputs = [integrate_filename]
+
+            # Shuffle the text.
+            print('[*] start shuffling merged corpus...')
+            with measure_stage(profiler, 'shuffle',
+                               [integrate_filename]) as stage:
+                total_lines = shuffle(integrate_filename, raw_corpus,
+                                      temporary, memory_budget, seed)
+                stage.outputs, stage.lines_out = [raw_corpus], total_lines
+            os.remove(integrate_filename)
+
+            manifest.complete('shuffle', [raw_corpus],
+                              total_lines=total_lines)
+            if shuffle_key is not None:
+                cache.put(shuffle_key, raw_corpus)
+
+        # Wait for training tokenizer.
+        if trainer is not None:
+            trainer.join()
+            if trainer.exitcode != 0:
+                raise RuntimeError('training tokenizer is terminated '
+                                   'abnormally.')
+            if profiler is not None:
+                profiler.finish(trainer_record, [vocab])
+
+            manifest.complete('vocab', [vocab])
+            if vocab_key is not None:
+                cache.put(vocab_key, vocab)
+            vocab_ready = True
+
+    # Remove the extracted texts which are not necessary anymore.
+    for outputs in extract_outputs:
+        for name in outputs:
+            if os.path.exists(name):
+                os.remove(name)
 
     # Train subword tokenizer and tokenize the corpus.
-    print('[*] complete preparing corpus. start training tokenizer...')
+    print('[*] complete preparing corpus.')
+    total_lines = manifest.values('shuffle')['total_lines']
 
-    if reuse_vocab is None:
-        train_tokenizer(raw_corpus, vocab, temporary, subset_size, vocab_size,
-                        limit_alphabet, unk_token, control_tokens)
-    else:
+    if reuse_vocab is not None:
         # If re-using pretrained vocabulary file, skip training tokenizer.
         print(f'[*] use the given vocabulary file [{reuse_vocab}].')
         shutil.copyfile(reuse_vocab, vocab)
-
-    print('[*] create tokenized corpus.')
-    tokenize_filename = random_filename(temporary)
-    tokenize_corpus(raw_corpus, tokenize_filename, vocab, unk_token,
-                    control_tokens)
-
-    print('[*] split the corpus into train and test dataset.')
-    with open(tokenize_filename, 'rb') as src:
-        total_lines = 0
-        for _ in src:
-            total_lines += 1
-
-        src.seek(0)
-
-        # Write to test dataset.
-        with open(test_corpus, 'wb') as dst:
-            for i, line in enumerate(src):
-                dst.write(line)
-                if i >= total_lines * split_ratio:
-                    break
-
-        # Write to train dataset.
-        with open(train_corpus, 'wb') as dst:
-            shutil.copyfileobj(src, dst)
-    os.remove(tokenize_filename)
+    elif not vocab_ready:
+        with measure_stage(profiler, 'train-tokenizer',
+                           [raw_corpus]) as stage:
+            train_tokenizer(raw_corpus, vocab, temporary, subset_size,
+                            vocab_size, limit_alphabet, unk_token,
+                            control_tokens, subset_sampling, seed)
+            stage.outputs = [vocab]
+
+        manifest.complete('vocab', [vocab])
+        if vocab_key is not None:
+            cache.put(vocab_key, vocab)
+
+    # Tokenize the corpus and split into train and test dataset while writing.
+    print('[*] create tokenized corpus and split into train and test '
+          'dataset.')
+    with measure_stage(profiler, 'tokenize', [raw_corpus],
+                       total_lines) as stage:
+        stage.lines_out = tokenize_corpus(
+            raw_corpus, train_corpus, vocab, unk_token, control_tokens,
+            split_file=test_corpus,
+            split_lines=_test_dataset_lines(total_lines, split_ratio),
+            num_workers=num_workers, output_format=output_format,
+            temporary=temporary)
+        stage.outputs = [train_corpus, test_corpus]
 
     # Remove temporary directory.
     print('[*] remove temporary directory.')
     shutil.rmtree(temporary)
 
+    # Save the measured metrics of the stages.
+    if profiler is not None:
+        profiler.summarize()
+        profiler.save(report_file)
+        print(f'[*] save build report to [{report_file}].')
+
     print('[*] finish building corpus.')
 
 
@@ -227,11 +531,23 @@ def _main():
     build_parser.add_argument(
         'config', default='expanda.cfg', nargs='?',
         help='expanda configuration file')
+    build_parser.add_argument(
+        '--resume', action='store_true',
+        help='resume the previous build by skipping the completed stages')
+    build_parser.add_argument(
+        '--report', default=None,
+        help='save the metrics of each build stage to JSON report file')
+    build_parser.add_argument(
+        '--profile', action='store_true',
+        help='profile each build stage by cProfile and add to the report')
 
     args = parser.parse_args()
+    if args.command == 'build' and args.profile and args.report is None:
+        build_parser.error('--profile requires --report')
+
     if args.command == 'list':
         _show_required_extension_list(args.config)
     elif args.command == 'show':
         _show_extension_details(args.extension)
     elif args.command == 'build':
-        _build_corpus(args.config)
+        _build_corpus(args.config, args.resume, args.report, args.profile)
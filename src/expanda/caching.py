@@ -0,0 +1,116 @@
+import os
+import json
+import shutil
+import hashlib
+from typing import Any, Optional
+
+
+def file_fingerprint(filename: str, content: bool = False) -> str:
+    r"""Create a fingerprint of the file.
+
+    By default, the fingerprint consists of the absolute path, size and
+    modification time of the file, so it can be created without reading the
+    file. If `content` is ``True``, the hash of the file content is used
+    instead.
+
+    Arguments:
+        filename (str): File path.
+        content (bool): Whether to hash the content of the file.
+
+    Returns:
+        The fingerprint of the file.
+    """
+    if not content:
+        stat = os.stat(filename)
+        return f'{os.path.abspath(filename)}:{stat.st_size}:{stat.st_mtime_ns}'
+
+    sha256 = hashlib.sha256()
+    with open(filename, 'rb') as fp:
+        for chunk in iter(lambda: fp.read(1048576), b''):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+class BuildCache(object):
+    r"""Content-addressed cache of build outputs.
+
+    Each output file is stored in `directory` under the key which is derived
+    from everything affecting the output, e.g. the fingerprint of the input
+    file, the version of the extension and the arguments. If the total size of
+    the cached files exceeds `max_size`, the least recently used files would be
+    evicted.
+
+    Arguments:
+        directory (str): Cache directory path.
+        max_size (int): The maximum total size of cached files in bytes. If it
+            is ``None``, the files would not be evicted.
+    """
+    def __init__(self, directory: str, max_size: Optional[int] = None):
+        self.directory = directory
+        self.max_size = max_size
+
+        os.makedirs(directory, exist_ok=True)
+
+    def key(self, *parts: Any) -> str:
+        r"""Create a cache key from the JSON-serializable parts."""
+        encoded = json.dumps(parts, sort_keys=True).encode('utf-8')
+        return hashlib.sha256(encoded).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key)
+
+    def get(self, key: str, output_file: str) -> bool:
+        r"""Restore the cached file to `output_file`.
+
+        Arguments:
+            key (str): Cache key.
+            output_file (str): Output file path.
+
+        Returns:
+            ``True`` if the file is cached, otherwise ``False``.
+        """
+        if not os.path.exists(self._path(key)):
+            return False
+
+        # Update the modification time to mark the file as recently used.
+        os.utime(self._path(key))
+        shutil.copyfile(self._path(key), output_file)
+        return True
+
+    def put(self, key: str, input_file: str):
+        r"""Store the copy of `input_file` to the cache.
+
+        Arguments:
+            key (str): Cache key.
+            input_file (str): File path to store.
+        """
+        # Copy the file to temporary name first to prevent from reading
+        # incomplete file.
+        shutil.copyfile(input_file, self._path(key) + '.tmp')
+        os.replace(self._path(key) + '.tmp', self._path(key))
+
+        self.evict(keep=key)
+
+    def evict(self, keep: Optional[str] = None):
+        r"""Remove the least recently used files to fit in the maximum size.
+
+        Arguments:
+            keep (str): Optional cache key which should not be evicted.
+        """
+        if self.max_size is None:
+            return
+
+        entries = [os.path.join(self.directory, name)
+                   for name in os.listdir(self.directory)
+                   if not name.endswith('.tmp')]
+        entries.sort(key=os.path.getmtime)
+
+        total_size = sum(os.path.getsize(entry) for entry in entries)
+        for entry in entries:
+            if total_size <= self.max_size:
+                break
+            if os.path.basename(entry) == keep:
+                continue
+
+            total_size -= os.path.getsize(entry)
+            os.remove(entry)
@@ -0,0 +1,107 @@
+import os
+import codecs
+import numpy as np
+from typing import List, Union, Optional
+from .indexing import (build_line_index, load_line_index, index_element_size,
+                       index_filename)
+
+
+_SNIFF_SIZE = 65536
+
+
+def _is_binary_corpus(corpus_file: str) -> bool:
+    with open(corpus_file, 'rb') as fp:
+        head = fp.read(_SNIFF_SIZE)
+
+    # Tokenized text never contains null characters, while packed token ids
+    # do in most cases. The head may end in the middle of a character, so it
+    # is decoded incrementally.
+    if b'\x00' in head:
+        return True
+    try:
+        codecs.getincrementaldecoder('utf-8')().decode(head, final=False)
+    except UnicodeDecodeError:
+        return True
+    return False
+
+
+class Dataset(object):
+    r"""Random-access reader of corpus dataset built by Expanda.
+
+    The corpus file is mapped to the memory and each sentence is read through
+    the line-offset index, so any sentence can be read in :math:`O(1)` without
+    loading the whole file. Both text and binary token-id formats are
+    supported. Sentences in text format are read as strings and ones in binary
+    format are read as ``numpy.ndarray`` of token ids.
+
+    Note:
+        If the index file does not exist, it would be built from the corpus
+        file and saved next to it. Binary token-id files cannot be indexed
+        again, so ``FileNotFoundError`` is raised if their index files do not
+        exist.
+
+    Arguments:
+        corpus_file (str): Corpus file path.
+        index_file (str): Optional line-offset index file path. The default is
+            the index file persisted next to the corpus file.
+    """
+    def __init__(self, corpus_file: str, index_file: Optional[str] = None):
+        if index_file is None:
+            index_file = index_filename(corpus_file)
+        if not os.path.exists(index_file):
+            if _is_binary_corpus(corpus_file):
+                raise FileNotFoundError(f'index file [{index_file}] of binary '
+                                        f'corpus does not exist.')
+            build_line_index(corpus_file, index_file)
+
+        self.offsets = load_line_index(index_file)
+
+        # Text files consist of characters whose size is 1.
+        element_size = index_element_size(index_file)
+        self.dtype = None if element_size == 1 else f'<u{element_size}'
+
+        # Empty file cannot be mapped to the memory.
+        if os.path.getsize(corpus_file) > 0:
+            self.data = np.memmap(corpus_file, dtype=np.uint8, mode='r')
+        else:
+            self.data = np.zeros(0, dtype=np.uint8)
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def _read(self, index: int) -> Union[str, np.ndarray]:
+        data = self.data[self.offsets[index]:self.offsets[index + 1]]
+
+        if self.dtype is None:
+            return data.tobytes().decode('utf-8').rstrip('\n')
+        return data.view(self.dtype)
+
+    def __getitem__(self, index: Union[int, slice]
+                    ) -> Union[str, np.ndarray, List[Union[str, np.ndarray]]]:
+        if isinstance(index, slice):
+            return [self._read(i) for i in range(*index.indices(len(self)))]
+
+        if index < 0:
+            index += len(self)
+        if index < 0 or index >= len(self):
+            raise IndexError('dataset index out of range')
+
+        return self._read(index)
+
+    def sample(self, batch_size: int,
+               rng: Optional[np.random.Generator] = None
+               ) -> List[Union[str, np.ndarray]]:
+        r"""Sample random sentences from the dataset.
+
+        Arguments:
+            batch_size (int): The number of sentences to sample.
+            rng (numpy.random.Generator): Optional random generator.
+
+        Returns:
+            List of sampled sentences.
+        """
+        if rng is None:
+            rng = np.random.default_rng()
+
+        return [self._read(i) for i in rng.integers(len(self),
+                                                    size=batch_size)]
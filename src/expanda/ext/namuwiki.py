@@ -1,198 +1,409 @@
 import os
 import re
-import kss
 import ijson
-import shutil
-from typing import Dict, Any, Pattern
+from types import ModuleType
+from typing import (List, Dict, Any, Pattern, Iterable, Iterator, Tuple,
+                    IO)
 from multiprocessing import Process, Queue
-from expanda.utils import random_filenames
+from expanda.utils import random_filenames, iterate_batches
+from expanda.splitting import (SentenceSplitter, create_splitter,
+                               prepare_splitter, split_lines)
+
+
+_BATCH_MAX_LENGTH = 1024 * 1024
+_IJSON_BACKENDS = ['yajl2_c', 'yajl2_cffi', 'yajl2', 'python']
+_SCAN_CHUNK_SIZE = 1024 * 1024
+_QUEUE_BATCHES_PER_CORE = 4
+
+
+# The patterns are compiled once when the module is imported and shared by
+# all articles.
+_STROKEOUT_PATTERN = re.compile(r'--.*?--|~~.*?~~')
+_UNDERLINE_PATTERN = re.compile(r'__(.*?)__')
+_BOLD_PATTERN = re.compile(r'\'\'\'(.*?)\'\'\'')
+_ITALICS_PATTERN = re.compile(r'\'\'(.*?)\'\'')
+_LINK_PATTERN = re.compile(r'\[\[(?:[^]]*?\|)?(.*?)(?:#.*?)?\]\]')
+_MACRO_PATTERN = re.compile(r'\[.*?\]')
+_INNERMOST_BRACKET_PATTERN = re.compile(r'\([^(]*?\)')
+_BRACKET_PATTERN = re.compile(r'[()]')
+_SPACES_PATTERN = re.compile(r' {2,}')
+
+_UNUSUAL_QUOTES = [('\x60', '\''), ('\xb4', '\''), ('\u2018', '\''),
+                   ('\u2019', '\''), ('\u201c', '"'), ('\u201d', '"')]
 
 
 def _create_pattern_dict() -> Dict[str, Pattern[str]]:
-    return {'strokeout': re.compile(r'--.*?--|~~.*?~~'),
-            'underline': re.compile(r'__(.*?)__'),
-            'bold': re.compile(r'\'\'\'(.*?)\'\'\''),
-            'italics': re.compile(r'\'\'(.*?)\'\''),
-            'link': re.compile(r'\[\[(?:[^]]*?\|)?(.*?)(?:#.*?)?\]\]'),
-            'macro': re.compile(r'\[.*?\]'),
-            'bracket': re.compile(r'\([^(]*?\)'),
-            'others': re.compile(r'^[ >*|].*?', re.M),
-            'single-quote': re.compile('[\x60\xb4\u2018\u2019]'),
-            'double-quote': re.compile('[\u201c\u201d]')}
-
-
-def _modified_removing_lines_without_punctuation(text: str) -> str:
-    filtered = []
-    for line in text.splitlines():
-        line = line.rstrip()
-        if line and line[-1] in '.!?':
-            filtered.append(line)
-    return '\n'.join(filtered)
+    return {'strokeout': _STROKEOUT_PATTERN,
+            'underline': _UNDERLINE_PATTERN,
+            'bold': _BOLD_PATTERN,
+            'italics': _ITALICS_PATTERN,
+            'link': _LINK_PATTERN,
+            'macro': _MACRO_PATTERN}
+
+
+def _unwrap(pattern: Pattern[str], code: str) -> str:
+    # Splitting by the pattern yields the texts between the matches and the
+    # first group of each match, so joining them is same as substituting the
+    # matches with the first group. It avoids expanding the replacement
+    # template for every match.
+    return ''.join(pattern.split(code))
+
+
+def _unwrap_repeatedly(pattern: Pattern[str], token: str, code: str) -> str:
+    # Unwrap the matches until nothing is matched. Note that `token` is a
+    # substring which every match contains.
+    while token in code:
+        parts = pattern.split(code)
+        if len(parts) == 1:
+            break
+        code = ''.join(parts)
+    return code
 
 
-def _modified_removing_unnecessary_spaces(text: str) -> str:
-    replaced = text.replace('\n', ' ').replace('\t', ' ')
-    while '  ' in replaced:
-        replaced = replaced.replace('  ', ' ')
-    return replaced
+def _remove_brackets(text: str) -> str:
+    # Removing the innermost brackets repeatedly is same as removing every
+    # matched pair of brackets with its content. Since most brackets are not
+    # nested, the innermost ones are removed by the pattern first. After that,
+    # the rest pairs are matched with a stack in a single scan, and unmatched
+    # brackets remain.
+    if '(' not in text:
+        return text
+
+    text = _INNERMOST_BRACKET_PATTERN.sub('', text)
+    if '(' not in text or ')' not in text:
+        return text
+
+    stack, removed = [], []
+    for match in _BRACKET_PATTERN.finditer(text):
+        if match.group() == '(':
+            stack.append(match.start())
+        elif stack:
+            start = stack.pop()
+
+            # Remove the nested ranges which are covered by the outer one.
+            while removed and removed[-1][0] > start:
+                removed.pop()
+            removed.append((start, match.end()))
+
+    if not removed:
+        return text
+
+    pieces, offset = [], 0
+    for start, end in removed:
+        pieces.append(text[offset:start])
+        offset = end
+    pieces.append(text[offset:])
+
+    return ''.join(pieces)
 
 
 def _clean_wiki_text(code: str, patterns: Dict[str, Pattern[str]]) -> str:
-    # Remove strokeouts and clear underlines.
-    code = patterns['strokeout'].sub('', code)
-    code = patterns['underline'].sub(r'\1', code)
+    # Remove strokeouts and clear underlines. The substitutions are skipped if
+    # there is no markup in the article.
+    if '--' in code or '~~' in code:
+        code = patterns['strokeout'].sub('', code)
+    if '__' in code:
+        code = _unwrap(patterns['underline'], code)
 
     # Clear bold and italics text.
-    while patterns['bold'].search(code):
-        code = patterns['bold'].sub(r'\1', code)
-
-    while patterns['italics'].search(code):
-        code = patterns['italics'].sub(r'\1', code)
+    code = _unwrap_repeatedly(patterns['bold'], "'''", code)
+    code = _unwrap_repeatedly(patterns['italics'], "''", code)
 
     # Render links and macros.
-    code = patterns['link'].sub(r'\1', code)
-    code = patterns['macro'].sub('', code)
+    if '[' in code:
+        code = _unwrap(patterns['link'], code)
+        code = patterns['macro'].sub('', code)
+
+    # Remove the lines without punctuation and the leading list, quote and
+    # table marks, and then join the lines with spaces in a single pass.
+    lines = []
+    for line in code.splitlines():
+        line = line.rstrip()
+        if line and line[-1] in '.!?':
+            lines.append(line[1:] if line[0] in ' >*|' else line)
+    code = _SPACES_PATTERN.sub(' ', ' '.join(lines).replace('\t', ' '))
 
-    # Cleanup the rest messy texts.
+    # Remove unnecessary brackets and replace unusual quotes.
+    code = _remove_brackets(code)
+    for quote, replacement in _UNUSUAL_QUOTES:
+        if quote in code:
+            code = code.replace(quote, replacement)
 
-    # Instead of using below comment code, using modified function consumes
-    # much faster.
-    # code = patterns['without_punct'].sub('', code)
-    code = _modified_removing_lines_without_punctuation(code)
+    return code
 
-    code = patterns['others'].sub('', code)
 
-    # Instead of using below comment code, using modified function consumes
-    # much faster.
-    # while patterns['spacing'].search(code):
-    #     code = patterns['spacing'].sub(' ', code)
-    code = _modified_removing_unnecessary_spaces(code)
+def _split_sentences(lines: Iterable[str], splitter: SentenceSplitter,
+                     min_len: int, max_len: int,
+                     split_sent: bool = True) -> Iterator[str]:
+    total_lines = ''
+    for s in split_lines(splitter, lines):
+        if s is None:
+            # Yield the rest sentences.
+            if not split_sent and len(total_lines.strip()) > min_len:
+                yield total_lines.strip()
+            total_lines = ''
+            continue
+
+        # Skip extraordinary sentences
+        s = s.strip()
+        if s and s[0] in '*<-|':
+            continue
+
+        if split_sent:
+            if len(s) > min_len and len(s.strip()) < max_len:
+                yield s
+        else:
+            if len(total_lines) + len(s) > max_len:
+                yield total_lines.strip()
+                total_lines = ''
+            total_lines += s + ' '
 
-    # Remove unnecessary brackets.
-    while patterns['bracket'].search(code):
-        code = patterns['bracket'].sub('', code)
 
-    # Replace unusual quotes.
-    code = patterns['single-quote'].sub('\'', code)
-    code = patterns['double-quote'].sub('"', code)
+def _write_article_sentences(fp: IO[str], codes: List[str],
+                             patterns: Dict[str, Pattern[str]],
+                             splitter: SentenceSplitter,
+                             min_len: int, max_len: int, split_sent: bool):
+    # Clean the wiki articles and split into the sentences directly, without
+    # writing the cleaned articles to the intermediate file. Note that each
+    # article ends with an empty line.
+    lines = ''.join(_clean_wiki_text(code, patterns) + '\n\n'
+                    for code in codes).splitlines(True)
+    for s in _split_sentences(lines, splitter, min_len, max_len, split_sent):
+        fp.write(s + '\n')
 
-    return code
 
+def _process_article_worker(output_file: str, splitter: str, min_len: int,
+                            max_len: int, split_sent: bool, queue: Queue):
+    sentence_splitter = create_splitter('ko', splitter)
 
-def _process_article_worker(output_file: str, queue: Queue):
     with open(output_file, 'w', encoding='utf-8') as fp:
         patterns = _create_pattern_dict()
         while True:
-            code = queue.get()
-            if code is None:
+            batch = queue.get()
+            if batch is None:
                 break
 
-            # Write cleaned wiki articles into the output file.
-            fp.write(_clean_wiki_text(code, patterns) + '\n\n')
-
+            _write_article_sentences(fp, batch, patterns, sentence_splitter,
+                                     min_len, max_len, split_sent)
+
+
+def _get_ijson_backend() -> ModuleType:
+    # Use the fastest available backend. `yajl2_c` is a C extension which is
+    # much faster than the pure-python backend.
+    for name in _IJSON_BACKENDS:
+        try:
+            return ijson.get_backend(name)
+        except ImportError:
+            pass
+    return ijson
+
+
+def _iterate_articles(fp: IO[bytes],
+                      backend: ModuleType = ijson) -> Iterator[str]:
+    # Materialize the article contents only, instead of handling every event
+    # of the other fields in python.
+    for value in backend.items(fp, 'item.text'):
+        # Skip redirection pages.
+        if value.lower().strip().startswith('#redirect'):
+            continue
+
+        yield value
+
+
+def _find_in_file(fp: IO[bytes], pattern: bytes, start: int,
+                  end: int) -> int:
+    # Find the pattern by reading the file in chunks. The chunks overlap so
+    # the pattern across the chunks can be found as well.
+    position = start
+    while position < end:
+        fp.seek(position)
+        chunk = fp.read(min(_SCAN_CHUNK_SIZE, end - position))
+
+        index = chunk.find(pattern)
+        if index >= 0:
+            return position + index
+
+        if position + len(chunk) >= end:
+            break
+        position += len(chunk) - len(pattern) + 1
+    return -1
+
+
+def _find_article_ranges(input_file: str, n: int) -> List[Tuple[int, int]]:
+    with open(input_file, 'rb') as fp:
+        size = os.fstat(fp.fileno()).st_size
+
+        # Learn the boundary marker of the articles from the first article,
+        # e.g. `{"namespace":`. Because double quotes in strings are escaped,
+        # the marker only appears at the beginning of the articles.
+        head = fp.read(_SCAN_CHUNK_SIZE)
+        first = head.find(b'{')
+        if first < 0:
+            # The dump has no article, e.g. an empty array.
+            return []
+
+        marker = head[first:head.find(b':', head.find(b'"', first) + 1) + 1]
+
+        # The dump ends with the closing bracket of the array.
+        fp.seek(max(size - _SCAN_CHUNK_SIZE, 0))
+        tail = fp.read()
+        last = size - len(tail) + tail.rfind(b']')
+
+        # Find the beginning of the article after each evenly-spaced position.
+        boundaries = [first]
+        for i in range(1, n):
+            position = _find_in_file(fp, marker,
+                                     max(first + i * (last - first) // n,
+                                         boundaries[-1] + 1),
+                                     last)
+            if position < 0:
+                break
+            boundaries.append(position)
 
-def _tokenize_sentences_worker(input_file: str, output_file: str,
-                               min_len: int, max_len: int,
-                               split_sent: bool = True):
-    with open(input_file, 'r', encoding='utf-8') as src, \
-            open(output_file, 'w', encoding='utf-8') as dst:
-        total_lines = ''
-        for line in src:
-            if not line.strip():
-                # Write the rest sentences.
-                if not split_sent and len(total_lines.strip()) > min_len:
-                    dst.write(total_lines.strip() + '\n')
-                total_lines = ''
+        # Each range ends at the separating comma of the articles.
+        ranges = []
+        for start, next_start in zip(boundaries, boundaries[1:] + [None]):
+            if next_start is None:
+                ranges.append((start, last))
                 continue
 
-            for s in kss.split_sentences(line):
-                # Skip extraordinary sentences
-                s = s.strip()
-                if s and s[0] in '*<-|':
-                    continue
+            gap_start = max(next_start - _SCAN_CHUNK_SIZE, start)
+            fp.seek(gap_start)
+            gap = fp.read(next_start - gap_start).rstrip()
+            ranges.append((start, gap_start + len(gap) - 1))
 
-                if split_sent:
-                    if len(s) > min_len and len(s.strip()) < max_len:
-                        dst.write(s + '\n')
-                else:
-                    if len(total_lines) + len(s) > max_len:
-                        dst.write(total_lines.strip() + '\n')
-                        total_lines = ''
-                    total_lines += s + ' '
+    return ranges
 
 
-def _extract_namu_wiki_json(input_file: str, output_file: str, temporary: str,
-                            args: Dict[str, Any]):
-    # Prepare processes and queue for serving extracted wiki articles.
-    workers = []
-    queue = Queue(maxsize=50 * args['num-cores'])
-    extract_filenames = random_filenames(temporary, args['num-cores'])
+class _RangeReader(object):
+    def __init__(self, fp: IO[bytes], start: int, end: int):
+        self.fp = fp
+        self.start = start
+        self.end = end
+        self.chunks = self._iterate_chunks()
 
-    for i in range(args['num-cores']):
-        w = Process(target=_process_article_worker,
-                    args=(extract_filenames[i], queue))
+    def _iterate_chunks(self) -> Iterator[bytes]:
+        # Wrap the articles in the range with brackets to make a JSON array.
+        yield b'['
+
+        self.fp.seek(self.start)
+        remaining = self.end - self.start
+        while remaining > 0:
+            chunk = self.fp.read(min(_SCAN_CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+
+            remaining -= len(chunk)
+            yield chunk
+
+        yield b']'
+
+    def read(self, size: int = -1) -> bytes:
+        # Note that `ijson` reads zero bytes to check the type of the file.
+        if size == 0:
+            return b''
+        return next(self.chunks, b'')
+
+
+def _process_range_worker(input_file: str, start: int, end: int,
+                          output_file: str, splitter: str, min_len: int,
+                          max_len: int, split_sent: bool, batch_size: int):
+    backend = _get_ijson_backend()
+    patterns = _create_pattern_dict()
+    sentence_splitter = create_splitter('ko', splitter)
+
+    with open(input_file, 'rb') as src, \
+            open(output_file, 'w', encoding='utf-8') as dst:
+        articles = _iterate_articles(_RangeReader(src, start, end), backend)
+        for batch in iterate_batches(articles, batch_size, _BATCH_MAX_LENGTH):
+            _write_article_sentences(dst, batch, patterns, sentence_splitter,
+                                     min_len, max_len, split_sent)
+
+
+def _extract_namu_wiki_ranges(input_file: str, temporary: str,
+                              args: Dict[str, Any]) -> List[str]:
+    # Split the dump into the ranges of articles and parse each range in
+    # parallel.
+    ranges = _find_article_ranges(input_file, args['num-cores'])
+    shard_filenames = random_filenames(temporary, len(ranges))
+
+    workers = []
+    for (start, end), name in zip(ranges, shard_filenames):
+        w = Process(target=_process_range_worker,
+                    args=(input_file, start, end, name, args['splitter'],
+                          args['min-length'], args['max-length'],
+                          args['split-sent'] == 'true', args['batch-size']))
         w.daemon = True
         w.start()
         workers.append(w)
 
-    # Open `input_file` wiki dump and parse json data.
-    with open(input_file, 'r', encoding='utf-8') as fp:
-        parser = ijson.parse(fp)
+    for w in workers:
+        w.join()
 
-        for prefix, event, value in parser:
-            if not prefix.endswith('.text'):
-                continue
+    for w in workers:
+        if w.exitcode != 0:
+            raise RuntimeError('parsing namuwiki dump is terminated '
+                               'abnormally.')
 
-            # Skip redirection pages.
-            if value.lower().strip().startswith('#redirect'):
-                continue
+    return shard_filenames
 
-            # Serve raw-formatted wiki article to the processes.
-            queue.put(value)
 
-    # Notify the processes of that parsing is finished and wait for terminating
-    # the processes.
-    for _ in range(args['num-cores']):
-        queue.put(None)
-    for w in workers:
-        w.join()
+def _extract_namu_wiki_shards(input_file: str, temporary: str,
+                              args: Dict[str, Any]) -> List[str]:
+    print(f'[*] use ijson backend [{_get_ijson_backend().backend_name}].')
+
+    # Prepare sentence tokenizer before starting the workers.
+    prepare_splitter('ko', args['splitter'])
 
-    # Start tokenization processes.
+    if args['parallel-parse'] == 'true' and args['num-cores'] > 1:
+        return _extract_namu_wiki_ranges(input_file, temporary, args)
+
+    # Prepare the workers which clean the articles and split them into the
+    # sentences. Every worker has its own queue and the batches are dealt to
+    # the workers in turn, so the shards do not depend on the scheduling.
     workers = []
-    split_filenames = random_filenames(temporary, args['num-cores'])
+    queues = [Queue(maxsize=_QUEUE_BATCHES_PER_CORE)
+              for _ in range(args['num-cores'])]
+    shard_filenames = random_filenames(temporary, args['num-cores'])
 
     for i in range(args['num-cores']):
-        w = Process(target=_tokenize_sentences_worker,
-                    args=(extract_filenames[i],
-                          split_filenames[i],
-                          args['min-length'],
-                          args['max-length'],
-                          args['split-sent'] == 'true'))
+        w = Process(target=_process_article_worker,
+                    args=(shard_filenames[i], args['splitter'],
+                          args['min-length'], args['max-length'],
+                          args['split-sent'] == 'true', queues[i]))
         w.daemon = True
         w.start()
-
         workers.append(w)
 
-    # Wait for terminating the processes and remove temporarily created files.
+    # Open `input_file` wiki dump and parse json data. The articles are sent
+    # in batches to reduce the overhead of the queue.
+    with open(input_file, 'rb') as fp:
+        batches = iterate_batches(_iterate_articles(fp, _get_ijson_backend()),
+                                  args['batch-size'], _BATCH_MAX_LENGTH)
+        for i, batch in enumerate(batches):
+            queues[i % args['num-cores']].put(batch)
+
+    # Notify the processes of that parsing is finished and wait for terminating
+    # the processes.
+    for queue in queues:
+        queue.put(None)
     for w in workers:
         w.join()
-    for name in extract_filenames:
-        os.remove(name)
 
-    # Merge all tokenized files into `output_file`.
-    with open(output_file, 'wb') as dst:
-        for name in split_filenames:
-            with open(name, 'rb') as src:
-                shutil.copyfileobj(src, dst)
+    return shard_filenames
+
 
-    # Remove temporary files.
-    for name in split_filenames:
-        os.remove(name)
+def _extract_namu_wiki_json(input_file: str, output_file: str, temporary: str,
+                            args: Dict[str, Any]) -> List[str]:
+    # The shards are returned without merging, so the build can read them
+    # directly. They are merged into `output_file` by `Extension.call` if
+    # necessary.
+    return _extract_namu_wiki_shards(input_file, temporary, args)
 
 
 __extension__ = {
     'name': 'namuwiki extractor',
-    'version': '1.0',
+    'version': '1.1',
     'description': 'extract namuwiki json file.',
     'author': 'expanda',
     'main': _extract_namu_wiki_json,
@@ -201,5 +412,8 @@ __extension__ = {
         'min-length': {'type': int, 'default': 50},
         'max-length': {'type': int, 'default': 1000},
         'split-sent': {'type': str, 'default': 'true'},
+        'batch-size': {'type': int, 'default': 64},
+        'parallel-parse': {'type': str, 'default': 'true'},
+        'splitter': {'type': str, 'default': 'default'},
     }
 }
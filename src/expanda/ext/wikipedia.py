@@ -1,12 +1,53 @@
+import io
 import os
 import re
 import bz2
-import shutil
+import mmap
+import html
+import itertools
 import mwparserfromhell as mw
 import xml.etree.cElementTree as etree
-from typing import List, Dict, Any
+from typing import (List, Dict, Any, Iterable, Iterator, Optional, Pattern,
+                    Tuple, IO)
 from multiprocessing import Process, Queue
-from expanda.utils import random_filenames
+from expanda.utils import random_filenames, iterate_batches
+from expanda.manifest import Checkpoint
+from expanda.splitting import (SentenceSplitter, create_splitter,
+                               prepare_splitter, split_lines)
+
+
+_BZ2_STREAM_HEADER = re.compile(rb'BZh[1-9]1AY&SY')
+_STREAM_CHUNK_SIZE = 4 * 1024 * 1024
+_BATCH_MAX_LENGTH = 1024 * 1024
+_QUEUE_BATCHES_PER_CORE = 4
+_CHECKPOINT_BATCHES = 16
+
+_REMOVED_TEMPLATES = {'reflist', 'notelist', 'notelist-ua', 'notelist-lr',
+                      'notelist-ur', 'notelist-lg'}
+_REMOVED_TAGS = {'ref', 'table'}
+
+_BRACKETS_PATTERN = re.compile(r'\([^(]*?\)')
+_DOUBLE_QUOTES_PATTERN = re.compile('[\u201c\u201d]')
+_SINGLE_QUOTES_PATTERN = re.compile('[\x60\xb4\u2018\u2019]')
+
+# The tags which are removed with their contents by the streaming cleaner.
+# Note that `ref` and `table` are filtered, and the rest are invisible in
+# `mwparserfromhell`.
+_STREAMING_REMOVED_TAGS = {'ref', 'table', 'categorytree', 'gallery', 'graph',
+                           'imagemap', 'inputbox', 'math', 'score', 'section',
+                           'templatedata', 'timeline'}
+
+_COMMENT_PATTERN = re.compile(r'<!--.*?(?:-->|$)', re.S)
+_HEADING_PATTERN = re.compile(r'^(={1,6})(.+?)\1[ \t]*$', re.M)
+_WIKI_TOKEN_PATTERN = re.compile(
+    r'(?P<braces>\{\{+|\}\}+)'
+    r'|(?P<table>^[ \t]*(?:\{\||\|\}))'
+    r'|(?P<link>\[\[|\]\])'
+    r'|(?P<external>\[(?=(?:https?:|ftp:)?//)|\])'
+    r'|(?P<element><(?P<close>/?)(?P<tag>[a-zA-Z][a-zA-Z0-9]*)'
+    r'(?:\s[^<>]*?)?(?P<void>/?)>)'
+    r'|(?P<quotes>\'\'+)'
+    r'|(?P<list>^[*#:;]+)', re.M)
 
 
 def _modified_removing_unnecessary_spaces(text: str) -> str:
@@ -16,54 +57,204 @@ def _modified_removing_unnecessary_spaces(text: str) -> str:
     return replaced
 
 
-def _clean_wiki_text(code: str, ns: List[str] = []) -> str:
-    # Parse wiki code by using `mwparserfromhell` and create namespace-based
-    # wiki-link pattern.the
-    wiki = mw.parse(code)
-    regex_mw_nslinks = re.compile('^(?:{}):'.format('|'.join(ns)),
-                                  re.IGNORECASE)
-
-    # Simple remove wrapper function.0
-    def remove_element(section, obj):
-        try:
-            section.remove(obj)
-        except ValueError:
-            pass
-
-    # Filter functions to remove from mediawiki code.
-    def filter_wikilinks(obj):
-        return bool(regex_mw_nslinks.match(str(obj.title)))
-
-    def filter_templates(obj):
-        return obj.name.lower() in {'reflist', 'notelist',
-                                    'notelist-ua', 'notelist-lr',
-                                    'notelist-ur', 'notelist-lg'}
-
-    def filter_tags(obj):
-        return str(obj.tag) in {'ref', 'table'}
-
-    section_text = []
-    for section in wiki.get_sections(flat=True,
-                                     include_lead=True):
-        # Remove elements filtered by above functions.
-        for obj in section.ifilter_wikilinks(matches=filter_wikilinks,
-                                             recursive=True):
-            remove_element(section, obj)
-        for obj in section.ifilter_templates(matches=filter_templates,
-                                             recursive=True):
-            remove_element(section, obj)
-        for obj in section.ifilter_tags(matches=filter_tags, recursive=True):
-            remove_element(section, obj)
-
-        # Add cleaned wiki contents to list.
-        section_text.append(section.strip_code().strip())
+def _strip_wiki_code(code: str,
+                     regex_mw_nslinks: Pattern[str]) -> Optional[str]:
+    # Strip the wiki code in a single pass over the tokens, without building
+    # the syntax tree. The templates, tables, references, invisible tags and
+    # namespace links are removed, and the other markups are rendered to
+    # their texts. It returns `None` if the code is not well-formed, e.g.
+    # unbalanced brackets or `<nowiki>` tags, so it should be parsed by
+    # `mwparserfromhell` instead.
+    code = _COMMENT_PATTERN.sub('', code)
+    code = _HEADING_PATTERN.sub(r'\2', code)
+
+    # `links` is the stack of the opened links with their starting positions
+    # in `output`. Note that the contents of templates, tables and removed
+    # tags are hidden.
+    output, links = [], []
+    braces, tables, tag, tags = 0, 0, None, 0
+
+    offset = 0
+    for match in _WIKI_TOKEN_PATTERN.finditer(code):
+        if not braces and not tables and tag is None:
+            output.append(code[offset:match.start()])
+        offset = match.end()
+
+        kind, token = match.lastgroup, match.group()
+        if braces and kind != 'braces':
+            continue
+        if tag is not None and kind != 'element':
+            continue
+        if tables and kind not in ('braces', 'table'):
+            continue
+
+        if kind == 'braces':
+            if token[0] == '{':
+                braces += len(token)
+            elif len(token) > braces:
+                return None
+            else:
+                braces -= len(token)
+        elif kind == 'table':
+            if token.strip() == '{|':
+                tables += 1
+            elif tables:
+                tables -= 1
+            else:
+                return None
+        elif kind == 'element':
+            name = match.group('tag').lower()
+            if tag is not None:
+                # Find the closing tag of the removed one.
+                if name == tag and match.group('close'):
+                    tags -= 1
+                elif name == tag and not match.group('void'):
+                    tags += 1
+                if tags == 0:
+                    tag = None
+            elif name == 'nowiki':
+                return None
+            elif (name in _STREAMING_REMOVED_TAGS
+                  and not match.group('close') and not match.group('void')):
+                tag, tags = name, 1
+        elif kind == 'link' and token == '[[':
+            links.append(('link', len(output)))
+        elif kind == 'link':
+            if not links or links[-1][0] != 'link':
+                return None
+
+            # Render the link to its text, or remove the namespace link.
+            text = ''.join(output[links[-1][1]:])
+            del output[links.pop()[1]:]
+
+            title, pipe, text = text.partition('|')
+            if not regex_mw_nslinks.match(title):
+                output.append(text if pipe else title)
+        elif token == '[':
+            links.append(('external', len(output)))
+        elif kind == 'external':
+            if not links or links[-1][0] != 'external':
+                output.append(token)
+                continue
+
+            # Render the external link to its title without the url.
+            text = ''.join(output[links[-1][1]:])
+            del output[links.pop()[1]:]
+
+            output.append(text.partition(' ')[2])
+        elif kind == 'quotes':
+            # Four apostrophes are an apostrophe with bold markup, and the
+            # apostrophes more than five are remained.
+            output.append('\'' if len(token) == 4
+                          else '\'' * max(len(token) - 5, 0))
+
+    if braces or tables or tag is not None or links:
+        return None
+    output.append(code[offset:])
+
+    return html.unescape(''.join(output))
+
+
+class WikiCleaner(object):
+    r"""Cleaner of MediaWiki-format wiki articles.
+
+    The patterns and filters are created once and reused for every article,
+    so the cleaner should be created once per process.
+
+    Arguments:
+        ns (list): Namespaces of the wiki links to remove, e.g. ``File``.
+        cleaner (str): Cleaning engine, ``mwparserfromhell`` or
+            ``streaming``. The streaming cleaner strips the wiki code in a
+            single pass, and uses ``mwparserfromhell`` only for the articles
+            which cannot be handled.
+    """
+    def __init__(self, ns: List[str] = [],
+                 cleaner: str = 'mwparserfromhell'):
+        self.cleaner = cleaner
+
+        # Create namespace-based wiki-link pattern.
+        self.regex_mw_nslinks = re.compile('^(?:{}):'.format('|'.join(ns)),
+                                           re.IGNORECASE)
+
+    def _filter_wikilinks(self, obj: Any) -> bool:
+        return bool(self.regex_mw_nslinks.match(str(obj.title)))
+
+    def _filter_templates(self, obj: Any) -> bool:
+        return obj.name.lower() in _REMOVED_TEMPLATES
+
+    def _filter_tags(self, obj: Any) -> bool:
+        return str(obj.tag) in _REMOVED_TAGS
+
+    def _strip_sections(self, code: str) -> List[str]:
+        # Parse wiki code by using `mwparserfromhell`.
+        wiki = mw.parse(code)
+
+        section_text = []
+        for section in wiki.get_sections(flat=True,
+                                         include_lead=True):
+            # Remove elements filtered by above functions.
+            for obj in section.ifilter_wikilinks(
+                    matches=self._filter_wikilinks, recursive=True):
+                _remove_element(section, obj)
+            for obj in section.ifilter_templates(
+                    matches=self._filter_templates, recursive=True):
+                _remove_element(section, obj)
+            for obj in section.ifilter_tags(matches=self._filter_tags,
+                                            recursive=True):
+                _remove_element(section, obj)
+
+            # Add cleaned wiki contents to list.
+            section_text.append(section.strip_code().strip())
+
+        return section_text
+
+    def clean(self, code: str) -> str:
+        r"""Clean the wiki article.
+
+        Arguments:
+            code (str): MediaWiki-format wiki code of the article.
 
+        Returns:
+            The plain text lines of the article which end with punctuation.
+        """
+        # Strip the wiki code in a single pass if `streaming` cleaner is
+        # used. The code is parsed by `mwparserfromhell` only if it cannot be
+        # handled.
+        if self.cleaner == 'streaming':
+            text = _strip_wiki_code(code, self.regex_mw_nslinks)
+            if text is not None:
+                return _filter_wiki_lines([text])
+
+        return _filter_wiki_lines(self._strip_sections(code))
+
+    def clean_batch(self, codes: List[str]) -> str:
+        r"""Clean the wiki articles and join them.
+
+        Arguments:
+            codes (list): MediaWiki-format wiki codes of the articles.
+
+        Returns:
+            The cleaned articles, each of which ends with an empty line.
+        """
+        return ''.join(self.clean(code) + '\n\n' for code in codes)
+
+
+def _remove_element(section: Any, obj: Any):
+    # Simple remove wrapper function.
+    try:
+        section.remove(obj)
+    except ValueError:
+        pass
+
+
+def _clean_wiki_text(code: str, ns: List[str] = [],
+                     cleaner: str = 'mwparserfromhell') -> str:
+    return WikiCleaner(ns, cleaner).clean(code)
+
+
+def _filter_wiki_lines(section_text: List[str]) -> str:
     # Post-process cleaned wiki article content through simple sentence
     # testing.
-    regex_brackets = re.compile(r'\([^(]*?\)')
-    regex_double_quotes = re.compile('[\u201c\u201d]')
-    regex_single_quotes = re.compile('[\x60\xb4\u2018\u2019]')
-
     filtered = []
     for text in section_text:
         for line in text.strip().splitlines():
@@ -72,13 +263,13 @@ def _clean_wiki_text(code: str, ns: List[str] = []) -> str:
                 continue
 
             # Remove nested brackets and unnecessary spaces.
-            while regex_brackets.search(line):
-                line = regex_brackets.sub('', line)
+            while _BRACKETS_PATTERN.search(line):
+                line = _BRACKETS_PATTERN.sub('', line)
             line = _modified_removing_unnecessary_spaces(line)
 
             # Replace unusual quotes.
-            line = regex_double_quotes.sub('"', line)
-            line = regex_single_quotes.sub('\'', line)
+            line = _DOUBLE_QUOTES_PATTERN.sub('"', line)
+            line = _SINGLE_QUOTES_PATTERN.sub('\'', line)
 
             # Add post-processed text.
             filtered.append(line)
@@ -86,68 +277,214 @@ def _clean_wiki_text(code: str, ns: List[str] = []) -> str:
     return '\n'.join(filtered)
 
 
-def _process_article_worker(output_file: str, ns: List[str], queue: Queue):
+def _prepare_tokenizing_sentences(lang: str, splitter: str = 'default'):
+    prepare_splitter(lang, splitter)
+
+
+def _split_sentences(lines: Iterable[str], splitter: SentenceSplitter,
+                     min_len: int, max_len: int,
+                     split_sent: bool = True) -> Iterator[str]:
+    total_lines = ''
+    for s in split_lines(splitter, lines):
+        if s is None:
+            # Yield the rest sentences.
+            if not split_sent and len(total_lines.strip()) > min_len:
+                yield total_lines.strip()
+            total_lines = ''
+            continue
+
+        s = s.strip()
+
+        if split_sent:
+            if len(s) > min_len and len(s) < max_len:
+                yield s
+        else:
+            if len(total_lines) + len(s) > max_len:
+                yield total_lines.strip()
+                total_lines = ''
+            total_lines += s + ' '
+
+
+def _write_article_sentences(fp: IO[str], codes: List[str],
+                             cleaner: WikiCleaner,
+                             splitter: SentenceSplitter,
+                             min_len: int, max_len: int, split_sent: bool):
+    # Clean the wiki articles and split into the sentences directly, without
+    # writing the cleaned articles to the intermediate file. Note that each
+    # article ends with an empty line.
+    lines = cleaner.clean_batch(codes).splitlines(True)
+    for s in _split_sentences(lines, splitter, min_len, max_len,
+                              split_sent):
+        fp.write(s + '\n')
+
+
+def _read_article(page: etree.Element) -> Optional[str]:
+    # The tags may have the namespace prefix, e.g. `{...}page`.
+    prefix = page.tag[:-len('page')]
+
+    # Skip the article which does not have namespace of 0.
+    if page.find(f'./{prefix}ns').text != '0':
+        return None
+
+    # Skip empty or redirection articles.
+    article = page.find(f'./{prefix}revision/{prefix}text').text
+    if article is None or article.lower().startswith('#redirect'):
+        return None
+
+    return article
+
+
+def _iterate_dump_articles(context: Iterator[Tuple[str, etree.Element]],
+                           root: etree.Element) -> Iterator[str]:
+    for event, elem in context:
+        if event != 'end' or not elem.tag.endswith('page'):
+            continue
+
+        article = _read_article(elem)
+        root.clear()
+
+        if article is not None:
+            yield article
+
+
+def _process_article_worker(output_file: str, ns: List[str], cleaner: str,
+                            lang: str, splitter: str, min_len: int,
+                            max_len: int, split_sent: bool, queue: Queue):
+    sentence_splitter = create_splitter(lang, splitter)
+    wiki_cleaner = WikiCleaner(ns, cleaner)
+
     with open(output_file, 'w', encoding='utf-8') as fp:
         while True:
-            code = queue.get()
-            if code is None:
+            batch = queue.get()
+            if batch is None:
                 break
 
-            # Write cleaned wiki articles into the output file.
-            fp.write(_clean_wiki_text(code, ns) + '\n\n')
-
+            _write_article_sentences(fp, batch, wiki_cleaner,
+                                     sentence_splitter, min_len, max_len,
+                                     split_sent)
+
+
+def _extract_articles_serially(context: Iterator[Tuple[str, etree.Element]],
+                               root: etree.Element, output_file: str,
+                               ns: List[str], lang: str, args: Dict[str, Any],
+                               checkpoint: Checkpoint):
+    sentence_splitter = create_splitter(lang, args['splitter'])
+    wiki_cleaner = WikiCleaner(ns, args['cleaner'])
+
+    # The bz2 stream cannot be decompressed from the middle, so the checkpoint
+    # records the number of the articles read from the dump and the size of
+    # the sentences written from them. When resuming, the read articles are
+    # skipped without cleaning and the output file is truncated to the size.
+    state = checkpoint.load() or {'articles': 0, 'offset': 0}
+    articles = itertools.islice(_iterate_dump_articles(context, root),
+                                state['articles'], None)
+
+    with open(output_file, 'a', encoding='utf-8') as fp:
+        fp.truncate(state['offset'])
+
+        batches = iterate_batches(articles, args['batch-size'],
+                                  _BATCH_MAX_LENGTH)
+        for i, batch in enumerate(batches):
+            _write_article_sentences(fp, batch, wiki_cleaner,
+                                     sentence_splitter, args['min-length'],
+                                     args['max-length'],
+                                     args['split-sent'] == 'true')
+            state['articles'] += len(batch)
+
+            # Save the progress after the written sentences are flushed.
+            if (i + 1) % _CHECKPOINT_BATCHES == 0:
+                fp.flush()
+                state['offset'] = fp.tell()
+                checkpoint.save(state)
+
+
+def _find_bz2_streams(input_file: str,
+                      index_file: Optional[str] = None
+                      ) -> List[Tuple[int, int]]:
+    if index_file:
+        # Each line of the index file consists of the offset of the stream,
+        # page id and title. Note that the first stream which contains the
+        # site information is not indexed.
+        with bz2.open(index_file, 'rt', encoding='utf-8') as fp:
+            offsets = {int(line.split(':', 1)[0]) for line in fp if line}
+        offsets.add(0)
+    else:
+        # Find the headers of bz2 streams. The streams start at byte
+        # boundaries while the blocks in the stream do not, so the stream
+        # headers can be found by scanning the bytes.
+        with open(input_file, 'rb') as fp, \
+                mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            offsets = {match.start()
+                       for match in _BZ2_STREAM_HEADER.finditer(mm)}
+
+    offsets = sorted(offsets) + [os.path.getsize(input_file)]
+    return list(zip(offsets[:-1], offsets[1:]))
+
+
+def _group_streams(streams: List[Tuple[int, int]],
+                   chunk_size: int) -> Iterator[Tuple[int, int]]:
+    # Group the consecutive streams to reduce the overhead of reading and
+    # decompressing too small streams.
+    start = None
+    for stream_start, stream_end in streams:
+        if start is None:
+            start = stream_start
+
+        if stream_end - start >= chunk_size:
+            yield start, stream_end
+            start = None
+
+    if start is not None:
+        yield start, streams[-1][1]
+
+
+def _iterate_stream_articles(data: bytes) -> Iterator[str]:
+    # The streams of articles do not have the root element, and the last
+    # stream contains the closing tag of the root element.
+    data = data.replace(b'</mediawiki>', b'')
+
+    context = etree.iterparse(io.BytesIO(b'<pages>' + data + b'</pages>'))
+    for _, elem in context:
+        if not elem.tag.endswith('page'):
+            continue
 
-def _prepare_tokenizing_sentences(lang: str):
-    if lang == 'en':
-        import nltk
+        article = _read_article(elem)
+        elem.clear()
 
-        # Download `punkt` resource.
-        try:
-            nltk.data.find('tokenizers/punkt')
-        except LookupError:
-            nltk.download('punkt')
+        if article is not None:
+            yield article
 
 
-def _tokenize_sentences_worker(input_file: str, output_file: str,
-                               lang: str, min_len: int, max_len: int,
-                               split_sent: bool = True):
-    if lang == 'en':
-        import nltk
-        nltk.data.find('tokenizers/punkt')
+def _process_stream_worker(input_file: str, output_file: str, ns: List[str],
+                           cleaner: str, lang: str, splitter: str,
+                           min_len: int, max_len: int, split_sent: bool,
+                           batch_size: int, queue: Queue):
+    sentence_splitter = create_splitter(lang, splitter)
+    wiki_cleaner = WikiCleaner(ns, cleaner)
 
-        tokenize_sentence = nltk.tokenize.sent_tokenize
-    elif lang == 'ko':
-        import kss
-        tokenize_sentence = kss.split_sentences
-    else:
-        raise NotImplementedError(f'language [{lang}] is not supported.')
-
-    with open(input_file, 'r', encoding='utf-8') as src, \
-            open(output_file, 'w', encoding='utf-8') as dst:
-        total_lines = ''
-        for line in src:
-            if not line.strip():
-                # Write the rest sentences.
-                if not split_sent and len(total_lines.strip()) > min_len:
-                    dst.write(total_lines.strip() + '\n')
-                total_lines = ''
-                continue
+    with open(input_file, 'rb') as src, \
+            open(output_file, 'w', encoding='utf-8') as fp:
+        while True:
+            chunk = queue.get()
+            if chunk is None:
+                break
 
-            for s in tokenize_sentence(line):
-                s = s.strip()
+            # Decompress the independent bz2 streams in the chunk.
+            start, end = chunk
+            src.seek(start)
+            data = bz2.decompress(src.read(end - start))
 
-                if split_sent:
-                    if len(s) > min_len and len(s) < max_len:
-                        dst.write(s + '\n')
-                else:
-                    if len(total_lines) + len(s) > max_len:
-                        dst.write(total_lines.strip() + '\n')
-                        total_lines = ''
-                    total_lines += s + ' '
+            for batch in iterate_batches(_iterate_stream_articles(data),
+                                         batch_size, _BATCH_MAX_LENGTH):
+                _write_article_sentences(fp, batch, wiki_cleaner,
+                                         sentence_splitter, min_len, max_len,
+                                         split_sent)
 
 
-def _extract_wiki_corpus(input_file: str, output_file: str, temporary: str,
-                         args: Dict[str, Any]):
+def _extract_wiki_shards(input_file: str, output_file: str, temporary: str,
+                         args: Dict[str, Any],
+                         checkpoint: Optional[Checkpoint] = None
+                         ) -> Optional[List[str]]:
     # Open wikipedia dump file.
     file = bz2.open(input_file, 'r')
     context = etree.iterparse(file, events=('start', 'end'))
@@ -173,93 +510,114 @@ def _extract_wiki_corpus(input_file: str, output_file: str, temporary: str,
         if elem.tag.endswith('namespaces'):
             break
 
-    # Start extracting processes.
+    # Prepare sentence tokenizer before starting the workers.
+    _prepare_tokenizing_sentences(lang, args['splitter'])
+
+    # Extract the articles in the current process if a single core is used,
+    # so the progress can be saved to the checkpoint. The sentences are
+    # written to `output_file` directly because it is kept across the resumed
+    # builds.
+    if args['num-cores'] == 1 and checkpoint is not None:
+        _extract_articles_serially(context, root, output_file, ns, lang, args,
+                                   checkpoint)
+        file.close()
+        return None
+
+    # Find the independent bz2 streams of multistream dump file. The first
+    # stream contains the site information only.
+    streams = []
+    multistream = args['multistream']
+    if multistream == 'auto':
+        multistream = ('true' if args['index-file']
+                       or 'multistream' in os.path.basename(input_file)
+                       else 'false')
+
+    if multistream == 'true' and args['num-cores'] > 1:
+        streams = _find_bz2_streams(input_file, args['index-file'])[1:]
+
+    # Every worker has its own queue and the batches are dealt to the workers
+    # in turn, so the shards do not depend on the scheduling of the workers.
     workers = []
-    queue = Queue(maxsize=50 * args['num-cores'])
-    extract_filenames = random_filenames(temporary, args['num-cores'])
-
-    for i in range(args['num-cores']):
-        w = Process(target=_process_article_worker,
-                    args=(extract_filenames[i], ns, queue))
-        w.daemon = True
-        w.start()
-
-        workers.append(w)
+    queues = [Queue(maxsize=_QUEUE_BATCHES_PER_CORE)
+              for _ in range(args['num-cores'])]
+    shard_filenames = random_filenames(temporary, args['num-cores'])
 
-    # Parse articles from dump file and put into the queue.
-    regex_prefix = re.compile(r'({.*?})')
-    for event, elem in context:
-        if event != 'end' or not elem.tag.endswith('page'):
-            continue
+    if len(streams) > 1:
+        # Decompress and parse the streams in parallel.
+        file.close()
 
-        # Skip the article which does not have namespace of 0.
-        prefix = regex_prefix.match(elem.tag).group(0)
-        if elem.find(f'./{prefix}ns').text != '0':
-            root.clear()
-            continue
-
-        # Read raw wiki code of article content from the element.
-        article = elem.find(f'./{prefix}revision/{prefix}text').text
-        root.clear()
-
-        # Skip empty or redirection articles.
-        if article is None or article.lower().startswith('#redirect'):
-            continue
-
-        # Add to the queue.
-        queue.put(article)
+        for i in range(args['num-cores']):
+            w = Process(target=_process_stream_worker,
+                        args=(input_file, shard_filenames[i], ns,
+                              args['cleaner'], lang, args['splitter'],
+                              args['min-length'], args['max-length'],
+                              args['split-sent'] == 'true',
+                              args['batch-size'], queues[i]))
+            w.daemon = True
+            w.start()
+
+            workers.append(w)
+
+        for i, chunk in enumerate(_group_streams(streams,
+                                                 _STREAM_CHUNK_SIZE)):
+            queues[i % args['num-cores']].put(chunk)
+    else:
+        # Start the workers which clean the articles and split them into the
+        # sentences.
+        for i in range(args['num-cores']):
+            w = Process(target=_process_article_worker,
+                        args=(shard_filenames[i], ns, args['cleaner'], lang,
+                              args['splitter'], args['min-length'],
+                              args['max-length'],
+                              args['split-sent'] == 'true', queues[i]))
+            w.daemon = True
+            w.start()
+
+            workers.append(w)
+
+        # Parse articles from dump file and put into the queue. The articles
+        # are sent in batches to reduce the overhead of the queue.
+        batches = iterate_batches(_iterate_dump_articles(context, root),
+                                  args['batch-size'], _BATCH_MAX_LENGTH)
+        for i, batch in enumerate(batches):
+            queues[i % args['num-cores']].put(batch)
 
     # Finish the workers and wait for joining.
-    for _ in range(args['num-cores']):
+    for queue in queues:
         queue.put(None)
     for w in workers:
         w.join()
 
-    # Start splitting processes.
-    _prepare_tokenizing_sentences(lang)
-
-    workers = []
-    split_filenames = random_filenames(temporary, args['num-cores'])
-    for i in range(args['num-cores']):
-        w = Process(target=_tokenize_sentences_worker,
-                    args=(extract_filenames[i],
-                          split_filenames[i],
-                          lang,
-                          args['min-length'],
-                          args['max-length'],
-                          args['split-sent'] == 'true'))
-        w.daemon = True
-        w.start()
-
-        workers.append(w)
-
-    # Wait for terminating the processes.
-    for w in workers:
-        w.join()
-    for i in range(args['num-cores']):
-        os.remove(extract_filenames[i])
+    return shard_filenames
 
-    # Merge them into `output_file`.
-    with open(output_file, 'wb') as dst:
-        for i in range(args['num-cores']):
-            with open(split_filenames[i], 'rb') as src:
-                shutil.copyfileobj(src, dst)
 
-    # Cleanup temporary files.
-    for name in split_filenames:
-        os.remove(name)
+def _extract_wiki_corpus(input_file: str, output_file: str, temporary: str,
+                         args: Dict[str, Any],
+                         checkpoint: Optional[Checkpoint] = None
+                         ) -> Optional[List[str]]:
+    # The shards are returned without merging, so the build can read them
+    # directly. They are merged into `output_file` by `Extension.call` if
+    # necessary.
+    return _extract_wiki_shards(input_file, output_file, temporary, args,
+                                checkpoint)
 
 
 __extension__ = {
     'name': 'wikipedia dump extractor',
-    'version': '1.0',
+    'version': '1.1',
     'description': 'extract wiki dump file.',
     'author': 'expanda',
     'main': _extract_wiki_corpus,
+    'checkpoint': True,
     'arguments': {
         'num-cores': {'type': int, 'default': 1},
         'min-length': {'type': int, 'default': 50},
         'max-length': {'type': int, 'default': 1000},
         'split-sent': {'type': str, 'default': 'true'},
+        'multistream': {'type': str, 'default': 'auto'},
+        'index-file': {'type': str, 'default': ''},
+        'batch-size': {'type': int, 'default': 64},
+        'cleaner': {'type': str, 'default': 'mwparserfromhell'},
+        'splitter': {'type': str, 'default': 'default'},
     }
 }
@@ -1,5 +1,9 @@
 import importlib
-from typing import Dict
+from typing import List, Dict, Optional
+from .manifest import Checkpoint
+from .profiling import StageProfiler
+from .indexing import count_lines
+from .utils import merge_files
 
 
 class Extension(object):
@@ -42,9 +46,13 @@ class Extension(object):
         self.author = ext.get('author', 'anonymous')
         self.main_func = ext.get('main')
         self.arg_reqs = ext.get('arguments', {})
+        self.checkpointable = ext.get('checkpoint', False)
 
     def call(self, input_file: str, output_file: str, temporary: str,
-             raw_args: Dict[str, str]):
+             raw_args: Dict[str, str],
+             checkpoint: Optional[Checkpoint] = None,
+             profiler: Optional[StageProfiler] = None,
+             merge: bool = True) -> List[str]:
         r"""Call main code of the extension.
 
         Note:
@@ -52,11 +60,27 @@ class Extension(object):
             ``__extension__`` variable. This function automatically casts
             the type of each string-formatted raw argument.
 
+        Note:
+            The extensions may return the list of their output shards instead
+            of writing `output_file`. The shards are merged into `output_file`
+            only if `merge` is ``True``.
+
         Arguments:
             input_file (str): Input file path.
             output_file (str): Output file path.
             temporary (str): Temporary directory where the extension would use.
             raw_args (dict): String-formatted raw arguments for extension.
+            checkpoint (Checkpoint): Optional checkpoint of the partial
+                progress. It is passed to the extensions which declare
+                ``checkpoint`` as ``True`` in ``__extension__`` variable.
+            profiler (StageProfiler): Optional profiler which records the
+                execution of the extension.
+            merge (bool): Whether to merge the output shards into
+                `output_file`.
+
+        Returns:
+            List of the output files which contain the extracted sentences in
+            order.
         """
         args = {}
         for name, req in self.arg_reqs.items():
@@ -66,5 +90,27 @@ class Extension(object):
             # Cast the given arguments to required types.
             args[name] = req['type'](raw_args.get(name, req.get('default')))
 
-        # Call extension main function with casted arguments.
-        self.main_func(input_file, output_file, temporary, args)
+        record = None
+        if profiler is not None:
+            record = profiler.start(f'extension:{self.module_name}',
+                                    [input_file])
+
+        # Call extension main function with casted arguments. The extensions
+        # which support checkpoints can resume from the saved progress.
+        if self.checkpointable:
+            outputs = self.main_func(input_file, output_file, temporary, args,
+                                     checkpoint=checkpoint)
+        else:
+            outputs = self.main_func(input_file, output_file, temporary, args)
+
+        # The extensions which write `output_file` directly return nothing.
+        if not isinstance(outputs, list):
+            outputs = [output_file]
+        elif merge:
+            merge_files(outputs, output_file)
+            outputs = [output_file]
+
+        if profiler is not None:
+            profiler.finish(record, outputs,
+                            sum(count_lines(name) for name in outputs))
+        return outputs
@@ -0,0 +1,212 @@
+import os
+import mmap
+import struct
+import numpy as np
+from typing import Iterator, Optional, IO
+
+
+_INDEX_MAGIC = b'EXPIDX\x00\x00'
+_INDEX_HEADER_SIZE = 16
+_CHUNK_SIZE = 64 * 1024 * 1024
+_WRITER_BUFFER_SIZE = 1048576
+
+
+def _write_index_header(fp: IO[bytes], element_size: int = 1):
+    # The header consists of magic bytes and the size of indexed elements in
+    # bytes. Note that the elements of text file are characters.
+    fp.write(_INDEX_MAGIC)
+    fp.write(struct.pack('<Q', element_size))
+
+
+def _iterate_line_ends(input_file: str,
+                       chunk_size: int = _CHUNK_SIZE) -> Iterator[np.ndarray]:
+    with open(input_file, 'rb') as fp:
+        size = os.fstat(fp.fileno()).st_size
+
+        # Empty file cannot be mapped to the memory.
+        if size == 0:
+            return
+
+        with mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            for start in range(0, size, chunk_size):
+                chunk = np.frombuffer(mm,
+                                      dtype=np.uint8,
+                                      count=min(chunk_size, size - start),
+                                      offset=start)
+                ends = np.flatnonzero(chunk == 10).astype(np.uint64)
+
+                # The buffer of memory-mapped file should be released before
+                # closing it.
+                del chunk
+
+                yield ends + np.uint64(start + 1)
+
+            # Treat the rest text as the last line if the file does not end
+            # with new-line character.
+            if mm[size - 1] != 10:
+                yield np.array([size], dtype=np.uint64)
+
+
+class LineIndexWriter(object):
+    r"""Line-offset index writer for the file which is being written.
+
+    Instead of scanning the file after writing, the offsets are calculated from
+    the lengths of written lines and saved to the index file incrementally.
+
+    Arguments:
+        index_file (str): Output index file path.
+        element_size (int): The size of each element of the file in bytes.
+            For instance, the elements of text file are characters and the
+            size is 1.
+    """
+    def __init__(self, index_file: str, element_size: int = 1):
+        self.fp = open(index_file, 'wb')
+        _write_index_header(self.fp, element_size)
+
+        self.offset = 0
+        self.lines = 0
+        self.buffer = []
+
+        # The index always starts with the offset of the first line.
+        np.zeros(1, dtype='<u8').tofile(self.fp)
+
+    def add(self, length: int):
+        r"""Add the length of a new line in bytes."""
+        self.buffer.append(length)
+        if len(self.buffer) >= _WRITER_BUFFER_SIZE:
+            self.flush()
+
+    def _write_lengths(self, lengths: np.ndarray):
+        ends = np.cumsum(lengths, dtype=np.uint64) + np.uint64(self.offset)
+        ends.astype('<u8').tofile(self.fp)
+
+        self.offset = int(ends[-1])
+        self.lines += len(lengths)
+
+    def extend(self, lengths: np.ndarray):
+        r"""Add the lengths of new lines in bytes at once."""
+        self.flush()
+        if len(lengths) > 0:
+            self._write_lengths(lengths)
+
+    def flush(self):
+        r"""Write the buffered offsets to the index file."""
+        if self.buffer:
+            self._write_lengths(np.array(self.buffer, dtype=np.uint64))
+            self.buffer.clear()
+
+    def close(self):
+        r"""Flush the offsets and close the index file."""
+        self.flush()
+        self.fp.close()
+
+
+def index_filename(corpus_file: str) -> str:
+    r"""Return the path of line-offset index which is persisted next to the
+    corpus file.
+
+    Arguments:
+        corpus_file (str): Corpus file path.
+
+    Returns:
+        The index file path.
+    """
+    return corpus_file + '.idx'
+
+
+def save_line_index(index_file: str, offsets: np.ndarray):
+    r"""Save line offsets to the index file.
+
+    Arguments:
+        index_file (str): Output index file path.
+        offsets (numpy.ndarray): Line offsets which are created by
+            ``build_line_index``.
+    """
+    with open(index_file, 'wb') as fp:
+        _write_index_header(fp)
+        np.asarray(offsets, dtype='<u8').tofile(fp)
+
+
+def load_line_index(index_file: str) -> np.ndarray:
+    r"""Load line offsets from the index file through memory-mapping.
+
+    Arguments:
+        index_file (str): Index file path.
+
+    Returns:
+        Read-only ``uint64`` array of line offsets.
+    """
+    with open(index_file, 'rb') as fp:
+        if fp.read(len(_INDEX_MAGIC)) != _INDEX_MAGIC:
+            raise ValueError(f'[{index_file}] is not a line-offset index.')
+
+    return np.memmap(index_file, dtype='<u8', mode='r',
+                     offset=_INDEX_HEADER_SIZE)
+
+
+def index_element_size(index_file: str) -> int:
+    r"""Read the size of elements of the indexed file.
+
+    Arguments:
+        index_file (str): Index file path.
+
+    Returns:
+        The size of each element in bytes. It is 1 for text files and the size
+        of token id for binary token-id files.
+    """
+    with open(index_file, 'rb') as fp:
+        if fp.read(len(_INDEX_MAGIC)) != _INDEX_MAGIC:
+            raise ValueError(f'[{index_file}] is not a line-offset index.')
+
+        element_size, = struct.unpack('<Q', fp.read(8))
+        return element_size
+
+
+def build_line_index(input_file: str,
+                     index_file: Optional[str] = None,
+                     chunk_size: int = _CHUNK_SIZE) -> np.ndarray:
+    r"""Build line-offset index of the text file.
+
+    The file is mapped to the memory and new-line characters are found in bulk
+    for each chunk. The offsets consist of the starting position of each line
+    and the size of the file, so :math:`i`\th line is in
+    ``offsets[i]:offsets[i + 1]`` and the number of lines is
+    ``len(offsets) - 1``.
+
+    Arguments:
+        input_file (str): Input text file path.
+        index_file (str): Optional output index file path. If it is given, the
+            offsets would be written to the file directly instead of being
+            gathered in the memory.
+        chunk_size (int): The number of bytes scanned at once.
+
+    Returns:
+        ``uint64`` array of line offsets.
+    """
+    if index_file is None:
+        return np.concatenate([np.zeros(1, dtype=np.uint64)]
+                              + list(_iterate_line_ends(input_file,
+                                                        chunk_size)))
+
+    with open(index_file, 'wb') as fp:
+        _write_index_header(fp)
+
+        np.zeros(1, dtype='<u8').tofile(fp)
+        for ends in _iterate_line_ends(input_file, chunk_size):
+            ends.astype('<u8').tofile(fp)
+
+    return load_line_index(index_file)
+
+
+def count_lines(input_file: str, chunk_size: int = _CHUNK_SIZE) -> int:
+    r"""Count the lines of the text file.
+
+    Arguments:
+        input_file (str): Input text file path.
+        chunk_size (int): The number of bytes scanned at once.
+
+    Returns:
+        The number of lines.
+    """
+    return sum(len(ends)
+               for ends in _iterate_line_ends(input_file, chunk_size))
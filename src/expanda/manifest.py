@@ -0,0 +1,142 @@
+import os
+import json
+from typing import Any, Dict, List, Optional
+from .utils import random_filenames
+
+
+def _save_json(filename: str, obj: Any):
+    # Write to temporary file first and replace the original one, so the file
+    # would not be corrupted even if the process is killed while writing.
+    with open(filename + '.tmp', 'w') as fp:
+        json.dump(obj, fp)
+    os.replace(filename + '.tmp', filename)
+
+
+class Checkpoint(object):
+    r"""Checkpoint of the partial progress of long-running stage.
+
+    The state is a JSON-serializable object, e.g. the byte offset reached in
+    the input file. It is saved atomically, so the last saved state is always
+    available after a crash.
+
+    Arguments:
+        filename (str): Checkpoint file path.
+    """
+    def __init__(self, filename: str):
+        self.filename = filename
+
+    def load(self) -> Optional[Any]:
+        r"""Load the last saved state.
+
+        Returns:
+            The saved state or ``None`` if nothing is saved.
+        """
+        if not os.path.exists(self.filename):
+            return None
+
+        with open(self.filename, 'r') as fp:
+            return json.load(fp)
+
+    def save(self, state: Any):
+        r"""Save the state of the progress."""
+        _save_json(self.filename, state)
+
+    def clear(self):
+        r"""Remove the saved state."""
+        if os.path.exists(self.filename):
+            os.remove(self.filename)
+
+
+class BuildManifest(object):
+    r"""Manifest of completed build stages.
+
+    The manifest is saved in the temporary directory and records the completed
+    stages with their outputs. After a crash, the build can be resumed from the
+    manifest by skipping the completed stages. The manifest is valid only for
+    the same build configuration, so it would be discarded if `signature` is
+    changed.
+
+    Arguments:
+        temporary (str): Temporary directory of the build.
+        signature (str): Signature of the build configuration.
+        resume (bool): Whether to load the manifest of the previous build.
+    """
+    def __init__(self, temporary: str, signature: str, resume: bool = False):
+        self.temporary = temporary
+        self.filename = os.path.join(temporary, 'manifest.json')
+        self.manifest = {'signature': signature, 'files': {}, 'stages': {}}
+
+        resumed = False
+        if resume and os.path.exists(self.filename):
+            with open(self.filename, 'r') as fp:
+                manifest = json.load(fp)
+
+            if manifest['signature'] == signature:
+                self.manifest = manifest
+                resumed = True
+            else:
+                print('[*] build configuration is changed. the previous '
+                      'progress would be ignored.')
+
+        # Remove the checkpoints of the previous build if it is not resumed.
+        if not resumed:
+            for name in os.listdir(temporary):
+                if name.endswith('.checkpoint'):
+                    os.remove(os.path.join(temporary, name))
+
+        self._save()
+
+    def _save(self):
+        _save_json(self.filename, self.manifest)
+
+    def filenames(self, name: str, n: int) -> List[str]:
+        r"""Return the temporary file names which are kept across the resumed
+        builds.
+
+        Arguments:
+            name (str): Name of the file group.
+            n (int): The number of file names.
+
+        Returns:
+            List of file paths in the temporary directory.
+        """
+        if name not in self.manifest['files']:
+            self.manifest['files'][name] = random_filenames(self.temporary, n)
+            self._save()
+        return self.manifest['files'][name]
+
+    def is_completed(self, stage: str) -> bool:
+        r"""Check if the stage is completed and its outputs still exist."""
+        if stage not in self.manifest['stages']:
+            return False
+
+        return all(os.path.exists(output)
+                   for output in self.manifest['stages'][stage]['outputs'])
+
+    def outputs(self, stage: str) -> List[str]:
+        r"""Return the output files of the completed stage."""
+        return self.manifest['stages'][stage]['outputs']
+
+    def values(self, stage: str) -> Dict[str, Any]:
+        r"""Return the extra values recorded with the completed stage."""
+        return self.manifest['stages'][stage]['values']
+
+    def complete(self, stage: str, outputs: List[str] = [], **values: Any):
+        r"""Record the stage as completed.
+
+        Arguments:
+            stage (str): Stage name.
+            outputs (list): Output files of the stage. The stage would be
+                treated as incomplete if any of them is removed.
+            values: Extra JSON-serializable values to record, e.g. the number
+                of lines of the output.
+        """
+        self.manifest['stages'][stage] = {'outputs': outputs, 'values': values}
+        self._save()
+
+        # The checkpoint of the completed stage is not necessary anymore.
+        self.checkpoint(stage).clear()
+
+    def checkpoint(self, stage: str) -> Checkpoint:
+        r"""Return the checkpoint of the partial progress of the stage."""
+        return Checkpoint(os.path.join(self.temporary, f'{stage}.checkpoint'))
@@ -0,0 +1,215 @@
+import os
+import time
+import json
+import pstats
+import cProfile
+from typing import Any, Dict, List, Optional
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+
+_PROFILE_TOP_FUNCTIONS = 20
+
+
+def _cpu_time() -> float:
+    # Note that the CPU time of child processes is counted after they are
+    # joined.
+    times = os.times()
+    return (times.user + times.system
+            + times.children_user + times.children_system)
+
+
+def _peak_rss() -> Optional[int]:
+    # `resource` module is available only on Unix.
+    if resource is None:
+        return None
+
+    # The maximum resident set size is in kilobytes on Linux.
+    return 1024 * max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+                      resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+
+
+def _total_size(filenames: List[str]) -> int:
+    return sum(os.path.getsize(name)
+               for name in filenames
+               if os.path.exists(name))
+
+
+def _summarize_profile(profile: cProfile.Profile) -> List[Dict[str, Any]]:
+    stats = pstats.Stats(profile)
+    stats.sort_stats('cumulative')
+
+    summary = []
+    for func in stats.fcn_list[:_PROFILE_TOP_FUNCTIONS]:
+        calls, _, tottime, cumtime, _ = stats.stats[func]
+        summary.append({'function': pstats.func_std_string(func),
+                        'calls': calls,
+                        'tottime': tottime,
+                        'cumtime': cumtime})
+    return summary
+
+
+class StageProfiler(object):
+    r"""Profiler of build stages.
+
+    Each stage records its wall time, CPU time, the number of bytes and lines
+    of the inputs and outputs, the peak resident set size and the throughput
+    in MB/s of the inputs. If `profile` is ``True``, the stages are profiled
+    by ``cProfile`` as well and their most time-consuming functions are
+    recorded.
+
+    Note:
+        The CPU time includes the child processes which are joined during the
+        stage, and the peak resident set size is the maximum of the main and
+        child processes until the end of the stage.
+
+    Arguments:
+        profile (bool): Whether to profile the stages by ``cProfile``.
+    """
+    def __init__(self, profile: bool = False):
+        self.profile = profile
+        self.records = []
+
+    def start(self, name: str, inputs: List[str] = [],
+              lines_in: Optional[int] = None,
+              profile: bool = True) -> Dict[str, Any]:
+        r"""Start measuring the stage.
+
+        Arguments:
+            name (str): Stage name.
+            inputs (list): Input files of the stage.
+            lines_in (int): Optional number of input lines.
+            profile (bool): Whether to profile the stage by ``cProfile``. It
+                should be ``False`` if the stage overlaps others.
+
+        Returns:
+            The record of the stage which should be passed to ``finish``.
+        """
+        record = {'name': name,
+                  'bytes_in': _total_size(inputs),
+                  'lines_in': lines_in,
+                  '_wall': time.perf_counter(),
+                  '_cpu': _cpu_time(),
+                  '_profile': None}
+
+        if self.profile and profile:
+            record['_profile'] = cProfile.Profile()
+            record['_profile'].enable()
+
+        return record
+
+    def finish(self, record: Dict[str, Any], outputs: List[str] = [],
+               lines_out: Optional[int] = None):
+        r"""Finish measuring the stage and add its record.
+
+        Arguments:
+            record (dict): Record of the stage created by ``start``.
+            outputs (list): Output files of the stage.
+            lines_out (int): Optional number of output lines.
+        """
+        profile = record.pop('_profile')
+        if profile is not None:
+            profile.disable()
+
+        wall_time = time.perf_counter() - record.pop('_wall')
+        record.update({'wall_time': wall_time,
+                       'cpu_time': _cpu_time() - record.pop('_cpu'),
+                       'bytes_out': _total_size(outputs),
+                       'lines_out': lines_out,
+                       'peak_rss': _peak_rss(),
+                       'throughput': (record['bytes_in'] / wall_time / 1e6
+                                      if wall_time > 0 else None)})
+
+        if profile is not None:
+            record['profile'] = _summarize_profile(profile)
+
+        self.records.append(record)
+
+    def stage(self, name: str, inputs: List[str] = [],
+              lines_in: Optional[int] = None,
+              profile: bool = True) -> '_Stage':
+        r"""Measure the stage in ``with`` statement.
+
+        The outputs can be given by setting ``outputs`` and ``lines_out``
+        attributes of the returned object.
+
+        Arguments:
+            name (str): Stage name.
+            inputs (list): Input files of the stage.
+            lines_in (int): Optional number of input lines.
+            profile (bool): Whether to profile the stage by ``cProfile``.
+        """
+        return _Stage(self, name, inputs, lines_in, profile)
+
+    def extend(self, records: List[Dict[str, Any]]):
+        r"""Add the records measured by other profiler, e.g. in the child
+        process."""
+        self.records.extend(records)
+
+    def save(self, report_file: str):
+        r"""Save the records to JSON report file.
+
+        Arguments:
+            report_file (str): Output report file path.
+        """
+        with open(report_file, 'w') as fp:
+            json.dump({'stages': self.records}, fp, indent=2)
+
+    def summarize(self):
+        r"""Print the summary of the recorded stages."""
+        for record in self.records:
+            throughput = record['throughput'] or 0
+            print(f'[*] stage [{record["name"]}]: '
+                  f'{record["wall_time"]:.2f}s wall, '
+                  f'{record["cpu_time"]:.2f}s cpu, '
+                  f'{throughput:.2f} MB/s')
+
+
+def measure_stage(profiler: Optional[StageProfiler], name: str,
+                  inputs: List[str] = [], lines_in: Optional[int] = None,
+                  profile: bool = True) -> '_Stage':
+    r"""Measure the stage in ``with`` statement by the optional profiler.
+
+    It is the same as ``StageProfiler.stage``, but nothing is measured if
+    `profiler` is ``None``.
+
+    Arguments:
+        profiler (StageProfiler): Optional profiler which records the stage.
+        name (str): Stage name.
+        inputs (list): Input files of the stage.
+        lines_in (int): Optional number of input lines.
+        profile (bool): Whether to profile the stage by ``cProfile``.
+    """
+    return _Stage(profiler, name, inputs, lines_in, profile)
+
+
+class _Stage(object):
+    def __init__(self, profiler: Optional[StageProfiler], name: str,
+                 inputs: List[str], lines_in: Optional[int], profile: bool):
+        self.profiler = profiler
+        self.name = name
+        self.inputs = inputs
+        self.lines_in = lines_in
+        self.profile = profile
+
+        self.outputs = []
+        self.lines_out = None
+
+    def __enter__(self) -> '_Stage':
+        if self.profiler is not None:
+            self.record = self.profiler.start(self.name, self.inputs,
+                                              self.lines_in, self.profile)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self.profiler is None:
+            return
+
+        # Failed stages are not recorded.
+        if exc_type is None:
+            self.profiler.finish(self.record, self.outputs, self.lines_out)
+        elif self.record['_profile'] is not None:
+            self.record['_profile'].disable()
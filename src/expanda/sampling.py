@@ -0,0 +1,60 @@
+import heapq
+import random
+from typing import List, Tuple, Optional, Iterator
+
+
+def _sample_line_ranges(input_file: str, budget: int, rng: random.Random
+                        ) -> List[Tuple[int, int]]:
+    # The reservoir is a max-heap of keys, so the largest key can be evicted
+    # quickly. Only the positions of the lines are kept in the reservoir.
+    reservoir, total_size, offset = [], 0, 0
+    with open(input_file, 'rb') as fp:
+        for line in fp:
+            key = rng.random()
+            length = len(line)
+
+            # Skip the line if the reservoir is full and the key is larger
+            # than every key in the reservoir.
+            if total_size + length > budget \
+                    and (not reservoir or key >= -reservoir[0][0]):
+                offset += length
+                continue
+
+            heapq.heappush(reservoir, (-key, offset, length))
+            total_size += length
+            offset += length
+
+            # Evict the lines with the largest keys to fit in the budget.
+            while total_size > budget:
+                total_size -= heapq.heappop(reservoir)[2]
+
+    return sorted((offset, length) for _, offset, length in reservoir)
+
+
+def reservoir_sample(input_file: str, budget: int,
+                     rng: Optional[random.Random] = None) -> Iterator[str]:
+    r"""Sample random lines from the text file.
+
+    Every line is given a random key and the positions of the lines with the
+    smallest keys are kept in the reservoir while their total size does not
+    exceed `budget`. Because the keys are independent of the positions, the
+    lines are sampled uniformly from the whole file. The file does not need to
+    be shuffled. The sampled lines are read again in the second pass, so they
+    are not kept in the memory.
+
+    Arguments:
+        input_file (str): Input text file path.
+        budget (int): The maximum number of bytes of sampled lines.
+        rng (random.Random): Optional random generator.
+
+    Yields:
+        The sampled lines in the order of the file.
+    """
+    if rng is None:
+        rng = random.Random()
+
+    ranges = _sample_line_ranges(input_file, budget, rng)
+    with open(input_file, 'rb') as fp:
+        for offset, length in ranges:
+            fp.seek(offset)
+            yield fp.read(length).decode('utf-8')
@@ -1,113 +1,283 @@
 import os
+import math
 import tqdm
+import struct
 import random
-import shutil
 import argparse
-from typing import List, IO
+import numpy as np
+from typing import List, Optional, IO
 from .utils import random_filenames
 
 
-_BEST_SEEK_CNT = 100000
 _MAX_BUCKETS = 512
+# The version of the record format is bumped whenever the way of choosing the
+# buckets changes, so the old records are not replayed to the different ones.
+_RECORD_MAGIC = b'EXPSHUF2'
+_RECORD_CHUNK = 1048576
 
+# The bucket indices and the permutations are written in fixed-width
+# little-endian integers, so the records are portable across the platforms.
+_BUCKET_DTYPE = '<u2'
+_ORDER_DTYPE = '<u4'
 
-def _get_file_lines(fp: IO[bytes]) -> int:
-    fp.seek(0)
 
-    num_lines = 0
-    for line in fp:
-        num_lines += 1
+class _RandomSource(object):
+    def __init__(self, seed: Optional[int] = None):
+        self.rng = random.Random(seed)
 
-    return num_lines
+    def bucket(self, buckets: int) -> int:
+        return self.rng.randrange(buckets)
 
+    def shuffle(self, lines: List[bytes]):
+        self.rng.shuffle(lines)
 
-def _list_seek_offsets(fp: IO[bytes], stride: int = 1) -> List[int]:
-    fp.seek(0)
+    def flush(self):
+        pass
 
-    offsets = []
-    while True:
-        offsets.append(fp.tell())
+    def close(self):
+        pass
 
-        # Read `stride` lines and move after the lines.
-        lines = [fp.readline() for _ in range(stride)]
-        if not lines[-1]:
-            break
 
-    return offsets
+class _RecordingSource(_RandomSource):
+    def __init__(self, record_file: str, input_size: int, memory_budget: int,
+                 seed: Optional[int] = None):
+        super().__init__(seed)
+        self.fp = open(record_file, 'wb')
+        self.fp.write(_RECORD_MAGIC)
+        self.fp.write(struct.pack('<QQ', input_size, memory_budget))
 
+        self.buffer = []
 
-def shuffle(input_file: str, output_file: str, temporary: str):
-    r"""Shuffle text file with temporary buckets.
+    def _write_chunk(self, items: List[int], dtype: str):
+        self.fp.write(struct.pack('<Q', len(items)))
+        self.fp.write(np.array(items, dtype=dtype).tobytes())
 
-    Caution:
-        Instead of allocating memory directly, this shuffling algorithm uses
-        temporary bucket files which are in `temporary` directory. Please be
-        careful not to delete the temporary files while executing this
-        function.
+    def bucket(self, buckets: int) -> int:
+        b = super().bucket(buckets)
 
-    Arguments:
-        input_file (str): Input file path.
-        output_file (str): Output file path.
-        temporary (str): Temporary directory where the buckets would be saved.
-    """
-    src = open(input_file, 'rb')
+        # Record the chosen bucket index.
+        self.buffer.append(b)
+        if len(self.buffer) >= _RECORD_CHUNK:
+            self.flush()
+
+        return b
+
+    def shuffle(self, lines: List[bytes]):
+        # Shuffling the indices consumes the random generator exactly the same
+        # as shuffling the lines, so the result does not depend on recording.
+        order = list(range(len(lines)))
+        self.rng.shuffle(order)
+        self._write_chunk(order, _ORDER_DTYPE)
+
+        lines[:] = [lines[i] for i in order]
 
-    # Calculate optimimum number of strides and buckets.
-    stride = max(1, _get_file_lines(src) // _BEST_SEEK_CNT)
-    buckets = min(stride * 2, _MAX_BUCKETS)
-    print(f'[*] optimum stride: {stride}, buckets: {buckets}')
+    def flush(self):
+        if self.buffer:
+            self._write_chunk(self.buffer, _BUCKET_DTYPE)
+            self.buffer = []
 
-    # Create temporary bucket files.
-    print('[*] create temporary bucket files.')
-    bucket_filenames = random_filenames(temporary, buckets)
-    dsts = [open(name, 'wb') for name in bucket_filenames]
+    def close(self):
+        self.flush()
+        self.fp.close()
 
-    # Get offsets from input file.
-    offsets = _list_seek_offsets(src, stride)
-    random.shuffle(offsets)
-    print(f'[*] successfully shuffle offsets. total offsets: {len(offsets)}')
 
-    for off in tqdm.tqdm(offsets, desc='[*] shuffle input file'):
-        # Move to the random offset.
-        src.seek(off)
+class _ReplayingSource(_RandomSource):
+    def __init__(self, record_file: str, input_size: int):
+        self.fp = open(record_file, 'rb')
+        if self.fp.read(len(_RECORD_MAGIC)) != _RECORD_MAGIC:
+            raise ValueError(f'[{record_file}] is not a shuffling record.')
 
-        for _ in range(stride):
-            line = src.readline()
-            if not line:
-                break
+        recorded_size, self.memory_budget = struct.unpack(
+            '<QQ', self.fp.read(16))
+        if recorded_size != input_size:
+            raise ValueError(f'the input file size ({input_size}) is different'
+                             f' from the recorded one ({recorded_size}).')
+
+        self.buffer = iter(())
+
+    def _read_chunk(self, dtype: str) -> List[int]:
+        count, = struct.unpack('<Q', self.fp.read(8))
+
+        data = self.fp.read(count * np.dtype(dtype).itemsize)
+        return np.frombuffer(data, dtype=dtype).tolist()
+
+    def bucket(self, buckets: int) -> int:
+        try:
+            return next(self.buffer)
+        except StopIteration:
+            self.buffer = iter(self._read_chunk(_BUCKET_DTYPE))
+            return next(self.buffer)
+
+    def shuffle(self, lines: List[bytes]):
+        order = self._read_chunk(_ORDER_DTYPE)
+        lines[:] = [lines[i] for i in order]
+
+    def close(self):
+        self.fp.close()
+
+
+def _get_file_size(fp: IO[bytes]) -> int:
+    fp.seek(0, os.SEEK_END)
+    size = fp.tell()
+    fp.seek(0)
+
+    return size
+
+
+def _scatter_lines(src: IO[bytes], dsts: List[IO[bytes]], size: int,
+                   source: _RandomSource):
+    # Read `src` sequentially and append each line to a random bucket.
+    with tqdm.tqdm(desc='[*] scatter lines to buckets',
+                   total=size,
+                   unit='B',
+                   unit_scale=True) as tbar:
+        for line in src:
+            tbar.update(len(line))
 
             if not line.endswith(b'\n'):
                 line = line + b'\n'
 
-            # Write the line to random bucket.
-            dsts[random.randint(0, buckets - 1)].write(line)
+            dsts[source.bucket(len(dsts))].write(line)
 
-    # Close all resources.
-    src.close()
-    for d in dsts:
-        d.close()
+    source.flush()
 
-    # Copy shuffled separations to the output file.
-    print('[*] start copying buckets to the output file.')
-    with open(output_file, 'wb') as dst:
-        for name in bucket_filenames:
-            with open(name, 'rb') as src:
-                shutil.copyfileobj(src, dst)
-    print('[*] finish copying buckets. remove the buckets...')
+
+def _shuffle_in_memory(src: IO[bytes], dst: IO[bytes],
+                       source: _RandomSource) -> int:
+    # Note that the lines are split by `\n` only, like `_scatter_lines`.
+    # `bytes.splitlines` splits them by `\r` and other separators as well.
+    lines = src.readlines()
+    if lines and not lines[-1].endswith(b'\n'):
+        lines[-1] = lines[-1] + b'\n'
+
+    source.shuffle(lines)
+    dst.writelines(lines)
+
+    return len(lines)
+
+
+def _shuffle_recursively(input_file: str, dst: IO[bytes], temporary: str,
+                         memory_budget: int, source: _RandomSource) -> int:
+    with open(input_file, 'rb') as src:
+        size = _get_file_size(src)
+
+        # Shuffle the lines directly if they fit in the memory budget.
+        if size <= memory_budget:
+            return _shuffle_in_memory(src, dst, source)
+
+        # Otherwise, scatter the lines to the buckets whose expected sizes are
+        # a half of the memory budget, so that only a few buckets would exceed
+        # the budget.
+        buckets = min(math.ceil(2 * size / memory_budget), _MAX_BUCKETS)
+        print(f'[*] scatter {size} bytes to {buckets} buckets.')
+
+        bucket_filenames = random_filenames(temporary, buckets)
+        dsts = [open(name, 'wb') for name in bucket_filenames]
+
+        _scatter_lines(src, dsts, size, source)
+
+        for d in dsts:
+            d.close()
+
+    # Shuffle each bucket and append to `dst`. Note that the buckets which
+    # are still larger than the memory budget are shuffled recursively.
+    total_lines = 0
+    for name in bucket_filenames:
+        with open(name, 'rb') as src:
+            # If every line is gathered to single bucket (e.g. the file
+            # contains only one line), the bucket cannot be split anymore.
+            if _get_file_size(src) == size:
+                total_lines += _shuffle_in_memory(src, dst, source)
+                continue
+
+        total_lines += _shuffle_recursively(name, dst, temporary,
+                                            memory_budget, source)
 
     # Remove the temporary bucket files.
     for name in bucket_filenames:
         os.remove(name)
 
+    return total_lines
+
+
+def shuffle(input_file: str, output_file: str, temporary: str,
+            memory_budget: int = 512000000, seed: Optional[int] = None,
+            record_file: Optional[str] = None,
+            replay_file: Optional[str] = None) -> int:
+    r"""Shuffle text file with temporary buckets.
+
+    The lines of `input_file` are read sequentially and appended to randomly
+    chosen bucket files. After that, each bucket is shuffled in the memory and
+    concatenated to `output_file`. Because every line is distributed to the
+    buckets independently, the result is a uniform random permutation of the
+    lines while only sequential I/O is used.
+
+    Caution:
+        Instead of allocating memory directly, this shuffling algorithm uses
+        temporary bucket files which are in `temporary` directory. Please be
+        careful not to delete the temporary files while executing this
+        function.
+
+    Arguments:
+        input_file (str): Input file path.
+        output_file (str): Output file path.
+        temporary (str): Temporary directory where the buckets would be saved.
+        memory_budget (int): The maximum size of bucket which would be
+            shuffled in the memory. The number of buckets is determined by
+            this value.
+        seed (int): Random seed for shuffling. If it is given, the result
+            would be always the same for the same input file.
+        record_file (str): Optional file path where the random choices of
+            shuffling would be recorded.
+        replay_file (str): Optional record file path created with
+            `record_file`. If it is given, the recorded permutation would be
+            applied to `input_file` instead of shuffling randomly. Note that
+            the recorded memory budget would be used in this case.
+
+    Returns:
+        The number of shuffled lines.
+    """
+    if record_file is not None and replay_file is not None:
+        raise ValueError('`record_file` and `replay_file` cannot be used '
+                         'together.')
+
+    with open(input_file, 'rb') as src:
+        input_size = _get_file_size(src)
+
+    # Create the source of random choices.
+    if replay_file is not None:
+        source = _ReplayingSource(replay_file, input_size)
+        memory_budget = source.memory_budget
+    elif record_file is not None:
+        source = _RecordingSource(record_file, input_size, memory_budget,
+                                  seed)
+    else:
+        source = _RandomSource(seed)
+
+    with open(output_file, 'wb') as dst:
+        total_lines = _shuffle_recursively(input_file, dst, temporary,
+                                           memory_budget, source)
+    source.close()
+
+    return total_lines
+
 
 def _main():
     parser = argparse.ArgumentParser(
         prog='expanda-shuffling',
-        description='approximately shuffle text file.')
+        description='shuffle text file.')
     parser.add_argument('input')
     parser.add_argument('output')
     parser.add_argument('--tmp', default='tmp',
                         help='temporary directory path')
+    parser.add_argument('--memory_budget', default=512000000, type=int,
+                        help='maximum bytes of bucket shuffled in memory')
+    parser.add_argument('--seed', default=None, type=int,
+                        help='random seed for shuffling')
+    parser.add_argument('--record', default=None,
+                        help='file path to record the permutation')
+    parser.add_argument('--replay', default=None,
+                        help='recorded permutation file to replay')
     args = parser.parse_args()
 
     # Create temporary directory if not exists.
@@ -117,7 +287,8 @@ def _main():
         remove_after_shuffling = True
 
     # Shuffle the text file.
-    shuffle(args.input, args.output, args.tmp)
+    shuffle(args.input, args.output, args.tmp, args.memory_budget, args.seed,
+            args.record, args.replay)
 
     # Remove created temporary directory.
     if remove_after_shuffling:
@@ -0,0 +1,297 @@
+import re
+from typing import List, Iterable, Iterator, Optional, Callable
+
+
+_SPLIT_BATCH_SIZE = 64
+_ENTRY_POINT_GROUP = 'expanda.splitters'
+
+
+class SentenceSplitter(object):
+    r"""Base class of sentence splitters.
+
+    The splitter loads its resources once when it is created, so it should be
+    created once per process and reused for every text. Subclasses should
+    override ``split``, and ``split_batch`` as well if splitting several texts
+    at once is faster.
+    """
+    def split(self, text: str) -> List[str]:
+        r"""Split the text into the sentences.
+
+        Arguments:
+            text (str): Text to split.
+
+        Returns:
+            List of the sentences.
+        """
+        raise NotImplementedError()
+
+    def split_batch(self, texts: List[str]) -> List[List[str]]:
+        r"""Split each text into the sentences.
+
+        Arguments:
+            texts (list): Texts to split.
+
+        Returns:
+            List of the sentences of each text.
+        """
+        return [self.split(text) for text in texts]
+
+    @classmethod
+    def prepare(cls):
+        r"""Prepare the resources of the splitter, e.g. downloading the
+        models. It is called once before creating the splitters in the
+        processes."""
+        pass
+
+
+def _load_punkt_tokenizer(language: str):
+    import nltk
+
+    # Recent versions of `nltk` provide `PunktTokenizer` which loads the
+    # parameters from `punkt_tab` resource instead of the pickled one.
+    if hasattr(nltk.tokenize, 'PunktTokenizer'):
+        return nltk.tokenize.PunktTokenizer(language)
+    return nltk.data.load(f'tokenizers/punkt/{language}.pickle')
+
+
+class PunktSplitter(SentenceSplitter):
+    r"""Sentence splitter using the punkt tokenizer of ``nltk``.
+
+    Unlike ``nltk.tokenize.sent_tokenize``, the tokenizer is loaded only once
+    when the splitter is created.
+
+    Arguments:
+        language (str): Language name of the punkt model, e.g. ``english``.
+    """
+    def __init__(self, language: str = 'english'):
+        self.tokenizer = _load_punkt_tokenizer(language)
+
+    def split(self, text: str) -> List[str]:
+        return self.tokenizer.tokenize(text)
+
+    @classmethod
+    def prepare(cls):
+        import nltk
+
+        resource = ('punkt_tab' if hasattr(nltk.tokenize, 'PunktTokenizer')
+                    else 'punkt')
+
+        # Download `punkt` resource.
+        try:
+            nltk.data.find(f'tokenizers/{resource}')
+        except LookupError:
+            nltk.download(resource)
+
+
+class KssSplitter(SentenceSplitter):
+    r"""Korean sentence splitter using ``kss``."""
+    def __init__(self):
+        import kss
+        self.split_sentences = kss.split_sentences
+
+    def split(self, text: str) -> List[str]:
+        return self.split_sentences(text)
+
+
+class RegexSplitter(SentenceSplitter):
+    r"""Rule-based sentence splitter.
+
+    The text is split after the punctuation marks which end the sentences,
+    with the following closing quotes and brackets, if they are followed by
+    whitespace. It is much faster than the statistical splitters, but it does
+    not handle abbreviations.
+
+    Arguments:
+        terminals (str): Punctuation marks which end the sentences.
+    """
+    def __init__(self, terminals: str = '.!?'):
+        self.pattern = re.compile('([{}]+[\'"\u2019\u201d)\\]]*)\\s+'
+                                  .format(re.escape(terminals)))
+
+    def split(self, text: str) -> List[str]:
+        # Splitting by the pattern yields the sentences and their endings
+        # alternately.
+        parts = self.pattern.split(text)
+
+        sentences = [parts[i] + parts[i + 1]
+                     for i in range(0, len(parts) - 1, 2)]
+        if parts[-1]:
+            sentences.append(parts[-1])
+        return sentences
+
+
+class CJKSplitter(RegexSplitter):
+    r"""Rule-based sentence splitter for Chinese and Japanese.
+
+    The text is split after the full-width punctuation marks, e.g. ``。``,
+    with the following closing quotes and brackets, even if they are not
+    followed by whitespace. The half-width punctuation marks end the sentences
+    only if they are followed by whitespace.
+    """
+    def __init__(self):
+        closings = '\'"\u2019\u201d)\\]\uff09\u300d\u300f\u3011'
+        self.pattern = re.compile(
+            '((?:[\u3002\uff01\uff1f\uff61]+[{0}]*)'
+            '|(?:[.!?]+[{0}]*(?=\\s)))\\s*'.format(closings))
+
+
+# Languages which are written without spaces between the sentences.
+_CJK_LANGUAGES = {'ja', 'zh', 'yue', 'wuu', 'gan', 'lzh', 'cdo'}
+
+_BUILTIN_SPLITTERS = {'en': PunktSplitter, 'ko': KssSplitter}
+_registered_splitters = {}
+
+# The splitters of the entry points are scanned once per process.
+_entry_point_splitters = None
+
+
+def register_splitter(lang: str, factory: Callable[[], SentenceSplitter]):
+    r"""Register the default sentence splitter of the language.
+
+    The registered splitter takes precedence over the built-in ones and the
+    ones registered through ``expanda.splitters`` entry points.
+
+    Note:
+        The splitters are created in the extraction processes. Make sure that
+        the splitter is registered in the processes as well, e.g. when the
+        module which registers the splitter is imported.
+
+    Arguments:
+        lang (str): Language code, e.g. ``ja``.
+        factory (callable): Function or class which creates the splitter
+            without arguments.
+    """
+    _registered_splitters[lang] = factory
+
+
+def _iterate_entry_points() -> Iterator:
+    try:
+        from importlib.metadata import entry_points
+    except ImportError:
+        import pkg_resources
+        yield from pkg_resources.iter_entry_points(_ENTRY_POINT_GROUP)
+        return
+
+    # `entry_points` returns a dictionary of the groups before python 3.10.
+    eps = entry_points()
+    if hasattr(eps, 'select'):
+        yield from eps.select(group=_ENTRY_POINT_GROUP)
+    else:
+        yield from eps.get(_ENTRY_POINT_GROUP, [])
+
+
+def _find_entry_point(lang: str) -> Optional[object]:
+    global _entry_point_splitters
+
+    if _entry_point_splitters is None:
+        _entry_point_splitters = {}
+        for ep in _iterate_entry_points():
+            _entry_point_splitters.setdefault(ep.name, ep)
+
+    return _entry_point_splitters.get(lang)
+
+
+def _rule_based_splitter(lang: str) -> Callable[[], SentenceSplitter]:
+    if lang.split('-')[0] in _CJK_LANGUAGES:
+        return CJKSplitter
+    return RegexSplitter
+
+
+def _find_splitter(lang: str) -> Callable[[], SentenceSplitter]:
+    if lang in _registered_splitters:
+        return _registered_splitters[lang]
+
+    # The third-party splitters are registered through the entry points whose
+    # names are the language codes.
+    ep = _find_entry_point(lang)
+    if ep is not None:
+        return ep.load()
+
+    if lang in _BUILTIN_SPLITTERS:
+        return _BUILTIN_SPLITTERS[lang]
+
+    # Use the rule-based splitter for the other languages.
+    return _rule_based_splitter(lang)
+
+
+def _check_splitter_name(name: str):
+    if name not in ('default', 'regex'):
+        raise ValueError(f'splitter [{name}] is not supported.')
+
+
+def prepare_splitter(lang: str, name: str = 'default'):
+    r"""Prepare the resources of the sentence splitter before creating it in
+    the processes, e.g. downloading the punkt model.
+
+    Note:
+        The splitter name is checked here as well, so the invalid name is
+        reported before starting the processes.
+
+    Arguments:
+        lang (str): Language code, e.g. ``en``.
+        name (str): Splitter name. See ``create_splitter``.
+    """
+    _check_splitter_name(name)
+
+    factory = (_find_splitter(lang) if name == 'default'
+               else _rule_based_splitter(lang))
+
+    if hasattr(factory, 'prepare'):
+        factory.prepare()
+
+
+def create_splitter(lang: str, name: str = 'default') -> SentenceSplitter:
+    r"""Create the sentence splitter of the language.
+
+    Arguments:
+        lang (str): Language code, e.g. ``en``.
+        name (str): Splitter name. ``default`` uses the registered splitter of
+            the language, e.g. punkt for English and ``kss`` for Korean, and
+            ``regex`` uses the rule-based one. The rule-based splitters are
+            used by default for the languages which have no registered
+            splitter, ``CJKSplitter`` for Chinese and Japanese and
+            ``RegexSplitter`` for the others.
+
+    Returns:
+        The sentence splitter.
+    """
+    _check_splitter_name(name)
+
+    if name == 'regex':
+        return _rule_based_splitter(lang)()
+    return _find_splitter(lang)()
+
+
+def split_lines(splitter: SentenceSplitter, lines: Iterable[str],
+                batch_size: int = _SPLIT_BATCH_SIZE
+                ) -> Iterator[Optional[str]]:
+    r"""Split the lines into the sentences in batches.
+
+    The consecutive non-empty lines are split by ``split_batch`` at once.
+
+    Arguments:
+        splitter (SentenceSplitter): Sentence splitter.
+        lines (iterable): Lines to split.
+        batch_size (int): The maximum number of lines to split at once.
+
+    Yields:
+        The sentences of the lines in order, and ``None`` for each empty line
+        which separates the paragraphs.
+    """
+    batch = []
+    for line in lines:
+        if line.strip():
+            batch.append(line)
+            if len(batch) < batch_size:
+                continue
+
+        # Split the collected lines before the empty line.
+        for sentences in splitter.split_batch(batch):
+            yield from sentences
+        batch = []
+
+        if not line.strip():
+            yield None
+
+    for sentences in splitter.split_batch(batch):
+        yield from sentences
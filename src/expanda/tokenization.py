@@ -1,114 +1,224 @@
 import os
 import tqdm
+import queue
+import random
 import argparse
-from typing import List
-from .utils import random_filename
-from tokenizers import Tokenizer, models, decoders
+import numpy as np
+from typing import List, Tuple, Union, Optional, Callable, Iterator, IO
+from multiprocessing import Process, Queue
+from .utils import random_filenames
+from .sampling import reservoir_sample
+from .indexing import LineIndexWriter, load_line_index, index_filename
+from tokenizers import Tokenizer, Encoding, models, decoders
 from tokenizers.trainers import WordPieceTrainer
 from tokenizers.normalizers import BertNormalizer
 from tokenizers.pre_tokenizers import BertPreTokenizer
 
 
-def _split_subset_from_file(input_file: str, subset_file: str,
-                            subset_size: int):
-    with open(input_file, 'rb') as src, \
-            open(subset_file, 'wb') as dst:
-        while True:
-            line = src.readline()
-
-            # If all sentences are read, stop copying data.
-            if not line:
-                break
-
-            dst.write(line)
-
-            # If total amount of copied data is more than `subset_size`, stop
-            # copying data.
-            if src.tell() > subset_size:
-                break
+_COPY_BUFFER_SIZE = 1048576
+_TOKENIZE_BATCH_SIZE = 10000
+_TRAIN_BATCH_SIZE = 1000
+_SUBSET_WINDOWS = 1024
+
+
+def _iterate_byte_range(fp: IO[bytes], start: int,
+                        size: int) -> Iterator[List[str]]:
+    # Move to the start of the next line if `start` is in the middle of line.
+    if start > 0:
+        fp.seek(start - 1)
+        fp.readline()
+    else:
+        fp.seek(0)
+
+    batch = []
+    for line in fp:
+        batch.append(line.decode('utf-8'))
+
+        # Stop reading if total amount of read data is more than `size`.
+        size -= len(line)
+        if size <= 0:
+            break
+
+        if len(batch) == _TRAIN_BATCH_SIZE:
+            yield batch
+            batch = []
+
+    if batch:
+        yield batch
+
+
+def _iterate_subset(input_file: str, subset_size: int,
+                    subset_sampling: str = 'head',
+                    seed: Optional[int] = None) -> Iterator[List[str]]:
+    file_size = os.path.getsize(input_file)
+
+    if subset_sampling == 'reservoir':
+        batch = []
+        for line in reservoir_sample(input_file, subset_size,
+                                     random.Random(seed)):
+            batch.append(line)
+            if len(batch) == _TRAIN_BATCH_SIZE:
+                yield batch
+                batch = []
+
+        if batch:
+            yield batch
+        return
+
+    with open(input_file, 'rb') as fp:
+        if subset_sampling == 'head' or subset_size >= file_size:
+            yield from _iterate_byte_range(fp, 0, subset_size)
+        elif subset_sampling == 'uniform':
+            # Read evenly spaced byte ranges over the whole file.
+            windows = min(_SUBSET_WINDOWS, max(1, subset_size // 4096))
+            for i in range(windows):
+                yield from _iterate_byte_range(fp, file_size * i // windows,
+                                               subset_size // windows)
+        else:
+            raise ValueError(f'subset sampling [{subset_sampling}] is not '
+                             f'supported.')
+
+
+def _iterate_stratified_subset(input_files: List[str], subset_size: int,
+                               subset_sampling: str = 'head',
+                               seed: Optional[int] = None
+                               ) -> Iterator[List[str]]:
+    # Distribute the subset size to the files in proportion to their sizes.
+    sizes = [os.path.getsize(input_file) for input_file in input_files]
+    for i, (input_file, size) in enumerate(zip(input_files, sizes)):
+        yield from _iterate_subset(
+            input_file, subset_size * size // max(sum(sizes), 1),
+            subset_sampling, None if seed is None else seed + i)
+
+
+class _CorpusWriter(object):
+    def __init__(self, output_file: str, element_size: int = 1):
+        self.fp = open(output_file, 'wb')
+        self.index = LineIndexWriter(index_filename(output_file),
+                                     element_size)
+
+    def _encode(self, encoding: Encoding) -> bytes:
+        return (' '.join(encoding.tokens) + '\n').encode('utf-8')
+
+    def write(self, encoding: Encoding):
+        line = self._encode(encoding)
+
+        self.fp.write(line)
+        self.index.add(len(line))
+
+    def copy_lines(self, src: IO[bytes], offsets: np.ndarray):
+        # Copy the lines in `offsets` range from the other tokenized file.
+        start, end = int(offsets[0]), int(offsets[-1])
+
+        src.seek(start)
+        while start < end:
+            buffer = src.read(min(_COPY_BUFFER_SIZE, end - start))
+            self.fp.write(buffer)
+            start += len(buffer)
+
+        self.index.extend(np.diff(offsets))
+
+    def close(self):
+        self.fp.close()
+        self.index.close()
+
+
+class _BinaryCorpusWriter(_CorpusWriter):
+    def __init__(self, output_file: str, dtype: str):
+        super().__init__(output_file, np.dtype(dtype).itemsize)
+        self.dtype = dtype
+
+    def _encode(self, encoding: Encoding) -> bytes:
+        return np.array(encoding.ids, dtype=self.dtype).tobytes()
+
+
+def _create_corpus_writer(output_file: str, output_format: str,
+                          vocab_size: int) -> _CorpusWriter:
+    if output_format == 'text':
+        return _CorpusWriter(output_file)
+    elif output_format == 'binary':
+        # Use the smallest unsigned integer type to store token ids.
+        dtype = '<u2' if vocab_size <= 65536 else '<u4'
+        return _BinaryCorpusWriter(output_file, dtype)
+    else:
+        raise ValueError(f'output format [{output_format}] is not supported.')
 
 
 def train_tokenizer(
-        input_file: str,
+        input_file: Union[str, List[str]],
         vocab_file: str,
         temporary: str,
         subset_size: int = 512000000,
         vocab_size: int = 8000,
         limit_alphabet: int = 6000,
         unk_token: str = '<unk>',
-        control_tokens: List[str] = []):
+        control_tokens: List[str] = [],
+        subset_sampling: str = 'head',
+        seed: Optional[int] = None):
     r"""Train **WordPiece** tokenizer and save trained subword vocabulary.
 
     Note:
-        Since tokenizers_ reads whole file data in training, this function
-        could occur memory errors if `input_file` is too large. Under the
-        assumption that `input_file` is shuffled randomly, the subset of input
-        corpus will be used in training.
-
-    Caution:
-        The subset of input corpus is saved in `temporary` directory. Please be
-        careful not to delete the file while executing this function.
+        Since tokenizers_ keeps the statistics of the whole training data in
+        the memory, this function could occur memory errors if `input_file` is
+        too large. Hence, the subset of input corpus will be used in training.
+        The subset is read from `input_file` directly and streamed to the
+        tokenizer, so no copy of the subset is made.
 
     Arguments:
-        input_file (str): Input file path.
+        input_file (str or list): Input file path. If multiple files are
+            given, the subset size is distributed to the files in proportion
+            to their sizes and each file is sampled separately.
         vocab_file (str): Output vocabulary file path.
-        temporary (str): Temporary directory where the subset of corpus would
-            be saved.
-        subset_size (int): The maximum number of lines in the subset.
+        temporary (str): Temporary directory where the trained vocabulary
+            would be saved.
+        subset_size (int): The maximum number of bytes in the subset.
         vocab_size (int): The number of subwords in the vocabulary.
         limit_alphabet (int): The maximum number of alphabets in vocabulary.
         unk_tokens (str): Unknown token in the vocabulary.
         control_tokens (list): Control tokens in the vocabulary.
+        subset_sampling (str): The way to sample the subset. ``head`` reads
+            the head of `input_file`, under the assumption that `input_file`
+            is shuffled randomly. ``uniform`` reads evenly spaced ranges over
+            the whole file. ``reservoir`` samples random lines uniformly in a
+            single pass, so `input_file` does not need to be shuffled.
+        seed (int): Random seed for ``reservoir`` sampling.
 
     .. _tokenizers: https://github.com/huggingface/tokenizers
     """
     # Create **WordPiece** model and add normalizer and pre-tokenizer.
     # BERT-specific normalizer and pre-tokenizer are used.
-    tokenizer = Tokenizer(models.WordPiece())
+    tokenizer = Tokenizer(models.WordPiece(unk_token=unk_token))
 
     tokenizer.normalizer = BertNormalizer(strip_accents=False)
     tokenizer.pre_tokenizer = BertPreTokenizer()
 
-    # Split the head of input corpus file and save in `temporary` directory.
-    subset_file = random_filename(temporary)
-    _split_subset_from_file(input_file, subset_file, subset_size)
-
-    # Train the model with splitted subset of corpus.
+    # Train the model with the subset of corpus.
     trainer = WordPieceTrainer(vocab_size=vocab_size,
                                min_frequency=2,
                                show_progress=True,
                                limit_alphabet=limit_alphabet,
                                special_tokens=[unk_token] + control_tokens,
                                continuing_subword_prefix='##')
-    tokenizer.train(trainer, [subset_file])
+    if isinstance(input_file, str):
+        subset = _iterate_subset(input_file, subset_size, subset_sampling,
+                                 seed)
+    else:
+        subset = _iterate_stratified_subset(input_file, subset_size,
+                                            subset_sampling, seed)
+    tokenizer.train_from_iterator(subset, trainer=trainer)
 
     # Save trained subword vocabulary in `temporary` directory and rename to
     # `vocab_file`.
     tokenizer.model.save(temporary)
     os.rename(os.path.join(temporary, 'vocab.txt'), vocab_file)
 
-    # Remove temporary subset corpus.
-    os.remove(subset_file)
-
 
-def tokenize_corpus(
-        input_file: str,
-        output_file: str,
-        vocab_file: str,
-        unk_token: str = '<unk>',
-        control_tokens: List[str] = []):
-    r"""Tokenize corpus sentences through trained **WordPiece** model.
-
-    Arguments:
-        input_file (str): Input corpus file path.
-        output_file (str): Output file path.
-        vocab_file (str): Trained vocabulary file path.
-        unk_token (str): Unknown token in the vocabulary.
-        control_tokens (list): Control tokens in the vocabulary.
-    """
+def _create_tokenizer(vocab_file: str, unk_token: str,
+                      control_tokens: List[str]) -> Tokenizer:
     # Create `WordPiece` model and add special tokens. Note that `unk_token`
     # is also a special token.normalizer and pre-tokenizer.
-    tokenizer = Tokenizer(models.WordPiece(vocab_file, unk_token=unk_token))
+    tokenizer = Tokenizer(models.WordPiece.from_file(vocab_file,
+                                                     unk_token=unk_token))
     tokenizer.add_special_tokens([unk_token] + control_tokens)
 
     # Use BERT-specific normalizer, pre-tokenizer and **WordPiece** decoder.
@@ -116,32 +226,220 @@ def tokenize_corpus(
     tokenizer.pre_tokenizer = BertPreTokenizer()
     tokenizer.decoder = decoders.WordPiece(prefix='##')
 
-    with open(input_file, 'r', encoding='utf-8') as src, \
-            open(output_file, 'w', encoding='utf-8') as dst:
-        # Count total lines in corpus.
-        total_lines = 0
-        for _ in src:
+    return tokenizer
+
+
+def _tokenize_range(tokenizer: Tokenizer, input_file: str, start: int,
+                    end: int, dsts: List[_CorpusWriter], split_lines: int,
+                    progress: Callable[[int], None]) -> int:
+    total_lines = 0
+
+    def write_tokenized(buffer: List[str]):
+        nonlocal total_lines
+        for t in tokenizer.encode_batch(buffer):
+            dst = dsts[0] if total_lines < split_lines else dsts[-1]
+            dst.write(t)
             total_lines += 1
 
-        # Move the corpus file to first.
-        src.seek(0)
+    with open(input_file, 'rb') as src:
+        src.seek(start)
+
+        buffer, buffer_bytes = [], 0
+        for line in src:
+            if start >= end:
+                break
+            start += len(line)
 
-        buffer = []
-        for line in tqdm.tqdm(src,
-                              desc='[*] tokenize corpus',
-                              total=total_lines):
-            buffer.append(line)
+            buffer.append(line.decode('utf-8'))
+            buffer_bytes += len(line)
 
-            # Tokenize buffered sentences and write to `output_file`.
-            if len(buffer) > 10000:
-                for t in tokenizer.encode_batch(buffer):
-                    dst.write(' '.join(t.tokens) + '\n')
-                buffer.clear()
+            # Tokenize buffered sentences and write to the output files.
+            if len(buffer) > _TOKENIZE_BATCH_SIZE:
+                write_tokenized(buffer)
+                progress(buffer_bytes)
+                buffer, buffer_bytes = [], 0
 
         # Process the remained buffer.
         if buffer:
-            for t in tokenizer.encode_batch(buffer):
-                dst.write(' '.join(t.tokens) + '\n')
+            write_tokenized(buffer)
+            progress(buffer_bytes)
+
+    return total_lines
+
+
+def _find_shard_ranges(input_file: str,
+                       num_shards: int) -> List[Tuple[int, int]]:
+    size = os.path.getsize(input_file)
+
+    # Move each boundary to the start of the next line.
+    boundaries = [0]
+    with open(input_file, 'rb') as fp:
+        for i in range(1, num_shards):
+            fp.seek(max(size * i // num_shards - 1, boundaries[-1]))
+            fp.readline()
+            boundaries.append(max(fp.tell(), boundaries[-1]))
+    boundaries.append(size)
+
+    return [(start, end)
+            for start, end in zip(boundaries[:-1], boundaries[1:])
+            if start < end]
+
+
+def _tokenize_shard_worker(input_file: str, shard_file: str, start: int,
+                           end: int, vocab_file: str, unk_token: str,
+                           control_tokens: List[str], output_format: str,
+                           progress_queue: Queue):
+    # Prevent each worker from spawning threads for every core.
+    os.environ['TOKENIZERS_PARALLELISM'] = 'false'
+
+    tokenizer = _create_tokenizer(vocab_file, unk_token, control_tokens)
+    dst = _create_corpus_writer(shard_file, output_format,
+                                tokenizer.get_vocab_size())
+
+    _tokenize_range(tokenizer, input_file, start, end, [dst], 0,
+                    progress_queue.put)
+    dst.close()
+
+    # Notify that this worker is finished.
+    progress_queue.put(None)
+
+
+def _tokenize_in_parallel(input_file: str, temporary: str, vocab_file: str,
+                          unk_token: str, control_tokens: List[str],
+                          output_format: str, num_workers: int,
+                          dsts: List[_CorpusWriter],
+                          split_lines: int,
+                          progress: Callable[[int], None]) -> int:
+    # Tokenize the shards of `input_file` in parallel. The shards are created
+    # in `temporary` directory.
+    ranges = _find_shard_ranges(input_file, num_workers)
+    shard_files = random_filenames(temporary, len(ranges))
+
+    workers = []
+    progress_queue = Queue()
+    for (start, end), shard_file in zip(ranges, shard_files):
+        w = Process(target=_tokenize_shard_worker,
+                    args=(input_file, shard_file, start, end, vocab_file,
+                          unk_token, control_tokens, output_format,
+                          progress_queue))
+        w.daemon = True
+        w.start()
+
+        workers.append(w)
+
+    # Update the progress until all workers are finished.
+    finished = 0
+    while finished < len(workers):
+        try:
+            tokenized_bytes = progress_queue.get(timeout=1)
+        except queue.Empty:
+            if any(w.exitcode for w in workers):
+                raise RuntimeError('tokenization worker is terminated '
+                                   'abnormally.')
+            continue
+
+        if tokenized_bytes is None:
+            finished += 1
+        else:
+            progress(tokenized_bytes)
+
+    for w in workers:
+        w.join()
+
+    # Concatenate the shards in order and route the lines to the outputs.
+    total_lines = 0
+    for shard_file in shard_files:
+        offsets = load_line_index(index_filename(shard_file))
+        shard_lines = len(offsets) - 1
+
+        head = min(max(split_lines - total_lines, 0), shard_lines)
+        with open(shard_file, 'rb') as src:
+            if head > 0:
+                dsts[0].copy_lines(src, offsets[:head + 1])
+            if head < shard_lines:
+                dsts[-1].copy_lines(src, offsets[head:])
+        total_lines += shard_lines
+
+        del offsets
+        os.remove(shard_file)
+        os.remove(index_filename(shard_file))
+
+    return total_lines
+
+
+def tokenize_corpus(
+        input_file: str,
+        output_file: str,
+        vocab_file: str,
+        unk_token: str = '<unk>',
+        control_tokens: List[str] = [],
+        split_file: Optional[str] = None,
+        split_lines: int = 0,
+        num_workers: int = 1,
+        output_format: str = 'text',
+        temporary: Optional[str] = None) -> int:
+    r"""Tokenize corpus sentences through trained **WordPiece** model.
+
+    Note:
+        The line-offset indices of the output files are saved next to them
+        while writing. See also :ref:`indexing`.
+
+    Arguments:
+        input_file (str): Input corpus file path.
+        output_file (str): Output file path.
+        vocab_file (str): Trained vocabulary file path.
+        unk_token (str): Unknown token in the vocabulary.
+        control_tokens (list): Control tokens in the vocabulary.
+        split_file (str): Optional output file path for the head of corpus. If
+            it is given, the first `split_lines` tokenized sentences would be
+            written to this file and the rest to `output_file`.
+        split_lines (int): The number of sentences written to `split_file`.
+        num_workers (int): The number of processes for tokenization. If it is
+            more than 1, the corpus would be split into the shards which are
+            aligned to the lines and tokenized in parallel. The shards are
+            concatenated in order.
+        output_format (str): The format of output files. ``text`` writes
+            space-separated subword tokens for each sentence and ``binary``
+            writes packed ``uint16`` (or ``uint32`` for large vocabulary)
+            token ids.
+        temporary (str): Directory where the shards are written while
+            tokenizing in parallel. The directory of `output_file` is used by
+            default.
+
+    Returns:
+        The total number of tokenized sentences.
+    """
+    tokenizer = _create_tokenizer(vocab_file, unk_token, control_tokens)
+    vocab_size = tokenizer.get_vocab_size()
+
+    # Route the tokenized sentences to `split_file` first and `output_file`
+    # after writing `split_lines` sentences.
+    dsts = [_create_corpus_writer(output_file, output_format, vocab_size)]
+    if split_file is not None:
+        dsts.insert(0, _create_corpus_writer(split_file, output_format,
+                                             vocab_size))
+
+    with tqdm.tqdm(desc='[*] tokenize corpus',
+                   total=os.path.getsize(input_file),
+                   unit='B',
+                   unit_scale=True) as tbar:
+        if num_workers == 1:
+            total_lines = _tokenize_range(
+                tokenizer, input_file, 0, os.path.getsize(input_file), dsts,
+                split_lines, tbar.update)
+        else:
+            if temporary is None:
+                temporary = os.path.dirname(os.path.abspath(output_file))
+
+            total_lines = _tokenize_in_parallel(
+                input_file, temporary, vocab_file, unk_token,
+                control_tokens, output_format, num_workers, dsts, split_lines,
+                tbar.update)
+
+    for dst in dsts:
+        dst.close()
+
+    return total_lines
 
 
 def _main():
@@ -159,7 +457,12 @@ def _main():
     train_parser.add_argument('--tmp', default='tmp',
                               help='temporary directory path')
     train_parser.add_argument('--subset_size', default=512000000, type=int,
-                              help='maximum number of lines in subset')
+                              help='maximum number of bytes in subset')
+    train_parser.add_argument('--subset_sampling', default='head',
+                              choices=['head', 'uniform', 'reservoir'],
+                              help='way to sample subset from corpus')
+    train_parser.add_argument('--seed', default=None, type=int,
+                              help='random seed for reservoir sampling')
     train_parser.add_argument('--vocab_size', default=8000, type=int,
                               help='number of subwords in vocabulary')
     train_parser.add_argument('--unk_token', default='<unk>',
@@ -178,6 +481,15 @@ def _main():
     tokenize_parser.add_argument(
         '--control_tokens', default=[], nargs='*',
         help='control token names except unknown token')
+    tokenize_parser.add_argument(
+        '--num_workers', default=1, type=int,
+        help='number of tokenization processes')
+    tokenize_parser.add_argument(
+        '--output_format', default='text', choices=['text', 'binary'],
+        help='format of tokenized corpus')
+    tokenize_parser.add_argument(
+        '--tmp', default=None,
+        help='temporary directory path for the shards')
 
     args = parser.parse_args()
     if args.command == 'train':
@@ -189,7 +501,10 @@ def _main():
 
         # Train the tokenizer.
         train_tokenizer(args.input, args.vocab, args.tmp, args.subset_size,
-                        args.vocab_size, args.unk_token, args.control_tokens)
+                        args.vocab_size, unk_token=args.unk_token,
+                        control_tokens=args.control_tokens,
+                        subset_sampling=args.subset_sampling,
+                        seed=args.seed)
 
         # Remove created temporary directory.
         if remove_after_training:
@@ -197,7 +512,9 @@ def _main():
     elif args.command == 'tokenize':
         # Tokenize the input corpus file.
         tokenize_corpus(args.input, args.output, args.vocab, args.unk_token,
-                        args.control_tokens)
+                        args.control_tokens, num_workers=args.num_workers,
+                        output_format=args.output_format,
+                        temporary=args.tmp)
 
 
 if __name__ == '__main__':
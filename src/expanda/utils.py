@@ -1,7 +1,8 @@
 import os
 import random
+import shutil
 import string
-from typing import List
+from typing import List, Iterable, Iterator, Optional
 
 
 _CANDIDATES = string.digits + string.ascii_lowercase
@@ -30,3 +31,57 @@ def random_filenames(parent: str, n: int) -> List[str]:
         Randomly generated file names.
     """
     return [random_filename(parent) for _ in range(n)]
+
+
+def merge_files(input_files: List[str], output_file: str):
+    r"""Concatenate the files in order and remove them.
+
+    Extensions whose workers write their own shards can merge the shards into
+    the output file with this function. The file is moved directly if there
+    is only one file.
+
+    Arguments:
+        input_files (list): Files to merge.
+        output_file (str): Output file path.
+    """
+    if len(input_files) == 1:
+        shutil.move(input_files[0], output_file)
+        return
+
+    with open(output_file, 'wb') as dst:
+        for name in input_files:
+            with open(name, 'rb') as src:
+                shutil.copyfileobj(src, dst)
+            os.remove(name)
+
+
+def iterate_batches(texts: Iterable[str], batch_size: int,
+                    max_length: Optional[int] = None) -> Iterator[List[str]]:
+    r"""Group texts into batches.
+
+    Sending each text to other processes separately causes considerable
+    overhead of pickling and locking. Extensions can reduce the overhead by
+    sending the batches instead.
+
+    Arguments:
+        texts (iterable): Texts to group.
+        batch_size (int): The maximum number of texts in each batch.
+        max_length (int): Optional maximum total length of texts in each
+            batch. The batch would contain at least one text even if the text
+            is longer than `max_length`.
+
+    Returns:
+        Iterator of the batches.
+    """
+    batch, length = [], 0
+    for text in texts:
+        batch.append(text)
+        length += len(text)
+
+        if len(batch) >= batch_size \
+                or (max_length is not None and length >= max_length):
+            yield batch
+            batch, length = [], 0
+
+    if batch:
+        yield batch
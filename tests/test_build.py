@@ -0,0 +1,174 @@
+from expanda import _build_corpus, _run_extensions
+from expanda.utils import random_filename
+from benchmarks.generators import generate_text
+from configparser import ConfigParser
+from types import ModuleType
+import tempfile
+import pytest
+import shutil
+import time
+import sys
+import os
+
+
+def _split_text_into_shards(input_file, output_file, temporary, args):
+    # Write the lines into two shards alternately, like the extensions which
+    # deal the articles to their workers.
+    shard_files = [random_filename(temporary) for _ in range(2)]
+    with open(input_file, 'r', encoding='utf-8') as src:
+        lines = src.readlines()
+
+    for i, name in enumerate(shard_files):
+        with open(name, 'w', encoding='utf-8') as dst:
+            dst.writelines(lines[i::2])
+    return shard_files
+
+
+def _record_running_time(input_file, output_file, temporary, args):
+    # Write the running time of the extension and the number of its cores
+    # into the output file.
+    start = time.time()
+    time.sleep(0.2)
+    with open(output_file, 'w') as fp:
+        fp.write(f'{start} {time.time()} {args["num-cores"]}\n')
+
+
+def _raise_error(input_file, output_file, temporary, args):
+    raise RuntimeError('the extension failed.')
+
+
+def _register_fake_extension(name, main, arguments=None):
+    module = ModuleType(name)
+    module.__extension__ = {'name': name, 'main': main,
+                            'arguments': arguments or {}}
+    sys.modules[name] = module
+
+
+def _write_build_config(workspace, input_files, **options):
+    # Every extension needs its own section, even without any option.
+    config = [f'[{ext}]' for ext in sorted({ext for ext, _ in input_files})]
+    config += ['[tokenization]',
+               'vocab-size = 300',
+               'subset-size = 100000',
+               'stratified-subset = true',
+               '',
+               '[build]',
+               'input-files =']
+    config += [f'    --{ext} {input_file}' for ext, input_file in input_files]
+    config += [f'temporary-path = {workspace}/tmp',
+               f'output-vocab = {workspace}/build/vocab.txt',
+               f'output-train-corpus = {workspace}/build/corpus.train.txt',
+               f'output-test-corpus = {workspace}/build/corpus.test.txt',
+               f'output-raw-corpus = {workspace}/build/corpus.raw.txt',
+               'num-cores = 1',
+               'seed = 0']
+    config += [f'{key} = {value}' for key, value in options.items()]
+
+    config_file = os.path.join(workspace, 'expanda.cfg')
+    with open(config_file, 'w') as fp:
+        fp.write('\n'.join(config) + '\n')
+    return config_file
+
+
+def test_building_with_pipelined_tokenizer_training():
+    _register_fake_extension('_fake_sharding_extension',
+                             _split_text_into_shards)
+
+    workspace = random_filename(tempfile.gettempdir())
+    os.makedirs(workspace)
+
+    input_files = []
+    for i in range(2):
+        input_file = os.path.join(workspace, f'input{i}.txt')
+        generate_text(input_file, 20000, seed=i, hangul=i == 1)
+        input_files.append(('_fake_sharding_extension', input_file))
+
+    # Build the corpus with and without training the tokenizer in background.
+    raw_corpora = []
+    for pipelining in ['false', 'true']:
+        config_file = _write_build_config(workspace, input_files,
+                                          pipelining=pipelining)
+        _build_corpus(config_file)
+
+        build_dir = os.path.join(workspace, 'build')
+        for name in ['vocab.txt', 'corpus.train.txt', 'corpus.test.txt']:
+            assert os.path.getsize(os.path.join(build_dir, name)) > 0
+        assert not os.path.exists(os.path.join(workspace, 'tmp'))
+
+        with open(os.path.join(build_dir, 'corpus.raw.txt'), 'rb') as fp:
+            raw_corpora.append(fp.read())
+        shutil.rmtree(build_dir)
+
+    # Check if the seeded builds produce the same corpus. Note that the
+    # vocabulary is not compared because the tokenizer trainer is not
+    # deterministic.
+    assert raw_corpora[0] == raw_corpora[1]
+    assert raw_corpora[0]
+
+    shutil.rmtree(workspace)
+
+
+def test_running_extensions_within_core_budget():
+    for cores in [1, 2]:
+        _register_fake_extension(f'_fake_{cores}_core_extension',
+                                 _record_running_time,
+                                 {'num-cores': {'type': int,
+                                                'default': cores}})
+
+    config = ConfigParser()
+    config.read_dict({'_fake_1_core_extension': {},
+                      '_fake_2_core_extension': {}})
+
+    input_files = [(f'_fake_{cores}_core_extension', 'input')
+                   for cores in [1, 2, 1, 1, 2, 1]]
+    temporary = random_filename(tempfile.gettempdir())
+    os.makedirs(temporary)
+
+    for max_cores in [2, 3]:
+        extract_filenames = [random_filename(temporary)
+                             for _ in input_files]
+        finished = []
+        _run_extensions(input_files, extract_filenames, temporary, config,
+                        max_cores,
+                        callback=lambda i, outputs: finished.append(i))
+        assert sorted(finished) == list(range(len(input_files)))
+
+        intervals = []
+        for name in extract_filenames:
+            with open(name, 'r') as fp:
+                start, end, cores = fp.read().split()
+            intervals.append((float(start), float(end), int(cores)))
+
+        # Check if the total cores of the running extensions never exceed the
+        # budget while some of them are executed concurrently.
+        running_cores = [sum(cores for start, end, cores in intervals
+                             if start <= t < end)
+                         for t, _, _ in intervals]
+        assert max(running_cores) <= max_cores
+        assert max(running_cores) > 1
+
+    shutil.rmtree(temporary)
+
+
+def test_failing_build_with_failed_extension():
+    _register_fake_extension('_fake_sleeping_extension',
+                             _record_running_time,
+                             {'num-cores': {'type': int, 'default': 1}})
+    _register_fake_extension('_fake_failing_extension', _raise_error)
+
+    config = ConfigParser()
+    config.read_dict({'_fake_sleeping_extension': {},
+                      '_fake_failing_extension': {}})
+
+    input_files = [('_fake_sleeping_extension', 'input'),
+                   ('_fake_failing_extension', 'input'),
+                   ('_fake_sleeping_extension', 'input')]
+    temporary = random_filename(tempfile.gettempdir())
+    os.makedirs(temporary)
+
+    extract_filenames = [random_filename(temporary) for _ in input_files]
+    with pytest.raises(RuntimeError, match='terminated abnormally'):
+        _run_extensions(input_files, extract_filenames, temporary, config,
+                        max_cores=2)
+
+    shutil.rmtree(temporary)
@@ -0,0 +1,78 @@
+from expanda.caching import BuildCache, file_fingerprint
+from expanda.utils import random_filename
+import tempfile
+import shutil
+import os
+
+
+def test_cache_key_is_deterministic():
+    cache = BuildCache(random_filename(tempfile.gettempdir()))
+
+    assert (cache.key('extract', {'a': 1, 'b': [2, 3]})
+            == cache.key('extract', {'b': [2, 3], 'a': 1}))
+    assert cache.key('extract', 1) != cache.key('extract', 2)
+
+    shutil.rmtree(cache.directory)
+
+
+def test_file_fingerprint_changes_with_content():
+    input_file = random_filename(tempfile.gettempdir())
+
+    with open(input_file, 'w') as fp:
+        fp.write('hello world\n')
+    fingerprint = file_fingerprint(input_file)
+    content_hash = file_fingerprint(input_file, content=True)
+
+    with open(input_file, 'w') as fp:
+        fp.write('hello world!\n')
+    assert file_fingerprint(input_file) != fingerprint
+    assert file_fingerprint(input_file, content=True) != content_hash
+
+    os.remove(input_file)
+
+
+def test_cache_get_and_put():
+    cache = BuildCache(random_filename(tempfile.gettempdir()))
+    input_file = random_filename(tempfile.gettempdir())
+    output_file = random_filename(tempfile.gettempdir())
+
+    with open(input_file, 'w') as fp:
+        fp.write('cached text\n')
+
+    key = cache.key('test')
+    assert not cache.get(key, output_file)
+
+    cache.put(key, input_file)
+    assert cache.get(key, output_file)
+    with open(output_file, 'r') as fp:
+        assert fp.read() == 'cached text\n'
+
+    os.remove(input_file)
+    os.remove(output_file)
+    shutil.rmtree(cache.directory)
+
+
+def test_cache_evicts_least_recently_used_files():
+    cache = BuildCache(random_filename(tempfile.gettempdir()), max_size=250)
+    input_file = random_filename(tempfile.gettempdir())
+    output_file = random_filename(tempfile.gettempdir())
+
+    with open(input_file, 'w') as fp:
+        fp.write('a' * 100)
+
+    # Mark the first file as recently used by reading it before storing the
+    # third file.
+    keys = [cache.key(i) for i in range(3)]
+    cache.put(keys[0], input_file)
+    cache.put(keys[1], input_file)
+    os.utime(cache._path(keys[1]), (0, 0))
+    assert cache.get(keys[0], output_file)
+    cache.put(keys[2], input_file)
+
+    assert cache.get(keys[0], output_file)
+    assert not cache.get(keys[1], output_file)
+    assert cache.get(keys[2], output_file)
+
+    os.remove(input_file)
+    os.remove(output_file)
+    shutil.rmtree(cache.directory)
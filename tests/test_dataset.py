@@ -0,0 +1,63 @@
+from expanda.dataset import Dataset
+from expanda.indexing import LineIndexWriter, index_filename
+from expanda.utils import random_filename
+import numpy as np
+import pytest
+import tempfile
+import os
+
+
+def test_reading_text_dataset():
+    corpus_file = random_filename(tempfile.gettempdir())
+
+    # Write dummy corpus file without index file.
+    sentences = ['hello world', '', 'expanda', 'the last sentence']
+    with open(corpus_file, 'w') as fp:
+        fp.write('\n'.join(sentences) + '\n')
+
+    # Check if the index file is created and the sentences are read well.
+    dataset = Dataset(corpus_file)
+    assert os.path.exists(index_filename(corpus_file))
+
+    assert len(dataset) == len(sentences)
+    assert dataset[0] == sentences[0]
+    assert dataset[-1] == sentences[-1]
+    assert dataset[1:3] == sentences[1:3]
+    assert dataset[::2] == sentences[::2]
+
+    # Check if random sampling returns sentences in the dataset.
+    batch = dataset.sample(10, np.random.default_rng(0))
+    assert len(batch) == 10
+    assert all(s in sentences for s in batch)
+
+    os.remove(corpus_file)
+    os.remove(index_filename(corpus_file))
+
+
+def test_reading_binary_dataset():
+    corpus_file = random_filename(tempfile.gettempdir())
+
+    # Write dummy token ids with their index file.
+    sentences = [[1, 2, 3], [4], [], [65535, 0]]
+    with open(corpus_file, 'wb') as fp:
+        writer = LineIndexWriter(index_filename(corpus_file), element_size=2)
+        for ids in sentences:
+            data = np.array(ids, dtype='<u2').tobytes()
+
+            fp.write(data)
+            writer.add(len(data))
+        writer.close()
+
+    # Check if the token ids are read well.
+    dataset = Dataset(corpus_file)
+    assert len(dataset) == len(sentences)
+    assert [ids.tolist() for ids in dataset[:]] == sentences
+    assert dataset[-1].dtype == np.uint16
+
+    # Check if the binary corpus is not indexed again without index file.
+    os.remove(index_filename(corpus_file))
+    with pytest.raises(FileNotFoundError):
+        Dataset(corpus_file)
+    assert not os.path.exists(index_filename(corpus_file))
+
+    os.remove(corpus_file)
@@ -1,5 +1,10 @@
 from expanda.extension import Extension
+from expanda.manifest import Checkpoint
+from expanda.utils import random_filename
 from unittest import mock
+import tempfile
+import shutil
+import os
 
 
 @mock.patch('importlib.import_module')
@@ -55,3 +60,45 @@ def test_extension_call(mock_import_module):
     assert called_args[2] == 'workspace'
     assert called_args[3]['x'] == 5
     assert called_args[3]['y'] == 2.71
+
+
+@mock.patch('importlib.import_module')
+def test_extension_call_with_checkpoint(mock_import_module):
+    def count_lines_with_checkpoint(input_file, output_file, temporary, args,
+                                    checkpoint=None):
+        # Write the numbers from the saved progress and stop at `stop`.
+        start = checkpoint.load() or 0
+        with open(output_file, 'a') as fp:
+            for i in range(start, args['total']):
+                if i == args['stop']:
+                    return
+                fp.write(f'{i}\n')
+                checkpoint.save(i + 1)
+
+    mock_import_module.return_value.__extension__ = {
+        'main': count_lines_with_checkpoint,
+        'checkpoint': True,
+        'arguments': {
+            'total': {'type': int},
+            'stop': {'type': int, 'default': -1}
+        }
+    }
+
+    temporary = random_filename(tempfile.gettempdir())
+    os.makedirs(temporary)
+    output_file = os.path.join(temporary, 'output.txt')
+    checkpoint = Checkpoint(os.path.join(temporary, 'extract.checkpoint'))
+
+    # Check if the extension resumes from the progress saved in the previous
+    # call.
+    ext = Extension(None)
+    ext.call('input_file', output_file, temporary,
+             {'total': '5', 'stop': '3'}, checkpoint)
+    assert checkpoint.load() == 3
+
+    assert ext.call('input_file', output_file, temporary, {'total': '5'},
+                    checkpoint) == [output_file]
+    with open(output_file, 'r') as fp:
+        assert fp.read().split() == ['0', '1', '2', '3', '4']
+
+    shutil.rmtree(temporary)
@@ -0,0 +1,67 @@
+from benchmarks.generators import (generate_text, generate_wiki_dump,
+                                   generate_namuwiki_json)
+from expanda.ext import wikipedia, namuwiki
+from expanda.utils import random_filename
+import tempfile
+import bz2
+import os
+
+
+def test_generating_text():
+    output_file = random_filename(tempfile.gettempdir())
+    generate_text(output_file, 10000, hangul=True)
+
+    # Check if the file is filled with non-empty lines.
+    with open(output_file, 'r', encoding='utf-8') as fp:
+        lines = fp.read().splitlines()
+    assert os.path.getsize(output_file) >= 10000
+    assert all(lines)
+
+    os.remove(output_file)
+
+
+def _read_stream_articles(input_file, ranges):
+    articles = []
+    for start, end in ranges:
+        with open(input_file, 'rb') as fp:
+            fp.seek(start)
+            data = bz2.decompress(fp.read(end - start))
+        articles += list(wikipedia._iterate_stream_articles(data))
+    return articles
+
+
+def test_generating_parsable_wiki_dump():
+    input_file = random_filename(tempfile.gettempdir())
+    index_file = random_filename(tempfile.gettempdir())
+    generate_wiki_dump(input_file, 20000, pages_per_stream=4,
+                       index_file=index_file)
+
+    # Check if the articles are parsed from the streams without the
+    # redirections. Note that the first stream contains the site information.
+    ranges = wikipedia._find_bz2_streams(input_file)
+    assert len(ranges) > 2
+
+    articles = _read_stream_articles(input_file, ranges[1:])
+    assert articles
+    assert not any(article.startswith('#REDIRECT') for article in articles)
+
+    # Check if the same articles are parsed with the index file.
+    indexed_ranges = wikipedia._find_bz2_streams(input_file, index_file)
+    assert _read_stream_articles(input_file, indexed_ranges[1:]) == articles
+
+    os.remove(input_file)
+    os.remove(index_file)
+
+
+def test_generating_parsable_namuwiki_json():
+    input_file = random_filename(tempfile.gettempdir())
+    generate_namuwiki_json(input_file, 20000)
+
+    # Check if the articles are parsed without the redirections.
+    with open(input_file, 'rb') as fp:
+        articles = list(namuwiki._iterate_articles(
+            fp, namuwiki._get_ijson_backend()))
+    assert articles
+    assert not any(article.startswith('#redirect') for article in articles)
+
+    os.remove(input_file)
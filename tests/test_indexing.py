@@ -0,0 +1,61 @@
+from expanda.indexing import (build_line_index, save_line_index,
+                              load_line_index, count_lines, LineIndexWriter)
+from expanda.utils import random_filename
+import tempfile
+import os
+
+
+def test_building_line_index_well():
+    input_file = random_filename(tempfile.gettempdir())
+    index_file = random_filename(tempfile.gettempdir())
+
+    # Write dummy lines and the last line without new-line character.
+    lines = [b'hello world\n', b'\n', b'expanda\n', b'last line']
+    with open(input_file, 'wb') as fp:
+        fp.write(b''.join(lines))
+
+    # Build the index with small chunks to check chunk boundaries.
+    offsets = build_line_index(input_file, chunk_size=4)
+    assert len(offsets) == len(lines) + 1
+    assert count_lines(input_file, chunk_size=4) == len(lines)
+
+    with open(input_file, 'rb') as fp:
+        data = fp.read()
+        for i, line in enumerate(lines):
+            assert data[offsets[i]:offsets[i + 1]] == line
+
+    # Check if the index is written to the file and loaded correctly.
+    assert (build_line_index(input_file, index_file) == offsets).all()
+    assert (load_line_index(index_file) == offsets).all()
+
+    save_line_index(index_file, offsets[1:] - offsets[1])
+    assert (load_line_index(index_file) == offsets[1:] - offsets[1]).all()
+
+    os.remove(input_file)
+    os.remove(index_file)
+
+
+def test_building_line_index_of_empty_file():
+    input_file = random_filename(tempfile.gettempdir())
+    open(input_file, 'wb').close()
+
+    assert build_line_index(input_file).tolist() == [0]
+    assert count_lines(input_file) == 0
+
+    os.remove(input_file)
+
+
+def test_writing_line_index_incrementally():
+    index_file = random_filename(tempfile.gettempdir())
+
+    # Write the lengths of lines and compare with built index.
+    lines = [b'hello world\n', b'\n', b'expanda\n']
+    writer = LineIndexWriter(index_file)
+    for line in lines:
+        writer.add(len(line))
+    writer.close()
+
+    assert writer.lines == len(lines)
+    assert load_line_index(index_file).tolist() == [0, 12, 13, 21]
+
+    os.remove(index_file)
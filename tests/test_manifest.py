@@ -0,0 +1,63 @@
+from expanda.manifest import BuildManifest
+from expanda.utils import random_filename
+import tempfile
+import shutil
+import os
+
+
+def test_manifest_resumes_completed_stages():
+    temporary = random_filename(tempfile.gettempdir())
+    os.makedirs(temporary)
+
+    manifest = BuildManifest(temporary, 'signature')
+    filenames = manifest.filenames('extract', 2)
+    for name in filenames:
+        with open(name, 'w') as fp:
+            fp.write('hello world\n')
+
+    manifest.complete('extract-0', [filenames[0]])
+    manifest.complete('shuffle', [filenames[1]], total_lines=1)
+
+    # Check if the progress is restored in the resumed build.
+    manifest = BuildManifest(temporary, 'signature', resume=True)
+    assert manifest.filenames('extract', 2) == filenames
+    assert manifest.is_completed('extract-0')
+    assert not manifest.is_completed('extract-1')
+    assert manifest.outputs('extract-0') == [filenames[0]]
+    assert manifest.values('shuffle')['total_lines'] == 1
+
+    # The stage is not completed if its output is removed.
+    os.remove(filenames[1])
+    assert not manifest.is_completed('shuffle')
+
+    # The progress is ignored if the configuration is changed.
+    manifest = BuildManifest(temporary, 'other signature', resume=True)
+    assert manifest.filenames('extract', 2) != filenames
+    assert not manifest.is_completed('extract-0')
+
+    shutil.rmtree(temporary)
+
+
+def test_manifest_checkpoints():
+    temporary = random_filename(tempfile.gettempdir())
+    os.makedirs(temporary)
+
+    manifest = BuildManifest(temporary, 'signature')
+    checkpoint = manifest.checkpoint('extract-0')
+    assert checkpoint.load() is None
+
+    checkpoint.save({'offset': 1024})
+    assert manifest.checkpoint('extract-0').load() == {'offset': 1024}
+
+    # The checkpoint is kept only in the resumed build.
+    manifest = BuildManifest(temporary, 'signature', resume=True)
+    assert manifest.checkpoint('extract-0').load() == {'offset': 1024}
+    manifest = BuildManifest(temporary, 'signature')
+    assert manifest.checkpoint('extract-0').load() is None
+
+    # The checkpoint is removed when the stage is completed.
+    manifest.checkpoint('extract-0').save({'offset': 2048})
+    manifest.complete('extract-0')
+    assert manifest.checkpoint('extract-0').load() is None
+
+    shutil.rmtree(temporary)
@@ -1,6 +1,14 @@
 from expanda.ext import namuwiki
-from expanda.utils import random_filename
+from expanda.extension import Extension
+from expanda.splitting import create_splitter
+from expanda.utils import random_filename, iterate_batches
+from benchmarks.generators import generate_namuwiki_json
 import tempfile
+import pytest
+import shutil
+import queue
+import json
+import os
 
 
 def test_extracting_wiki_text_well():
@@ -14,31 +22,178 @@ def test_extracting_wiki_text_well():
         assert namuwiki._clean_wiki_text(wiki_code, patterns) == fp.read()
 
 
-def test_splitting_sentences():
-    # Use temporary directory since mocking is hard to apply to
-    # `_tokenize_sentences_worker`.
-    input_file = random_filename(tempfile.gettempdir())
-    output_file = random_filename(tempfile.gettempdir())
+def test_cleaning_nested_markups():
+    patterns = namuwiki._create_pattern_dict()
+
+    # Check if the nested markups are cleaned.
+    assert (namuwiki._clean_wiki_text(
+        "'''굵은 ''기울인'' 글씨'''와 [[문서|링크]]입니다.", patterns)
+        == '굵은 기울인 글씨와 링크입니다.')
+
+    # Check if the matched brackets are removed with their contents and the
+    # unmatched ones remain.
+    assert (namuwiki._clean_wiki_text(
+        '괄호 (안 (중첩) 괄호) 밖 ((닫히지 않은 (괄호).', patterns)
+        == '괄호  밖 ((닫히지 않은 .')
+
+    # Check if the lines without punctuation and the unnecessary spaces are
+    # removed.
+    assert (namuwiki._clean_wiki_text(
+        '목록이 아닌 줄\n * 목록 항목입니다.\n> 인용문입니다!\n\t탭  과   '
+        '공백입니다?', patterns)
+        == '* 목록 항목입니다. 인용문입니다! 탭 과 공백입니다?')
 
-    # Write dummy file to `input_file`.
+
+def test_splitting_sentences():
     dummy = '안녕하세요. 반갑습니다! 어떠신가요? 괜찮습니다...ㅎㅎ\n\n'
-    with open(input_file, 'w') as fp:
-        fp.write(dummy)
+    lines = dummy.splitlines(True)
 
     # Split the sentences.
-    namuwiki._tokenize_sentences_worker(
-        input_file, output_file, min_len=0, max_len=100)
+    splitter = create_splitter('ko')
+    sentences = list(namuwiki._split_sentences(lines, splitter, 0, 100))
 
     # Check if sentences are splitted well.
-    with open(output_file, 'r') as fp:
-        lines = fp.readlines()
-        assert len(lines) == 4
-        assert ' '.join([line.strip() for line in lines]) == dummy.strip()
+    assert len(sentences) == 4
+    assert ' '.join(sentences) == dummy.strip()
 
     # Check if splitting into chuncks works well.
-    namuwiki._tokenize_sentences_worker(
-        input_file, output_file, 0, 100, split_sent=False)
+    sentences = list(namuwiki._split_sentences(lines, splitter, 0, 100,
+                                               split_sent=False))
+    assert sentences[0] == dummy.strip()
+
+
+def test_iterating_articles_from_json():
+    # Write dummy namuwiki dump whose articles contain redirection page.
+    articles = [{'namespace': '0', 'title': 'a', 'text': '안녕하세요.',
+                 'contributors': ['x']},
+                {'namespace': '0', 'title': 'b', 'text': '#redirect a',
+                 'contributors': []},
+                {'namespace': '0', 'title': 'c', 'text': '반갑습니다.',
+                 'contributors': ['y', 'z']}]
+    input_file = random_filename(tempfile.gettempdir())
+    with open(input_file, 'w', encoding='utf-8') as fp:
+        json.dump(articles, fp, ensure_ascii=False)
+
+    # Check if the article contents are read except the redirection.
+    with open(input_file, 'rb') as fp:
+        backend = namuwiki._get_ijson_backend()
+        assert (list(namuwiki._iterate_articles(fp, backend))
+                == ['안녕하세요.', '반갑습니다.'])
+
+    os.remove(input_file)
+
+
+def test_parsing_articles_in_ranges():
+    # Write dummy namuwiki dump whose contents contain the boundary marker.
+    articles = [{'namespace': '0', 'title': str(i),
+                 'text': f'{{"namespace": "{i}"}} 문서입니다.',
+                 'contributors': []}
+                for i in range(100)]
+    input_file = random_filename(tempfile.gettempdir())
+    with open(input_file, 'w', encoding='utf-8') as fp:
+        json.dump(articles, fp, ensure_ascii=False)
+
+    # Check if the articles in all ranges are same as the whole articles.
+    backend = namuwiki._get_ijson_backend()
+    ranges = namuwiki._find_article_ranges(input_file, 4)
+    assert len(ranges) == 4
+
+    parsed = []
+    with open(input_file, 'rb') as fp:
+        for start, end in ranges:
+            reader = namuwiki._RangeReader(fp, start, end)
+            parsed += list(namuwiki._iterate_articles(reader, backend))
+    assert parsed == [article['text'] for article in articles]
+
+    os.remove(input_file)
+
+
+def test_extracting_empty_dump():
+    input_file = random_filename(tempfile.gettempdir())
+    output_file = random_filename(tempfile.gettempdir())
+    temporary = tempfile.mkdtemp()
+    with open(input_file, 'w') as fp:
+        fp.write('[]')
+
+    # Check if the empty dump is extracted to the empty file in parallel.
+    assert namuwiki._find_article_ranges(input_file, 4) == []
+
+    Extension('expanda.ext.namuwiki').call(
+        input_file, output_file, temporary,
+        {'num-cores': '2', 'splitter': 'regex'})
+    assert os.path.getsize(output_file) == 0
+
+    os.remove(input_file)
+    os.remove(output_file)
+    shutil.rmtree(temporary)
+
+
+def test_extracting_generated_dump():
+    input_file = random_filename(tempfile.gettempdir())
+    expected_file = random_filename(tempfile.gettempdir())
+    output_file = random_filename(tempfile.gettempdir())
+    temporary = tempfile.mkdtemp()
+    generate_namuwiki_json(input_file, 50000)
+
+    # Extract the whole dump as a single range in this process.
+    (start, end), = namuwiki._find_article_ranges(input_file, 1)
+    namuwiki._process_range_worker(input_file, start, end, expected_file,
+                                   'regex', 50, 1000, True, 64)
+    with open(expected_file, 'r', encoding='utf-8') as fp:
+        expected = fp.read()
+    assert expected
+
+    # Check if the articles sent through the queue are extracted same.
+    articles = queue.Queue()
+    with open(input_file, 'rb') as fp:
+        for batch in iterate_batches(namuwiki._iterate_articles(
+                fp, namuwiki._get_ijson_backend()), 8):
+            articles.put(batch)
+    articles.put(None)
+
+    namuwiki._process_article_worker(output_file, 'regex', 50, 1000, True,
+                                     articles)
+    with open(output_file, 'r', encoding='utf-8') as fp:
+        assert fp.read() == expected
+
+    # Check if the ranges parsed in parallel are merged in order.
+    ext = Extension('expanda.ext.namuwiki')
+    outputs = ext.call(input_file, output_file, temporary,
+                       {'num-cores': '2', 'splitter': 'regex'})
+    assert outputs == [output_file]
+    with open(output_file, 'r', encoding='utf-8') as fp:
+        assert fp.read() == expected
+
+    # Check if the shards are returned without merging. The articles are
+    # distributed to the workers, so the order of sentences may change.
+    shards = ext.call(input_file, output_file, temporary,
+                      {'num-cores': '2', 'splitter': 'regex',
+                       'parallel-parse': 'false'}, merge=False)
+    assert len(shards) == 2
+
+    sentences = []
+    for name in shards:
+        with open(name, 'r', encoding='utf-8') as fp:
+            sentences += fp.read().splitlines()
+    assert sorted(sentences) == sorted(expected.splitlines())
+
+    for name in [input_file, expected_file, output_file]:
+        os.remove(name)
+    shutil.rmtree(temporary)
+
+
+def test_failing_fast_with_unknown_splitter():
+    input_file = random_filename(tempfile.gettempdir())
+    output_file = random_filename(tempfile.gettempdir())
+    temporary = tempfile.mkdtemp()
+    generate_namuwiki_json(input_file, 10000)
+
+    # Check if the extraction fails before starting the workers, rather than
+    # waiting for the terminated workers forever.
+    with pytest.raises(ValueError):
+        Extension('expanda.ext.namuwiki').call(
+            input_file, output_file, temporary,
+            {'num-cores': '2', 'splitter': 'bogus'})
 
-    with open(output_file, 'r') as fp:
-        lines = fp.readlines()
-        assert lines[0].strip() == dummy.strip()
+    os.remove(input_file)
+    shutil.rmtree(temporary)
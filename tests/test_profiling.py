@@ -0,0 +1,59 @@
+from expanda.profiling import StageProfiler, measure_stage
+from expanda.utils import random_filename
+import tempfile
+import json
+import os
+
+
+def test_stage_profiler_records_metrics():
+    input_file = random_filename(tempfile.gettempdir())
+    output_file = random_filename(tempfile.gettempdir())
+    report_file = random_filename(tempfile.gettempdir())
+
+    with open(input_file, 'w') as fp:
+        fp.write('hello world\n' * 100)
+
+    profiler = StageProfiler(profile=True)
+    with profiler.stage('copy', [input_file], 100) as stage:
+        with open(input_file, 'r') as src, open(output_file, 'w') as dst:
+            dst.write(src.read() * 2)
+        stage.outputs, stage.lines_out = [output_file], 200
+
+    record, = profiler.records
+    assert record['name'] == 'copy'
+    assert record['bytes_in'] == 1200 and record['lines_in'] == 100
+    assert record['bytes_out'] == 2400 and record['lines_out'] == 200
+    assert record['wall_time'] > 0 and record['cpu_time'] >= 0
+    assert len(record['profile']) > 0
+
+    # Check if the report is saved as JSON.
+    profiler.save(report_file)
+    with open(report_file, 'r') as fp:
+        assert json.load(fp)['stages'][0]['name'] == 'copy'
+
+    os.remove(input_file)
+    os.remove(output_file)
+    os.remove(report_file)
+
+
+def test_stage_profiler_ignores_failed_stages():
+    profiler = StageProfiler(profile=True)
+    try:
+        with profiler.stage('failure'):
+            raise RuntimeError()
+    except RuntimeError:
+        pass
+
+    assert profiler.records == []
+
+
+def test_measuring_stage_without_profiler():
+    # Check if the stage is executed without measuring.
+    with measure_stage(None, 'nothing', ['not-exist']) as stage:
+        stage.outputs, stage.lines_out = ['not-exist'], 1
+
+    # Check if the stage is recorded with the profiler.
+    profiler = StageProfiler()
+    with measure_stage(profiler, 'nothing', profile=False):
+        pass
+    assert [record['name'] for record in profiler.records] == ['nothing']
@@ -0,0 +1,30 @@
+from expanda.sampling import reservoir_sample
+from expanda.utils import random_filename
+import tempfile
+import random
+import os
+
+
+def test_reservoir_sampling_within_budget():
+    input_file = random_filename(tempfile.gettempdir())
+
+    # Write dummy lines whose sizes are the same.
+    lines = [f'line {i:05d}\n' for i in range(10000)]
+    with open(input_file, 'w') as fp:
+        fp.write(''.join(lines))
+
+    # Check if the sample fits in the budget and is spread over the file.
+    sampled = list(reservoir_sample(input_file, 10000, random.Random(0)))
+    assert len(sampled) == 10000 // len(lines[0])
+    assert len(set(sampled)) == len(sampled)
+    assert set(sampled) <= set(lines)
+    assert max(sampled) > lines[9000]
+
+    # Check if the sampled lines are read in the order of the file.
+    assert sampled == sorted(sampled)
+
+    # Check if the sampling is deterministic with the same seed.
+    assert sampled == list(reservoir_sample(input_file, 10000,
+                                            random.Random(0)))
+
+    os.remove(input_file)
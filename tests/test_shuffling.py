@@ -40,3 +40,88 @@ def test_shuffling_integrity(mock_open, mock_remove):
         shuffled = [int(i.decode()) for i in fp.readlines()]
 
     assert sorted(shuffled) == original
+
+
+@mock.patch('os.remove')
+@mock.patch('builtins.open')
+def test_shuffling_with_small_memory_budget(mock_open, mock_remove):
+    mock_open.side_effect = _modified_open_wrapper()
+
+    # Create target file which is much larger than the memory budget.
+    original = list(range(10000))
+    with open('input', 'wb') as fp:
+        fp.write(b'\n'.join([str(i).encode() for i in original]))
+
+    # Shuffle the file with tiny buckets to split them recursively.
+    shuffle('input', 'output', 'tmp', memory_budget=100)
+
+    # Read shuffled file.
+    with open('output', 'rb') as fp:
+        shuffled = [int(i.decode()) for i in fp.readlines()]
+
+    assert sorted(shuffled) == original
+    assert shuffled != original
+
+
+@mock.patch('os.remove')
+@mock.patch('builtins.open')
+def test_shuffling_lines_with_carriage_returns(mock_open, mock_remove):
+    mock_open.side_effect = _modified_open_wrapper()
+
+    # Create target file whose lines contain other line separators.
+    original = [f'line {i}\rhas\x0bseparators\x85'.encode()
+                for i in range(20)]
+    with open('input', 'wb') as fp:
+        fp.write(b'\n'.join(original))
+
+    # Check if the lines are split by `\n` only, both in the memory and
+    # through the buckets.
+    for memory_budget in [1000000, 100]:
+        assert shuffle('input', 'output', 'tmp',
+                       memory_budget=memory_budget) == len(original)
+
+        with open('output', 'rb') as fp:
+            shuffled = fp.read().split(b'\n')
+        assert shuffled[-1] == b''
+        assert sorted(shuffled[:-1]) == sorted(original)
+
+
+@mock.patch('os.remove')
+@mock.patch('builtins.open')
+def test_shuffling_deterministically(mock_open, mock_remove):
+    mock_open.side_effect = _modified_open_wrapper()
+
+    # Create target file.
+    with open('input', 'wb') as fp:
+        fp.write(b'\n'.join([str(i).encode() for i in range(1000)]))
+
+    # Shuffle the file twice with the same seed.
+    shuffle('input', 'output1', 'tmp', memory_budget=500, seed=42)
+    shuffle('input', 'output2', 'tmp', memory_budget=500, seed=42)
+
+    with open('output1', 'rb') as fp1, open('output2', 'rb') as fp2:
+        assert fp1.read() == fp2.read()
+
+
+@mock.patch('os.remove')
+@mock.patch('builtins.open')
+def test_replaying_recorded_permutation(mock_open, mock_remove):
+    mock_open.side_effect = _modified_open_wrapper()
+
+    # Create target file.
+    with open('input', 'wb') as fp:
+        fp.write(b'\n'.join([str(i).encode() for i in range(1000)]))
+
+    # Record the permutation and replay it without the seed.
+    shuffle('input', 'output1', 'tmp', memory_budget=500, seed=42,
+            record_file='record')
+    shuffle('input', 'output2', 'tmp', memory_budget=1000000,
+            replay_file='record')
+    shuffle('input', 'output3', 'tmp', memory_budget=500, seed=42)
+
+    with open('output1', 'rb') as fp1, \
+            open('output2', 'rb') as fp2, \
+            open('output3', 'rb') as fp3:
+        shuffled = fp1.read()
+        assert fp2.read() == shuffled
+        assert fp3.read() == shuffled
@@ -0,0 +1,90 @@
+from expanda import splitting
+from expanda.splitting import (SentenceSplitter, RegexSplitter, CJKSplitter,
+                               create_splitter, prepare_splitter,
+                               register_splitter, split_lines)
+from unittest import mock
+import pytest
+
+
+class _CountingSplitter(SentenceSplitter):
+    def __init__(self):
+        self.batches = []
+
+    def split(self, text):
+        return text.split()
+
+    def split_batch(self, texts):
+        self.batches.append(len(texts))
+        return super().split_batch(texts)
+
+
+def test_regex_splitter():
+    splitter = RegexSplitter()
+
+    # Check if the sentences are split with their closing quotes.
+    assert (splitter.split('Hello world. He said "Hi." Why? Fine!\n')
+            == ['Hello world.', 'He said "Hi."', 'Why?', 'Fine!'])
+    assert splitter.split('No punctuation') == ['No punctuation']
+    assert splitter.split('') == []
+
+    # Check if the splitter is created by its name.
+    assert isinstance(create_splitter('en', 'regex'), RegexSplitter)
+
+
+def test_splitting_lines_in_batches():
+    splitter = _CountingSplitter()
+    lines = ['a b\n', 'c\n', 'd\n', '\n', 'e f\n']
+
+    # Check if the consecutive lines are split at once and the empty lines
+    # are yielded as `None`.
+    assert (list(split_lines(splitter, lines, batch_size=2))
+            == ['a', 'b', 'c', 'd', None, 'e', 'f'])
+    assert splitter.batches == [2, 1, 1]
+
+
+def test_cjk_splitter():
+    splitter = CJKSplitter()
+
+    # Check if the full-width punctuation marks end the sentences without
+    # whitespace.
+    assert (splitter.split('今日は晴れです。明日は？「雨」です！ Version 1.2 ok.')
+            == ['今日は晴れです。', '明日は？', '「雨」です！', 'Version 1.2 ok.'])
+
+
+def test_finding_splitters_by_language():
+    # Check if the rule-based splitters are used for the languages which have
+    # no registered splitter.
+    assert isinstance(create_splitter('ja'), CJKSplitter)
+    assert isinstance(create_splitter('zh-yue'), CJKSplitter)
+    assert type(create_splitter('de')) == RegexSplitter
+    assert type(create_splitter('ko', 'regex')) == RegexSplitter
+
+    # Check if the splitters registered through the entry points are used.
+    entry_point = mock.Mock()
+    entry_point.name = 'de'
+    entry_point.load.return_value = _CountingSplitter
+    with mock.patch('expanda.splitting._entry_point_splitters', None), \
+            mock.patch('expanda.splitting._iterate_entry_points',
+                       return_value=[entry_point]) as iterate_entry_points:
+        assert isinstance(create_splitter('de'), _CountingSplitter)
+        assert isinstance(create_splitter('de'), _CountingSplitter)
+        assert type(create_splitter('de', 'regex')) == RegexSplitter
+
+        # Check if the entry points are scanned only once.
+        assert iterate_entry_points.call_count == 1
+
+    # Check if the registered splitters take precedence.
+    register_splitter('ja', _CountingSplitter)
+    try:
+        assert isinstance(create_splitter('ja'), _CountingSplitter)
+    finally:
+        del splitting._registered_splitters['ja']
+
+
+def test_rejecting_unknown_splitters():
+    # Check if the unknown splitter name is rejected before creating the
+    # splitters in the processes.
+    with pytest.raises(ValueError):
+        prepare_splitter('en', 'bogus')
+    with pytest.raises(ValueError):
+        create_splitter('en', 'bogus')
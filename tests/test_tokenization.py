@@ -1,5 +1,9 @@
-from expanda.tokenization import train_tokenizer, tokenize_corpus
+from expanda.tokenization import (train_tokenizer, tokenize_corpus,
+                                  _iterate_subset)
+from expanda.indexing import (load_line_index, index_element_size,
+                              index_filename)
 from expanda.utils import random_filename
+import numpy as np
 import tempfile
 import shutil
 import os
@@ -55,3 +59,161 @@ def test_tokenizing_corpus_well():
     # Remove created temporary files.
     os.remove(vocab_file)
     os.remove(input_file)
+
+
+def test_tokenizing_corpus_with_split():
+    # Use temporary directory since `tokenizers` does not support mocking.
+    input_file = random_filename(tempfile.gettempdir())
+    vocab_file = random_filename(tempfile.gettempdir())
+    output_file = random_filename(tempfile.gettempdir())
+    split_file = random_filename(tempfile.gettempdir())
+
+    # Write dummy corpus and vocabulary files.
+    with open(input_file, 'w') as fp:
+        fp.write('hello world\nhello\nworld hello\nworld')
+    with open(vocab_file, 'w') as fp:
+        fp.write('<unk>\nhello\nworld\n')
+
+    # Tokenize the corpus and split the first two sentences.
+    total_lines = tokenize_corpus(input_file, output_file, vocab_file,
+                                  split_file=split_file, split_lines=2)
+    assert total_lines == 4
+
+    with open(split_file, 'r') as fp:
+        assert fp.read() == 'hello world\nhello\n'
+    with open(output_file, 'r') as fp:
+        assert fp.read() == 'world hello\nworld\n'
+
+    # Check if the line-offset indices are written together.
+    for name in [split_file, output_file]:
+        assert load_line_index(index_filename(name)).tolist() == [0, 12, 18]
+
+    # Remove created temporary files.
+    for name in [input_file, vocab_file, output_file, split_file]:
+        os.remove(name)
+        if os.path.exists(index_filename(name)):
+            os.remove(index_filename(name))
+
+
+def test_tokenizing_corpus_in_parallel():
+    # Use temporary directory since `tokenizers` does not support mocking.
+    input_file = random_filename(tempfile.gettempdir())
+    vocab_file = random_filename(tempfile.gettempdir())
+    output_file = random_filename(tempfile.gettempdir())
+    split_file = random_filename(tempfile.gettempdir())
+    temporary = tempfile.mkdtemp()
+
+    # Write dummy corpus and vocabulary files.
+    sentences = ['hello world', 'hello', 'world hello', 'world'] * 100
+    with open(input_file, 'w') as fp:
+        fp.write('\n'.join(sentences))
+    with open(vocab_file, 'w') as fp:
+        fp.write('<unk>\nhello\nworld\n')
+
+    # Tokenize the corpus with multiple workers.
+    total_lines = tokenize_corpus(input_file, output_file, vocab_file,
+                                  split_file=split_file, split_lines=50,
+                                  num_workers=4, temporary=temporary)
+    assert total_lines == len(sentences)
+
+    # Check if the shards in the temporary directory are removed.
+    assert os.listdir(temporary) == []
+
+    # Check if the shards are concatenated in order.
+    with open(split_file, 'r') as fp:
+        assert fp.read().splitlines() == sentences[:50]
+    with open(output_file, 'r') as fp:
+        assert fp.read().splitlines() == sentences[50:]
+
+    assert len(load_line_index(index_filename(output_file))) == 351
+
+    # Remove created temporary files.
+    for name in [input_file, vocab_file, output_file, split_file]:
+        os.remove(name)
+        if os.path.exists(index_filename(name)):
+            os.remove(index_filename(name))
+    os.rmdir(temporary)
+
+
+def test_tokenizing_corpus_to_binary_format():
+    # Use temporary directory since `tokenizers` does not support mocking.
+    input_file = random_filename(tempfile.gettempdir())
+    vocab_file = random_filename(tempfile.gettempdir())
+    output_file = random_filename(tempfile.gettempdir())
+    split_file = random_filename(tempfile.gettempdir())
+
+    # Write dummy corpus and vocabulary files.
+    with open(input_file, 'w') as fp:
+        fp.write('hello world\nhello\nworld hello\nworld')
+    with open(vocab_file, 'w') as fp:
+        fp.write('<unk>\nhello\nworld\n')
+
+    # Tokenize the corpus to binary token ids with multiple workers.
+    tokenize_corpus(input_file, output_file, vocab_file,
+                    split_file=split_file, split_lines=1, num_workers=2,
+                    output_format='binary')
+
+    # Check if the token ids are packed to `uint16`.
+    assert index_element_size(index_filename(output_file)) == 2
+    with open(output_file, 'rb') as fp:
+        assert np.frombuffer(fp.read(), dtype='<u2').tolist() == [1, 2, 1, 2]
+    with open(split_file, 'rb') as fp:
+        assert np.frombuffer(fp.read(), dtype='<u2').tolist() == [1, 2]
+
+    # Check if the offsets of sentences are written in bytes.
+    offsets = load_line_index(index_filename(output_file))
+    assert offsets.tolist() == [0, 2, 6, 8]
+
+    # Remove created temporary files.
+    for name in [input_file, vocab_file, output_file, split_file]:
+        os.remove(name)
+        if os.path.exists(index_filename(name)):
+            os.remove(index_filename(name))
+
+
+def test_iterating_subset_of_corpus():
+    input_file = random_filename(tempfile.gettempdir())
+
+    # Write dummy corpus whose sentences have the same length.
+    sentences = [f'sentence {i:06d}' for i in range(100000)]
+    with open(input_file, 'w') as fp:
+        fp.write('\n'.join(sentences) + '\n')
+
+    # Read the head of the corpus.
+    subset = sum(_iterate_subset(input_file, 160, 'head'), [])
+    assert [s.strip() for s in subset] == sentences[:10]
+
+    # Read evenly spaced ranges of the corpus.
+    subset = sum(_iterate_subset(input_file, 160000, 'uniform'), [])
+    assert len(subset) >= 10000
+    assert set(s.strip() for s in subset) <= set(sentences)
+    assert subset[-1].strip() > sentences[90000]
+
+    os.remove(input_file)
+
+
+def test_training_tokenizer_with_stratified_subset():
+    # Use temporary directory since `tokenizers` does not support mocking.
+    input_files = [random_filename(tempfile.gettempdir()) for _ in range(2)]
+    vocab_file = random_filename(tempfile.gettempdir())
+
+    # Copy dummy corpus file to `input_files`.
+    for input_file in input_files:
+        shutil.copyfile('tests/res/wikipedia.plain.txt', input_file)
+
+    # Train tokenizer with reservoir samples of each corpus file.
+    train_tokenizer(input_files,
+                    vocab_file,
+                    tempfile.gettempdir(),
+                    vocab_size=100,
+                    subset_sampling='reservoir',
+                    seed=0)
+
+    # Check that the tokenizer is trained well.
+    with open(vocab_file, 'r') as fp:
+        assert len(fp.readlines()) == 100
+
+    # Remove created temporary files.
+    for input_file in input_files:
+        os.remove(input_file)
+    os.remove(vocab_file)
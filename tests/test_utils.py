@@ -1,4 +1,7 @@
-from expanda.utils import random_filename, random_filenames
+from expanda.utils import (random_filename, random_filenames, merge_files,
+                           iterate_batches)
+import tempfile
+import os
 
 
 def test_generate_correct_filenames():
@@ -15,3 +18,33 @@ def test_generate_correct_filenames():
     filenames = random_filenames('parent', n=4)
     for name in filenames:
         assert name.startswith('parent')
+
+
+def test_iterate_batches():
+    texts = ['a' * i for i in range(1, 11)]
+
+    # Check if the texts are grouped by the number of texts.
+    batches = list(iterate_batches(texts, batch_size=4))
+    assert [len(batch) for batch in batches] == [4, 4, 2]
+    assert sum(batches, []) == texts
+
+    # Check if the batches are limited by the total length of texts.
+    batches = list(iterate_batches(texts, batch_size=4, max_length=10))
+    assert [len(batch) for batch in batches] == [4, 2, 2, 2]
+    assert sum(batches, []) == texts
+
+
+def test_merge_files():
+    input_files = random_filenames(tempfile.gettempdir(), 3)
+    output_file = random_filename(tempfile.gettempdir())
+    for i, name in enumerate(input_files):
+        with open(name, 'w') as fp:
+            fp.write(f'shard {i}\n')
+
+    # Check if the files are concatenated in order and removed.
+    merge_files(input_files, output_file)
+    with open(output_file, 'r') as fp:
+        assert fp.read() == 'shard 0\nshard 1\nshard 2\n'
+    assert not any(os.path.exists(name) for name in input_files)
+
+    os.remove(output_file)
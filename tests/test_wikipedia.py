@@ -1,6 +1,16 @@
 from expanda.ext import wikipedia
-from expanda.utils import random_filename
+from expanda.extension import Extension
+from expanda.splitting import create_splitter
+from expanda.manifest import Checkpoint
+from expanda.utils import random_filename, iterate_batches
+from benchmarks.generators import generate_wiki_dump
+from unittest import mock
 import tempfile
+import pytest
+import shutil
+import queue
+import bz2
+import os
 
 
 def test_extracting_wiki_text_well():
@@ -13,31 +23,227 @@ def test_extracting_wiki_text_well():
         assert wikipedia._clean_wiki_text(wiki_code) == fp.read()
 
 
-def test_splitting_sentences():
-    # Use temporary directory since mocking is hard to apply to
-    # `_tokenize_sentences_worker`.
-    input_file = random_filename(tempfile.gettempdir())
-    output_file = random_filename(tempfile.gettempdir())
+def test_extracting_wiki_text_by_streaming_cleaner():
+    # Read MediaWiki-format wiki code.
+    with open('tests/res/wikipedia.raw.txt', 'r') as fp:
+        wiki_code = fp.read()
+
+    # Check if the code is cleaned same as `mwparserfromhell`.
+    with open('tests/res/wikipedia.plain.txt', 'r') as fp:
+        assert (wikipedia._clean_wiki_text(wiki_code, cleaner='streaming')
+                == fp.read())
+
+    # Check if the markups are stripped in a single pass.
+    code = ('Foo [[File:a.jpg|thumb|A [[b|c]].]] [[x|y]] {{a|{{b}}}} '
+            '[http://x.com Title]<ref name=a>cite</ref>.\n'
+            '{| class=wikitable\n| a.\n|}\n'
+            "'''Bold''' ''italics'' &amp; <small>small</small>.")
+    assert (wikipedia._clean_wiki_text(code, ['File'], cleaner='streaming')
+            == 'Foo y Title.\nBold italics & small.')
+
+    # Check if the code which cannot be handled is parsed by
+    # `mwparserfromhell`.
+    code = 'Unbalanced }} and <nowiki>[[a]]</nowiki>.'
+    assert (wikipedia._clean_wiki_text(code, cleaner='streaming')
+            == wikipedia._clean_wiki_text(code))
+
+
+def test_cleaning_wiki_articles_in_batch():
+    cleaner = wikipedia.WikiCleaner(['File'])
+    codes = ['Hello [[File:a.jpg|thumb|image.]] [[world]].\nNo punctuation',
+             '{{reflist}}',
+             "'''Bye''' world<ref>cite.</ref>!"]
+
+    # Check if the articles are cleaned by the same cleaner and joined with
+    # empty lines.
+    assert [cleaner.clean(code) for code in codes] == ['Hello world.', '',
+                                                       'Bye world!']
+    assert cleaner.clean_batch(codes) == 'Hello world.\n\n\n\nBye world!\n\n'
 
-    # Write dummy file to `input_file`.
+
+def test_splitting_sentences():
     dummy = 'Nice to meet you Dr. John. Welcome! How are you?\n\n'
-    with open(input_file, 'w') as fp:
-        fp.write(dummy)
+    lines = dummy.splitlines(True)
 
     # Split the sentences.
     wikipedia._prepare_tokenizing_sentences('en')
-    wikipedia._tokenize_sentences_worker(input_file, output_file, 'en', 0, 100)
+    splitter = create_splitter('en')
+    sentences = list(wikipedia._split_sentences(lines, splitter, 0, 100))
 
     # Check if sentences are splitted well.
-    with open(output_file, 'r') as fp:
-        lines = fp.readlines()
-        assert len(lines) == 3
-        assert ' '.join([line.strip() for line in lines]) == dummy.strip()
+    assert len(sentences) == 3
+    assert ' '.join(sentences) == dummy.strip()
 
     # Check if splitting into chuncks works well.
-    wikipedia._tokenize_sentences_worker(
-        input_file, output_file, 'en', 0, 100, split_sent=False)
+    sentences = list(wikipedia._split_sentences(lines, splitter, 0, 100,
+                                                split_sent=False))
+    assert sentences[0] == dummy.strip()
+
+
+def test_reading_multistream_dump():
+    input_file = random_filename(tempfile.gettempdir())
+    index_file = random_filename(tempfile.gettempdir())
+
+    # Write dummy multistream dump whose streams contain two pages.
+    page = ('<page><title>{0}</title><ns>{1}</ns><revision>'
+            '<text>{2}</text></revision></page>')
+    streams = [b'<mediawiki><siteinfo></siteinfo>',
+               (page.format('a', 0, 'Hello world.')
+                + page.format('b', 1, 'Talk page.')).encode('utf-8'),
+               (page.format('c', 0, '#REDIRECT [[a]]')
+                + page.format('d', 0, 'Bye world.')
+                + '</mediawiki>').encode('utf-8')]
+
+    offsets = []
+    with open(input_file, 'wb') as fp:
+        for stream in streams:
+            offsets.append(fp.tell())
+            fp.write(bz2.compress(stream))
+
+    with bz2.open(index_file, 'wt') as fp:
+        fp.write(f'{offsets[1]}:1:a\n{offsets[1]}:2:b\n'
+                 f'{offsets[2]}:3:c\n{offsets[2]}:4:d\n')
+
+    # Check if the streams are found with and without the index file.
+    ranges = wikipedia._find_bz2_streams(input_file)
+    assert [start for start, _ in ranges] == offsets
+    assert ranges == wikipedia._find_bz2_streams(input_file, index_file)
+
+    # Check if the articles are read from the independent streams.
+    articles = []
+    for start, end in ranges[1:]:
+        with open(input_file, 'rb') as fp:
+            fp.seek(start)
+            data = bz2.decompress(fp.read(end - start))
+        articles += list(wikipedia._iterate_stream_articles(data))
+    assert articles == ['Hello world.', 'Bye world.']
+
+    os.remove(input_file)
+    os.remove(index_file)
+
+
+def test_extracting_generated_dump():
+    input_file = random_filename(tempfile.gettempdir())
+    index_file = random_filename(tempfile.gettempdir())
+    output_file = random_filename(tempfile.gettempdir())
+    temporary = tempfile.mkdtemp()
+    generate_wiki_dump(input_file, 50000, pages_per_stream=8,
+                       index_file=index_file)
+
+    # Read the articles from the streams. The first stream contains the site
+    # information only.
+    articles = queue.Queue()
+    for start, end in wikipedia._find_bz2_streams(input_file)[1:]:
+        with open(input_file, 'rb') as fp:
+            fp.seek(start)
+            data = bz2.decompress(fp.read(end - start))
+
+        for batch in iterate_batches(
+                wikipedia._iterate_stream_articles(data), 8):
+            articles.put(batch)
+    articles.put(None)
+
+    # Extract the articles in this process.
+    ns = ['Talk', 'User', 'File', 'Template', 'Category']
+    wikipedia._process_article_worker(output_file, ns, 'mwparserfromhell',
+                                      'en', 'regex', 50, 1000, True,
+                                      articles)
+    with open(output_file, 'r', encoding='utf-8') as fp:
+        expected = sorted(fp.read().splitlines())
+    assert expected
+
+    # Check if the dump is extracted same by parsing the whole dump and by
+    # decompressing the streams in parallel. The articles are distributed to
+    # the workers, so the order of sentences may change.
+    ext = Extension('expanda.ext.wikipedia')
+    for multistream in ['false', 'true']:
+        outputs = ext.call(input_file, output_file, temporary,
+                           {'num-cores': '2', 'splitter': 'regex',
+                            'multistream': multistream,
+                            'index-file': index_file})
+        assert outputs == [output_file]
+        with open(output_file, 'r', encoding='utf-8') as fp:
+            assert sorted(fp.read().splitlines()) == expected
+
+    # Check if the shards are returned without merging.
+    shards = ext.call(input_file, output_file, temporary,
+                      {'num-cores': '2', 'splitter': 'regex'}, merge=False)
+    assert len(shards) == 2
+
+    sentences = []
+    for name in shards:
+        with open(name, 'r', encoding='utf-8') as fp:
+            sentences += fp.read().splitlines()
+    assert sorted(sentences) == expected
+
+    for name in [input_file, index_file, output_file]:
+        os.remove(name)
+    shutil.rmtree(temporary)
+
+
+class _InterruptedCheckpoint(Checkpoint):
+    def __init__(self, filename, saves):
+        super().__init__(filename)
+        self.saves = saves
+
+    def save(self, state):
+        # Stop the extraction after saving the progress several times, like a
+        # crashed build. Note that the sentences written after the last saved
+        # progress remain in the output file.
+        if self.saves == 0:
+            raise KeyboardInterrupt()
+        super().save(state)
+        self.saves -= 1
+
+
+@mock.patch('expanda.ext.wikipedia._CHECKPOINT_BATCHES', 1)
+def test_resuming_extraction_from_checkpoint():
+    input_file = random_filename(tempfile.gettempdir())
+    output_file = random_filename(tempfile.gettempdir())
+    temporary = tempfile.mkdtemp()
+    generate_wiki_dump(input_file, 50000)
+
+    ext = Extension('expanda.ext.wikipedia')
+    args = {'num-cores': '1', 'splitter': 'regex', 'batch-size': '2'}
+
+    # Extract the dump without interruption.
+    checkpoint = Checkpoint(random_filename(temporary))
+    assert ext.call(input_file, output_file, temporary, args,
+                    checkpoint) == [output_file]
+    with open(output_file, 'r', encoding='utf-8') as fp:
+        expected = fp.read()
+    assert expected
+
+    # Check if the interrupted extraction is resumed from the checkpoint and
+    # the same sentences are extracted.
+    checkpoint = Checkpoint(random_filename(temporary))
+    with pytest.raises(KeyboardInterrupt):
+        ext.call(input_file, output_file, temporary, args,
+                 _InterruptedCheckpoint(checkpoint.filename, 3))
+    assert checkpoint.load()['articles'] == 6
+    assert os.path.getsize(output_file) > checkpoint.load()['offset']
+
+    ext.call(input_file, output_file, temporary, args, checkpoint)
+    with open(output_file, 'r', encoding='utf-8') as fp:
+        assert fp.read() == expected
+
+    for name in [input_file, output_file]:
+        os.remove(name)
+    shutil.rmtree(temporary)
+
+
+def test_failing_fast_with_unknown_splitter():
+    input_file = random_filename(tempfile.gettempdir())
+    output_file = random_filename(tempfile.gettempdir())
+    temporary = tempfile.mkdtemp()
+    generate_wiki_dump(input_file, 10000)
+
+    # Check if the extraction fails before starting the workers, rather than
+    # waiting for the terminated workers forever.
+    with pytest.raises(ValueError):
+        Extension('expanda.ext.wikipedia').call(
+            input_file, output_file, temporary,
+            {'num-cores': '2', 'splitter': 'bogus'})
 
-    with open(output_file, 'r') as fp:
-        lines = fp.readlines()
-        assert lines[0].strip() == dummy.strip()
+    os.remove(input_file)
+    shutil.rmtree(temporary)